@@ -1,6 +1,24 @@
+import logging
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class ApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from django.conf import settings
+
+        import fastjson
+        from . import signals, similar
+
+        if getattr(settings, "FAST_JSON", True):
+            fastjson.install()
+
+        try:
+            similar.index.load()
+        except Exception:
+            logger.exception("Could not load the similar-tracks index")
@@ -0,0 +1,322 @@
+"""
+Local audio-feature store and recommendation engine.
+
+Audio features for every Song we have seen are kept in SongFeatures and, per
+process, as one float32 matrix (one row per track, one column per feature).
+recommend() applies the same min_/max_/target_ parameters Spotify's
+recommendations endpoint takes: rows outside any min/max are dropped and the
+rest are ranked by weighted squared distance to the targets, each feature
+scaled by its range so tempo doesn't drown out valence.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.db import connection
+
+import fastjson
+import metrics
+from .models import Song, SongFeatures
+
+logger = logging.getLogger(__name__)
+
+FEATURES = [
+    "acousticness",
+    "danceability",
+    "energy",
+    "instrumentalness",
+    "key",
+    "duration_ms",
+    "liveness",
+    "loudness",
+    "mode",
+    "speechiness",
+    "tempo",
+    "time_signature",
+    "valence",
+    "popularity",
+]
+COLUMNS = {name: index for index, name in enumerate(FEATURES)}
+
+# Spotify reports these as 0-1; the client sends them as 0-100.
+UNIT_FEATURES = {
+    "acousticness", "danceability", "energy", "instrumentalness",
+    "liveness", "speechiness", "valence",
+}
+RANGES = {
+    **{name: (0.0, 1.0) for name in UNIT_FEATURES},
+    "key": (0.0, 11.0),
+    "duration_ms": (30000.0, 3600000.0),
+    "loudness": (-60.0, 0.0),
+    "mode": (0.0, 1.0),
+    "tempo": (40.0, 220.0),
+    "time_signature": (3.0, 7.0),
+    "popularity": (0.0, 100.0),
+}
+WEIGHTS = {name: 1.0 for name in FEATURES}
+WEIGHTS.update(getattr(settings, "AUDIO_FEATURE_WEIGHTS", {}))
+
+STORE_REFRESH = getattr(settings, "AUDIO_FEATURE_STORE_REFRESH", 60)
+SYNC_ENABLED = getattr(settings, "AUDIO_FEATURE_SYNC", True)
+FETCH_BATCH_SIZE = 100
+
+# Sync jobs fan their batches out on backend.tracks.fetch_pool, so they run on
+# their own executor rather than waiting on the pool they occupy.
+sync_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-feature-sync")
+
+
+def vector_from(features, track=None):
+    """Build a stored vector from a Spotify audio-features object and track object."""
+    values = dict(features or {})
+    if track and track.get("popularity") is not None:
+        values["popularity"] = track["popularity"]
+    return [
+        float(values[name]) if values.get(name) is not None else None
+        for name in FEATURES
+    ]
+
+
+class FeatureStore:
+    """
+    In-process matrix of SongFeatures rows. Loads everything on first use, then
+    pulls rows changed since the last load at most every STORE_REFRESH seconds.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.rows = {}
+        self.matrix = np.empty((0, len(FEATURES)), dtype=np.float32, order="F")
+        self.size = 0
+        # Rows replaced in place with a different vector, oldest first.
+        self.updated = []
+        self.watermark = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _grow(self, needed):
+        capacity = self.matrix.shape[0]
+        if needed <= capacity:
+            return
+        # Column-major, so each feature column the engine scans is contiguous.
+        grown = np.full(
+            (max(needed, capacity * 2, 1024), len(FEATURES)), np.nan, dtype=np.float32, order="F"
+        )
+        grown[: self.size] = self.matrix[: self.size]
+        self.matrix = grown
+
+    def upsert(self, vectors):
+        """Add or replace rows from {spotify_id: vector}."""
+        with self._lock:
+            self._grow(self.size + len(vectors))
+            for spotify_id, vector in vectors.items():
+                values = np.array(
+                    [np.nan if value is None else value for value in vector], dtype=np.float32
+                )
+                row = self.rows.get(spotify_id)
+                if row is None:
+                    row = self.size
+                    self.rows[spotify_id] = row
+                    self.ids.append(spotify_id)
+                    self.size += 1
+                elif not np.array_equal(self.matrix[row], values, equal_nan=True):
+                    self.updated.append(row)
+                self.matrix[row] = values
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() - self.checked_at < STORE_REFRESH:
+            return
+        # One thread reloads; the others carry on with what is already loaded.
+        if not self._refresh_lock.acquire(blocking=force):
+            return
+        try:
+            self.checked_at = time.monotonic()
+            changed = SongFeatures.objects.order_by("updated_at")
+            if self.watermark is not None:
+                changed = changed.filter(updated_at__gte=self.watermark)
+            vectors = {}
+            for spotify_id, vector, updated_at in changed.values_list(
+                "song__spotify_id", "vector", "updated_at"
+            ).iterator(chunk_size=5000):
+                vectors[spotify_id] = vector
+                self.watermark = updated_at
+            if vectors:
+                self.upsert(vectors)
+            metrics.set_gauge("audio_features.store_size", self.size)
+        finally:
+            self._refresh_lock.release()
+
+    def view(self):
+        """(ids, matrix) snapshot of the rows loaded so far."""
+        self.refresh()
+        with self._lock:
+            return self.ids[: self.size], self.matrix[: self.size]
+
+    def updated_since(self, cursor):
+        """(rows updated in place since cursor, new cursor)."""
+        with self._lock:
+            return self.updated[cursor:], len(self.updated)
+
+
+store = FeatureStore()
+
+
+def from_client(name, value):
+    """A client slider value on Spotify's scale: 0-100 unit features become 0-1."""
+    if name in UNIT_FEATURES:
+        return float(value) / 100
+    return value
+
+
+def parse_params(params):
+    """
+    Split Spotify-style recommendation params into {feature: (min, max, target)}.
+    Values are expected on Spotify's scale (see from_client).
+    """
+    constraints = {}
+    for key, value in params.items():
+        prefix, _, name = key.partition("_")
+        if prefix not in ("min", "max", "target") or name not in COLUMNS:
+            continue
+        if value in (None, ""):
+            continue
+        low, high, target = constraints.get(name, (None, None, None))
+        value = float(value)
+        if prefix == "min":
+            low = value
+        elif prefix == "max":
+            high = value
+        else:
+            target = value
+        constraints[name] = (low, high, target)
+    return constraints
+
+
+def rank(matrix, constraints, limit, exclude=None):
+    """Row indexes of the best `limit` rows of matrix for the given constraints."""
+    if not len(matrix):
+        return np.empty(0, dtype=np.int64)
+    keep = np.ones(len(matrix), dtype=bool)
+    distance = np.zeros(len(matrix), dtype=np.float32)
+    for name, (low, high, target) in constraints.items():
+        column = matrix[:, COLUMNS[name]]
+        if low is not None:
+            keep &= column >= low
+        if high is not None:
+            keep &= column <= high
+        if target is not None:
+            start, end = RANGES[name]
+            delta = (column - target) / (end - start)
+            distance += WEIGHTS[name] * np.nan_to_num(delta * delta, nan=1.0)
+    if exclude is not None:
+        keep[exclude] = False
+
+    candidates = np.flatnonzero(keep)
+    if len(candidates) > limit:
+        best = np.argpartition(distance[candidates], limit - 1)[:limit]
+        candidates = candidates[best]
+    return candidates[np.argsort(distance[candidates], kind="stable")]
+
+
+def recommend(params, limit=20):
+    """
+    Local recommendations as {"seeds": [...], "tracks": [...]}, the shape
+    Spotify's /recommendations returns. Seed tracks are never recommended.
+    """
+    from backend import tracks
+
+    start = time.monotonic()
+    ids, matrix = store.view()
+    seed_rows = (store.rows.get(i) for i in str(params.get("seed_tracks") or "").split(","))
+    exclude = [row for row in seed_rows if row is not None and row < len(ids)]
+    rows = rank(matrix, parse_params(params), max(int(limit), 1), exclude or None)
+    track_ids = [ids[row] for row in rows]
+    metrics.observe("audio_features.rank_ms", (time.monotonic() - start) * 1000)
+    return {
+        "seeds": [
+            {"id": value, "type": key.replace("seed_", "").rstrip("s").upper()}
+            for key in ("seed_artists", "seed_genres", "seed_tracks")
+            for value in str(params.get(key) or "").split(",")
+            if value
+        ],
+        "tracks": tracks.hydrate(track_ids, fetch=False),
+    }
+
+
+def _fetch_batch(batch, access_token):
+    from .spotify import upstream
+
+    try:
+        response = upstream.request(
+            "audio_features",
+            "GET",
+            f"{upstream.SPOTIFY_API_URL}/audio-features",
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={"ids": ",".join(batch)},
+        )
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch audio features for {len(batch)} tracks: {str(e)}")
+        return []
+    if response.status_code != 200:
+        logger.error(f"Spotify API error fetching audio features: {response.status_code}")
+        return []
+    return [features for features in fastjson.decode(response).get("audio_features") or [] if features]
+
+
+def sync(track_ids, access_token=None):
+    """Fetch and store audio features for Songs among track_ids. Returns the count stored."""
+    from backend import tracks
+    from .spotify.views import SpotifyClientCredentialsView
+
+    songs = dict(
+        Song.objects.filter(spotify_id__in=list(track_ids)).values_list("spotify_id", "pk")
+    )
+    if not songs:
+        return 0
+    if access_token is None:
+        access_token = SpotifyClientCredentialsView().get_access_token()
+
+    spotify_ids = list(songs)
+    batches = [
+        spotify_ids[i:i + FETCH_BATCH_SIZE]
+        for i in range(0, len(spotify_ids), FETCH_BATCH_SIZE)
+    ]
+    fetched = []
+    for result in tracks.fetch_pool.map(lambda batch: _fetch_batch(batch, access_token), batches):
+        fetched.extend(result)
+
+    known = tracks.get_tracks([features["id"] for features in fetched])
+    vectors = {
+        features["id"]: vector_from(features, known.get(features["id"]))
+        for features in fetched
+        if features.get("id") in songs
+    }
+    SongFeatures.objects.bulk_create(
+        [SongFeatures(song_id=songs[spotify_id], vector=vector) for spotify_id, vector in vectors.items()],
+        update_conflicts=True,
+        unique_fields=["song"],
+        update_fields=["vector", "updated_at"],
+    )
+    store.upsert(vectors)
+    return len(vectors)
+
+
+def schedule_sync(track_ids):
+    """Fetch features for newly seen tracks off the request thread."""
+    track_ids = list(track_ids)
+    if not SYNC_ENABLED or not track_ids:
+        return
+
+    def run():
+        try:
+            sync(track_ids)
+        except Exception:
+            logger.exception(f"Audio feature sync failed for {len(track_ids)} tracks")
+        finally:
+            connection.close()
+
+    sync_pool.submit(run)
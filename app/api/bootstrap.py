@@ -0,0 +1,99 @@
+"""
+Everything the frontend needs on load, in one response.
+
+Replaces the startup sequence of auth status, user details, email
+verification, genres, Spotify profile and playlists. The user comes from the
+one JWT authentication, the Spotify connection is looked up once and shared,
+and the two Spotify calls run concurrently.
+
+Each section gets its own ETag. Clients send the ones they have as
+?known=name:etag,... and unchanged sections come back as null, listed under
+"unchanged".
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+import fastjson
+from authentication.serializers import UserSerializer
+from backend.models import Genre, MusicServiceConnection
+from .spotify.upstream import SPOTIFY_API_URL
+from .spotify.views import SpotifyClientCredentialsView
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_PAGE = {"limit": "50", "offset": "0"}
+
+spotify_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bootstrap-spotify")
+
+
+def etag(section):
+    canonical = json.dumps(section, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+
+def parse_known(value):
+    known = {}
+    for pair in (value or "").split(","):
+        name, _, tag = pair.partition(":")
+        if name and tag:
+            known[name.strip()] = tag.strip()
+    return known
+
+
+def _spotify_section(client, request, music_service, url, endpoint, params=None):
+    try:
+        response = client.make_spotify_request(
+            request, url, params=params, endpoint=endpoint, music_service=music_service
+        )
+        if response.status_code == 200:
+            return fastjson.decode(response)
+        return {"error": f"Spotify API error: {response.status_code}", "status": response.status_code}
+    except Exception as e:
+        logger.exception(f"Bootstrap request to {url} failed")
+        return {"error": str(e), "status": 500}
+    finally:
+        connection.close()
+
+
+def spotify_sections(request):
+    """Spotify profile and first page of playlists, fetched concurrently."""
+    music_service = MusicServiceConnection.objects.filter(
+        user=request.user, service_name="spotify"
+    ).first()
+    if music_service is None:
+        missing = {"error": "No Spotify connection found", "status": 400}
+        return {"spotify_user": missing, "spotify_playlists": missing}
+
+    client = SpotifyClientCredentialsView()
+    profile = spotify_pool.submit(
+        _spotify_section, client, request, music_service, f"{SPOTIFY_API_URL}/me", "me"
+    )
+    playlists = spotify_pool.submit(
+        _spotify_section,
+        client,
+        request,
+        music_service,
+        f"{SPOTIFY_API_URL}/me/playlists",
+        "playlists",
+        PLAYLIST_PAGE,
+    )
+    return {"spotify_user": profile.result(), "spotify_playlists": playlists.result()}
+
+
+def build(request):
+    """All sections for this request, keyed by name."""
+    user = request.user
+    sections = {"genres": list(Genre.objects.values_list("name", flat=True))}
+    if not user.is_authenticated:
+        sections["auth"] = {"is_authenticated": False, "email": None}
+        return sections
+
+    sections["auth"] = {"is_authenticated": True, "email": user.email}
+    sections["user"] = UserSerializer(user).data
+    sections["email_verification"] = {"emailVerified": user.email_verified}
+    sections.update(spotify_sections(request))
+    return sections
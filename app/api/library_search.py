@@ -0,0 +1,273 @@
+"""
+In-process search index over a user's mirrored library.
+
+Each user's index is built on first search from their Playlist/PlaylistSong
+rows: song titles, artist names and playlist names are folded to lowercase
+ASCII tokens and kept in an inverted index. Every query token must match a
+token in the result, either exactly, as a prefix (through a sorted token list),
+or, for tokens of FUZZY_MIN_LENGTH or more, within one edit (through a table of
+single-character deletions).
+
+Signals keep loaded indexes up to date in this process and bump a per-user
+version in the shared cache, so other processes rebuild that user's index on
+their next search.
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+import metrics
+from .models import Playlist, PlaylistSong
+
+logger = logging.getLogger(__name__)
+
+MAX_USERS = getattr(settings, "LIBRARY_SEARCH_MAX_USERS", 500)
+FUZZY_MIN_LENGTH = 4
+PREFIX_EXPANSION = 500
+VERSION_TTL = 60 * 60 * 24
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def tokenize(text):
+    folded = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode()
+    return _TOKEN.findall(folded.lower())
+
+
+def deletions(token):
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _version_key(user_id):
+    return f"library-search-version:{user_id}"
+
+
+def _version(user_id):
+    return cache.get(_version_key(user_id), 0)
+
+
+def _bump_version(user_id):
+    key = _version_key(user_id)
+    cache.add(key, 0, VERSION_TTL)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, VERSION_TTL)
+        return 1
+
+
+class LibraryIndex:
+    def __init__(self, version=0):
+        self.version = version
+        self.docs = {}
+        self.postings = defaultdict(set)
+        self.tokens = []
+        self.variants = defaultdict(set)
+        self.song_playlists = defaultdict(set)
+        self.playlist_names = {}
+        self.lock = threading.Lock()
+
+    def _add_doc(self, key, doc, text):
+        self.docs[key] = doc
+        for token in set(tokenize(text)):
+            postings = self.postings[token]
+            if not postings:
+                insort(self.tokens, token)
+                if len(token) >= FUZZY_MIN_LENGTH:
+                    for variant in deletions(token):
+                        self.variants[variant].add(token)
+            postings.add(key)
+
+    def _remove_doc(self, key, text):
+        self.docs.pop(key, None)
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(key)
+            if not postings:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+                if len(token) >= FUZZY_MIN_LENGTH:
+                    for variant in deletions(token):
+                        self.variants[variant].discard(token)
+
+    def add_playlist(self, playlist_id, spotify_id, name):
+        with self.lock:
+            previous = self.docs.get(("playlist", playlist_id))
+            if previous is not None:
+                self._remove_doc(("playlist", playlist_id), previous["name"])
+            self.playlist_names[playlist_id] = {"id": spotify_id, "name": name}
+            self._add_doc(
+                ("playlist", playlist_id), {"type": "playlist", "id": spotify_id, "name": name}, name
+            )
+
+    def remove_playlist(self, playlist_id):
+        with self.lock:
+            doc = self.docs.get(("playlist", playlist_id))
+            if doc is not None:
+                self._remove_doc(("playlist", playlist_id), doc["name"])
+            self.playlist_names.pop(playlist_id, None)
+            for song_id in [
+                song_id for song_id, playlists in self.song_playlists.items() if playlist_id in playlists
+            ]:
+                self._unlink(song_id, playlist_id)
+
+    def add_song(self, playlist_id, song_id, spotify_id, title, artists, image=""):
+        with self.lock:
+            self.song_playlists[song_id].add(playlist_id)
+            if ("song", song_id) in self.docs:
+                return
+            names = [artist.get("name", "") for artist in artists or []]
+            doc = {"type": "track", "id": spotify_id, "title": title, "artists": names, "image": image}
+            self._add_doc(("song", song_id), doc, " ".join([title, *names]))
+
+    def _unlink(self, song_id, playlist_id):
+        playlists = self.song_playlists.get(song_id)
+        if playlists is None:
+            return
+        playlists.discard(playlist_id)
+        if not playlists:
+            del self.song_playlists[song_id]
+            doc = self.docs.get(("song", song_id))
+            if doc is not None:
+                self._remove_doc(("song", song_id), " ".join([doc["title"], *doc["artists"]]))
+
+    def remove_song(self, playlist_id, song_id):
+        with self.lock:
+            self._unlink(song_id, playlist_id)
+
+    def _matches(self, term, fuzzy):
+        """{doc key: score} for one query term: 3 exact, 2 prefix, 1 fuzzy."""
+        scores = {}
+        start = bisect_left(self.tokens, term)
+        for token in self.tokens[start:start + PREFIX_EXPANSION]:
+            if not token.startswith(term):
+                break
+            score = 3 if token == term else 2
+            for key in self.postings[token]:
+                if scores.get(key, 0) < score:
+                    scores[key] = score
+        if fuzzy and len(term) >= FUZZY_MIN_LENGTH:
+            # Tokens one edit away share a single-character deletion with the term.
+            similar = set(self.variants.get(term, ()))
+            for variant in deletions(term):
+                similar.update(self.variants.get(variant, ()))
+                if variant in self.postings:
+                    similar.add(variant)
+            for token in similar:
+                for key in self.postings[token]:
+                    scores.setdefault(key, 1)
+        return scores
+
+    def search(self, query, limit=20, fuzzy=True):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            scores = None
+            for term in terms:
+                matches = self._matches(term, fuzzy)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {key: scores[key] + score for key, score in matches.items() if key in scores}
+                if not scores:
+                    return []
+            ranked = sorted(
+                scores.items(),
+                key=lambda item: (-item[1], item[0][0] != "playlist", item[0][1]),
+            )[:limit]
+            results = []
+            for key, score in ranked:
+                doc = dict(self.docs[key], score=score)
+                if key[0] == "song":
+                    doc["playlists"] = [
+                        self.playlist_names[playlist_id]
+                        for playlist_id in sorted(self.song_playlists[key[1]])
+                        if playlist_id in self.playlist_names
+                    ]
+                results.append(doc)
+            return results
+
+
+def build(user_id):
+    start = time.monotonic()
+    index = LibraryIndex(_version(user_id))
+    for playlist_id, spotify_id, name in Playlist.objects.filter(user_id=user_id).values_list(
+        "pk", "spotify_id", "name"
+    ):
+        index.add_playlist(playlist_id, spotify_id, name)
+    rows = (
+        PlaylistSong.objects.filter(playlist__user_id=user_id, removed_on__isnull=True)
+        .values_list(
+            "playlist_id", "song_id", "song__spotify_id", "song__title", "song__artists", "song__image"
+        )
+        .iterator(chunk_size=2000)
+    )
+    for row in rows:
+        index.add_song(*row)
+    metrics.observe("library_search.build_ms", (time.monotonic() - start) * 1000)
+    return index
+
+
+def get_index(user_id):
+    """The user's index, rebuilt if another process has changed their library."""
+    version = _version(user_id)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(user_id)
+            return index
+    index = build(user_id)
+    with _lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def search(user_id, query, limit=20, fuzzy=True):
+    start = time.monotonic()
+    results = get_index(user_id).search(query, limit, fuzzy)
+    metrics.observe("library_search.query_ms", (time.monotonic() - start) * 1000)
+    return results
+
+
+def changed(user_id, apply):
+    """
+    Record a library change: apply(index) updates this process's index in place
+    and the shared version is bumped. If some other process changed the library
+    since our index was built, it's dropped and rebuilt on the next search.
+    """
+    with _lock:
+        index = _indexes.get(user_id)
+    version = _bump_version(user_id)
+    if index is None:
+        return
+    if version != index.version + 1:
+        with _lock:
+            _indexes.pop(user_id, None)
+        return
+    apply(index)
+    index.version = version
+
+
+def songs_removed(user_id, playlist_id, song_ids):
+    """Record a bulk delete of a playlist's songs as one change."""
+
+    def apply(index):
+        for song_id in song_ids:
+            index.remove_song(playlist_id, song_id)
+
+    changed(user_id, apply)
@@ -0,0 +1,105 @@
+# Generated by Django 4.2.16 on 2026-10-19 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Song",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("title", models.CharField(max_length=255)),
+                ("artists", models.JSONField()),
+                ("spotify_id", models.CharField(max_length=255, unique=True)),
+                ("isrc", models.CharField(db_index=True, max_length=12, unique=True)),
+                ("image", models.URLField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Playlist",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("spotify_id", models.CharField(max_length=255)),
+                ("snapshot_id", models.CharField(max_length=255)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="playlists",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "spotify_id")},
+            },
+        ),
+        migrations.CreateModel(
+            name="PlaylistSong",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order", models.PositiveIntegerField(default=0)),
+                ("added_on", models.DateTimeField(auto_now_add=True)),
+                ("removed_on", models.DateTimeField(blank=True, null=True)),
+                (
+                    "playlist",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.playlist",
+                    ),
+                ),
+                (
+                    "song",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.song",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["order"],
+                "unique_together": {("playlist", "song")},
+            },
+        ),
+        migrations.AddField(
+            model_name="playlist",
+            name="songs",
+            field=models.ManyToManyField(through="api.PlaylistSong", to="api.song"),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.16 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+GAP = 1 << 16
+BATCH_SIZE = 1000
+
+
+def _renumber(apps, order_for):
+    PlaylistSong = apps.get_model("api", "PlaylistSong")
+    pending = []
+    playlist_id = None
+    position = 0
+    for row in PlaylistSong.objects.order_by("playlist_id", "order", "id").only(
+        "id", "playlist_id", "order"
+    ).iterator(chunk_size=BATCH_SIZE):
+        if row.playlist_id != playlist_id:
+            playlist_id = row.playlist_id
+            position = 0
+        row.order = order_for(position)
+        position += 1
+        pending.append(row)
+        if len(pending) >= BATCH_SIZE:
+            PlaylistSong.objects.bulk_update(pending, ["order"])
+            pending = []
+    if pending:
+        PlaylistSong.objects.bulk_update(pending, ["order"])
+
+
+def spread_orders(apps, schema_editor):
+    _renumber(apps, lambda position: (position + 1) * GAP)
+
+
+def compact_orders(apps, schema_editor):
+    _renumber(apps, lambda position: position)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0002_songfeatures"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="playlistsong",
+            name="order",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(spread_orders, compact_orders),
+        migrations.AddIndex(
+            model_name="playlistsong",
+            index=models.Index(fields=["playlist", "order"], name="playlistsong_order_idx"),
+        ),
+    ]
@@ -15,6 +15,18 @@ class Song(models.Model):
         return f"{self.title} - {', '.join(artist['name'] for artist in self.artists)}"
 
 
+class SongFeatures(models.Model):
+    song = models.OneToOneField(
+        Song, on_delete=models.CASCADE, primary_key=True, related_name="features"
+    )
+    # Values in api.audio_features.FEATURES order; None where Spotify had no value.
+    vector = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Features for {self.song.spotify_id}"
+
+
 class Playlist(models.Model):
     name = models.CharField(max_length=255)
     spotify_id = models.CharField(max_length=255)
@@ -34,7 +46,8 @@ class Playlist(models.Model):
 class PlaylistSong(models.Model):
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE)
     song = models.ForeignKey(Song, on_delete=models.CASCADE)
-    order = models.PositiveIntegerField(default=0)
+    # Sparse sort key, see api.ordering. Neighbours are normally ORDER_GAP apart.
+    order = models.PositiveBigIntegerField(default=0)
     added_on = models.DateTimeField(auto_now_add=True)
     removed_on = models.DateTimeField(null=True, blank=True)
 
@@ -44,3 +57,6 @@ class PlaylistSong(models.Model):
     class Meta:
         ordering = ["order"]
         unique_together = ["playlist", "song"]
+        indexes = [
+            models.Index(fields=["playlist", "order"], name="playlistsong_order_idx"),
+        ]
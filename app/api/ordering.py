@@ -0,0 +1,156 @@
+"""
+Sparse ordering for PlaylistSong.
+
+Rows are spaced ORDER_GAP apart, so inserting or moving a track takes the
+midpoint of its new neighbours and writes a single row. When two neighbours
+end up less than MIN_GAP apart the playlist is renumbered in the background;
+if they are adjacent the renumbering happens inline before the write.
+
+Placing a row by list position needs one positional lookup; placing it after
+a known row seeks on the order index instead, so runs of inserts pass the
+previous row along.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import PlaylistSong
+
+logger = logging.getLogger(__name__)
+
+ORDER_GAP = getattr(settings, "PLAYLIST_ORDER_GAP", 1 << 16)
+MIN_GAP = 16
+BATCH_SIZE = 1000
+
+rebalance_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist-rebalance")
+_scheduled = set()
+_scheduled_lock = threading.Lock()
+
+
+def rebalance(playlist_id):
+    """Renumber a playlist's rows ORDER_GAP apart, keeping their current order."""
+    with transaction.atomic():
+        rows = list(
+            PlaylistSong.objects.select_for_update()
+            .filter(playlist_id=playlist_id)
+            .order_by("order", "id")
+            .only("id", "order")
+        )
+        changed = []
+        for position, row in enumerate(rows, start=1):
+            if row.order != position * ORDER_GAP:
+                row.order = position * ORDER_GAP
+                changed.append(row)
+        PlaylistSong.objects.bulk_update(changed, ["order"], batch_size=BATCH_SIZE)
+    logger.info(f"Rebalanced playlist {playlist_id}: {len(changed)} of {len(rows)} rows renumbered")
+    return len(changed)
+
+
+def schedule_rebalance(playlist_id):
+    def run():
+        try:
+            rebalance(playlist_id)
+        except Exception:
+            logger.exception(f"Rebalancing playlist {playlist_id} failed")
+        finally:
+            with _scheduled_lock:
+                _scheduled.discard(playlist_id)
+            connection.close()
+
+    # Only mark the playlist once the transaction has committed; a rollback
+    # must not leave it marked forever.
+    def submit():
+        with _scheduled_lock:
+            if playlist_id in _scheduled:
+                return
+            _scheduled.add(playlist_id)
+        rebalance_pool.submit(run)
+
+    transaction.on_commit(submit)
+
+
+def _keys(playlist_id, exclude=None):
+    rows = PlaylistSong.objects.filter(playlist_id=playlist_id)
+    if exclude is not None:
+        rows = rows.exclude(pk=exclude)
+    return rows.order_by("order", "id").values_list("order", flat=True)
+
+
+def _neighbours_after(playlist_id, after, exclude=None):
+    """Order keys of row `after` (a pk) and of the row following it, by seeking."""
+    before = PlaylistSong.objects.filter(pk=after).values_list("order", flat=True).first()
+    if before is None:
+        return None, None
+    return before, _keys(playlist_id, exclude).filter(order__gt=before).first()
+
+
+def _neighbours(playlist_id, index, exclude=None):
+    """Order keys of the rows that would sit either side of position `index`."""
+    rows = _keys(playlist_id, exclude)
+    if index <= 0:
+        return None, rows.first()
+    keys = list(rows[index - 1:index + 1])
+    if not keys:
+        return rows.last(), None
+    return keys[0], keys[1] if len(keys) > 1 else None
+
+
+def order_at(playlist_id, index=None, exclude=None, after=None):
+    """
+    Order key for a row placed at list position `index` (0-based; past the end
+    appends), or right after the row with pk `after`. `exclude` is the pk of a
+    row being moved, which doesn't count.
+    """
+    if after is not None:
+        before, following = _neighbours_after(playlist_id, after, exclude)
+        if before is None:
+            return append_order(playlist_id)
+    else:
+        before, following = _neighbours(playlist_id, index, exclude)
+    if before is None and following is None:
+        return ORDER_GAP
+    if following is None:
+        return before + ORDER_GAP
+    low = before if before is not None else 0
+    if following - low < 2:
+        rebalance(playlist_id)
+        return order_at(playlist_id, index, exclude, after)
+    if following - low < MIN_GAP:
+        schedule_rebalance(playlist_id)
+    return low + (following - low) // 2
+
+
+def append_order(playlist_id):
+    last = PlaylistSong.objects.filter(playlist_id=playlist_id).aggregate(last=Max("order"))["last"]
+    return (last or 0) + ORDER_GAP
+
+
+def add_song(playlist, song, index=None, after=None):
+    """
+    Add song to playlist at `index`, right after the row with pk `after`, or at
+    the end. Writes one row.
+    """
+    if index is None and after is None:
+        order = append_order(playlist.pk)
+    else:
+        order = order_at(playlist.pk, index, after=after)
+    playlist_song, created = PlaylistSong.objects.get_or_create(
+        playlist=playlist, song=song, defaults={"order": order}
+    )
+    return playlist_song
+
+
+def move(playlist_song, index):
+    """Move an existing row to list position `index`. Writes one row."""
+    playlist_song.order = order_at(playlist_song.playlist_id, index, exclude=playlist_song.pk)
+    playlist_song.save(update_fields=["order"])
+    return playlist_song
+
+
+def order_for_position(position):
+    """Order key for the row at `position` in a freshly numbered playlist."""
+    return (position + 1) * ORDER_GAP
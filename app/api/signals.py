@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import library_search
+from .models import Playlist, PlaylistSong
+
+
+@receiver(post_save, sender=Playlist)
+def index_playlist(sender, instance, **kwargs):
+    library_search.changed(
+        instance.user_id,
+        lambda index: index.add_playlist(instance.pk, instance.spotify_id, instance.name),
+    )
+
+
+# Deliberately no post_delete receiver for PlaylistSong: one would turn off
+# fast deletes for every cascade. Deleting a playlist is handled here, once per
+# playlist; code that bulk-deletes PlaylistSong rows calls
+# library_search.songs_removed().
+@receiver(post_delete, sender=Playlist)
+def unindex_playlist(sender, instance, **kwargs):
+    library_search.changed(instance.user_id, lambda index: index.remove_playlist(instance.pk))
+
+
+@receiver(post_save, sender=PlaylistSong)
+def index_playlist_song(sender, instance, update_fields=None, **kwargs):
+    # Reordering doesn't change what a search finds.
+    if update_fields is not None and set(update_fields) <= {"order"}:
+        return
+    song = instance.song
+
+    def apply(index):
+        if instance.removed_on is not None:
+            index.remove_song(instance.playlist_id, song.pk)
+        else:
+            index.add_song(
+                instance.playlist_id, song.pk, song.spotify_id, song.title, song.artists, song.image
+            )
+
+    library_search.changed(instance.playlist.user_id, apply)
+
@@ -0,0 +1,356 @@
+"""
+Approximate nearest-neighbour index for "more like this" over the local catalogue.
+
+Songs are embedded as their audio-feature vectors, scaled to 0-1 per feature
+and weighted like the recommendation engine. The index is an inverted file
+(IVF): vectors are clustered with k-means and stored grouped by cluster, and a
+query only scans the NPROBE clusters whose centroids are closest.
+
+Built indexes are written as .npy files under SIMILAR_INDEX_DIR and loaded with
+mmap at startup. Songs whose features arrive after the build are kept in a small
+delta that every query scans exhaustively, and so are indexed songs whose
+features changed since (their indexed copy is masked out); once the delta passes
+REBUILD_FRACTION of the index a rebuild runs in the background. Only one process
+rebuilds at a time (a cache lock); the others map the new version when they
+next catch up. Queries never touch the feature store: seeds are read from the
+index or the delta, and the delta is caught up in the background.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+import metrics
+from . import audio_features
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = getattr(
+    settings,
+    "SIMILAR_INDEX_DIR",
+    os.path.join(getattr(settings, "BASE_DIR", "."), "similar_index"),
+)
+NPROBE = getattr(settings, "SIMILAR_INDEX_NPROBE", 8)
+REBUILD_FRACTION = getattr(settings, "SIMILAR_INDEX_REBUILD_FRACTION", 0.1)
+MIN_REBUILD_DELTA = 1000
+TRAIN_SAMPLE = 50000
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK = 20000
+REBUILD_LOCK_KEY = "similar-index-rebuild"
+REBUILD_LOCK_TTL = 60 * 30
+
+_LOW = np.array([audio_features.RANGES[name][0] for name in audio_features.FEATURES], dtype=np.float32)
+_SPAN = np.array(
+    [audio_features.RANGES[name][1] - audio_features.RANGES[name][0] for name in audio_features.FEATURES],
+    dtype=np.float32,
+)
+_SCALE = np.sqrt(
+    np.array([audio_features.WEIGHTS[name] for name in audio_features.FEATURES], dtype=np.float32)
+)
+
+rebuild_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similar-index")
+catch_up_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="similar-catch-up")
+
+
+def embed(matrix):
+    """Map raw feature rows onto the index space; unknown values sit mid-range."""
+    scaled = (np.asarray(matrix, dtype=np.float32) - _LOW) / _SPAN
+    return np.ascontiguousarray(np.nan_to_num(scaled, nan=0.5) * _SCALE, dtype=np.float32)
+
+
+def nearest(vectors, centroids):
+    """Index of the closest centroid for each vector."""
+    centroid_norms = (centroids * centroids).sum(axis=1)
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = vectors[start:start + ASSIGN_CHUNK]
+        distances = centroid_norms - 2 * chunk @ centroids.T
+        assignments[start:start + ASSIGN_CHUNK] = distances.argmin(axis=1)
+    return assignments
+
+
+def kmeans(vectors, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), TRAIN_SAMPLE), replace=False)]
+    clusters = min(clusters, len(sample))
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = nearest(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        counts = np.bincount(assignments, minlength=clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def build(ids, vectors, clusters=None):
+    """Cluster vectors and return (ids, vectors, offsets, centroids) grouped by cluster."""
+    ids = np.asarray(ids, dtype="S")
+    if not len(vectors):
+        return ids, vectors, np.zeros(1, dtype=np.int64), vectors[:0]
+    clusters = clusters or max(1, int(np.sqrt(len(vectors))))
+    centroids = kmeans(vectors, clusters)
+    assignments = nearest(vectors, centroids)
+    order = np.argsort(assignments, kind="stable")
+    counts = np.bincount(assignments, minlength=len(centroids))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return ids[order], vectors[order], offsets, centroids
+
+
+def top_k(candidate_ids, candidate_vectors, query, k, exclude=None):
+    if not len(candidate_ids):
+        return []
+    difference = candidate_vectors - query
+    distances = np.einsum("ij,ij->i", difference, difference)
+    if exclude is not None:
+        distances[candidate_ids == exclude] = np.inf
+    k = min(k, len(distances))
+    best = np.argpartition(distances, k - 1)[:k]
+    best = best[np.argsort(distances[best], kind="stable")]
+    return [
+        (candidate_ids[i].decode(), float(distances[i]))
+        for i in best
+        if np.isfinite(distances[i])
+    ]
+
+
+class SimilarIndex:
+    def __init__(self, path):
+        self.path = path
+        self.ids = np.empty(0, dtype="S22")
+        self.vectors = np.empty((0, len(audio_features.FEATURES)), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.centroids = self.vectors[:0]
+        self.indexed = {}
+        self.delta_ids = np.empty(0, dtype="S22")
+        self.delta_rows = []
+        self.delta_positions = {}
+        self.delta_vectors = self.vectors[:0]
+        self.stale = np.empty(0, dtype="S22")
+        self.cursor = 0
+        self.update_cursor = 0
+        self.version = None
+        self.rebuilding = False
+        self.catching_up = False
+        self._lock = threading.Lock()
+
+    def save(self, ids, vectors, offsets, centroids):
+        version = f"{int(time.time() * 1000)}-{os.getpid()}"
+        target = os.path.join(self.path, version)
+        os.makedirs(target, exist_ok=True)
+        for name, array in (
+            ("ids", ids), ("vectors", vectors), ("offsets", offsets), ("centroids", centroids)
+        ):
+            np.save(os.path.join(target, f"{name}.npy"), array)
+        with open(os.path.join(target, "meta.json"), "w") as f:
+            json.dump({"count": len(ids), "clusters": len(centroids)}, f)
+
+        # Swap CURRENT atomically so readers never see a half-written index.
+        previous = self.current_version()
+        pointer = os.path.join(self.path, f"CURRENT.{os.getpid()}")
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(self.path, "CURRENT"))
+        # Keep the version CURRENT pointed at until now (other processes may be
+        # mapping it) and anything newer (still being written elsewhere).
+        if previous is None:
+            return
+        for old in os.listdir(self.path):
+            old_path = os.path.join(self.path, old)
+            if os.path.isdir(old_path) and old < previous:
+                shutil.rmtree(old_path, ignore_errors=True)
+
+    def current_version(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """Map the current on-disk index. Returns False when there is none yet."""
+        version = self.current_version()
+        if version is None:
+            return False
+        target = os.path.join(self.path, version)
+        try:
+            arrays = {
+                name: np.load(os.path.join(target, f"{name}.npy"), mmap_mode="r")
+                for name in ("ids", "vectors", "offsets", "centroids")
+            }
+        except FileNotFoundError:
+            logger.warning(f"Similar-tracks index version {version} is incomplete or gone")
+            return False
+        indexed = {spotify_id.decode(): row for row, spotify_id in enumerate(arrays["ids"])}
+        with self._lock:
+            self.ids = arrays["ids"]
+            self.vectors = arrays["vectors"]
+            self.offsets = np.asarray(arrays["offsets"])
+            self.centroids = np.asarray(arrays["centroids"])
+            self.indexed = indexed
+            self.delta_ids = np.empty(0, dtype="S22")
+            self.delta_rows = []
+            self.delta_positions = {}
+            self.delta_vectors = self.vectors[:0]
+            self.stale = np.empty(0, dtype="S22")
+            self.cursor = 0
+            self.update_cursor = 0
+            self.version = version
+        metrics.set_gauge("similar.index_size", len(indexed))
+        return True
+
+    def rebuild(self):
+        _, updates = audio_features.store.updated_since(0)
+        ids, matrix = audio_features.store.view()
+        start = time.monotonic()
+        self.save(*build(ids, embed(matrix)))
+        self.load()
+        with self._lock:
+            # Updates made before the snapshot are in the new index already.
+            self.update_cursor = updates
+        metrics.observe("similar.rebuild_ms", (time.monotonic() - start) * 1000)
+        logger.info(f"Rebuilt similar-tracks index with {len(ids)} songs")
+
+    def _schedule_rebuild(self):
+        with self._lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+
+        def run():
+            # One process rebuilds; the others pick its version up in catch_up().
+            if not cache.add(REBUILD_LOCK_KEY, os.getpid(), REBUILD_LOCK_TTL):
+                self.rebuilding = False
+                return
+            try:
+                self.rebuild()
+            except Exception:
+                logger.exception("Similar-tracks index rebuild failed")
+            finally:
+                cache.delete(REBUILD_LOCK_KEY)
+                self.rebuilding = False
+                connection.close()
+
+        rebuild_pool.submit(run)
+
+    def catch_up(self):
+        """
+        Pick up songs added to the feature store since the index was built, and
+        indexed songs whose features have changed since.
+        """
+        if self.current_version() not in (None, self.version):
+            self.load()
+        ids, matrix = audio_features.store.view()
+        with self._lock:
+            updated, self.update_cursor = audio_features.store.updated_since(self.update_cursor)
+            updated = [row for row in updated if row < len(ids)]
+            new_rows = [
+                row for row in range(self.cursor, len(ids)) if ids[row] not in self.indexed
+            ]
+            self.cursor = max(self.cursor, len(ids))
+            new_rows += [row for row in updated if ids[row] in self.indexed]
+            # Updated delta rows need re-embedding too.
+            if new_rows or any(ids[row] in self.delta_positions for row in updated):
+                self.delta_rows = list(dict.fromkeys(self.delta_rows + new_rows))
+                self.delta_positions = {
+                    ids[row]: position for position, row in enumerate(self.delta_rows)
+                }
+                self.delta_ids = np.array([ids[row] for row in self.delta_rows], dtype="S")
+                self.delta_vectors = embed(matrix[self.delta_rows])
+                self.stale = np.array(
+                    [ids[row] for row in self.delta_rows if ids[row] in self.indexed], dtype="S"
+                )
+            needs_rebuild = len(self.delta_rows) > max(
+                MIN_REBUILD_DELTA, REBUILD_FRACTION * len(self.indexed)
+            )
+        if needs_rebuild:
+            self._schedule_rebuild()
+
+    def schedule_catch_up(self):
+        """catch_up() in the background; loading the feature store is slow."""
+        with self._lock:
+            if self.catching_up:
+                return
+            self.catching_up = True
+
+        def run():
+            try:
+                self.catch_up()
+            except Exception:
+                logger.exception("Similar-tracks index catch-up failed")
+            finally:
+                self.catching_up = False
+                connection.close()
+
+        catch_up_pool.submit(run)
+
+    def vector(self, spotify_id):
+        """The embedded vector of a delta or indexed song, or None."""
+        with self._lock:
+            position = self.delta_positions.get(spotify_id)
+            if position is not None:
+                return self.delta_vectors[position]
+            row = self.indexed.get(spotify_id)
+            if row is not None:
+                return np.asarray(self.vectors[row], dtype=np.float32)
+        return None
+
+    def search(self, query, k, exclude=None):
+        """[(spotify_id, distance)] of the k nearest songs to an embedded vector."""
+        with self._lock:
+            ids, vectors, offsets, centroids = self.ids, self.vectors, self.offsets, self.centroids
+            delta_ids, delta_vectors, stale = self.delta_ids, self.delta_vectors, self.stale
+
+        candidate_ids = [delta_ids]
+        candidate_vectors = [delta_vectors]
+        if len(centroids):
+            centroid_distances = ((centroids - query) ** 2).sum(axis=1)
+            probes = min(NPROBE, len(centroids))
+            for cluster in np.argpartition(centroid_distances, probes - 1)[:probes]:
+                start, end = offsets[cluster], offsets[cluster + 1]
+                cluster_ids, cluster_vectors = ids[start:end], vectors[start:end]
+                if len(stale):
+                    # The delta holds the current vectors of these songs.
+                    current = ~np.isin(cluster_ids, stale)
+                    cluster_ids, cluster_vectors = cluster_ids[current], cluster_vectors[current]
+                candidate_ids.append(cluster_ids)
+                candidate_vectors.append(cluster_vectors)
+        exclude = exclude.encode() if isinstance(exclude, str) else exclude
+        return top_k(
+            np.concatenate(candidate_ids),
+            np.concatenate(candidate_vectors),
+            query,
+            k,
+            exclude,
+        )
+
+
+index = SimilarIndex(INDEX_DIR)
+
+
+def similar_to(spotify_id, k=20):
+    """
+    Songs most like spotify_id as [(spotify_id, distance)], or None when we have
+    no audio features for it.
+    """
+    start = time.monotonic()
+    index.schedule_catch_up()
+    query = index.vector(spotify_id)
+    if query is None:
+        # Not caught up yet; use the store only if it's already in memory.
+        row = audio_features.store.rows.get(spotify_id)
+        if row is None:
+            return None
+        query = embed(audio_features.store.matrix[row : row + 1])[0]
+    results = index.search(query, k, exclude=spotify_id)
+    metrics.observe("similar.query_ms", (time.monotonic() - start) * 1000)
+    return results
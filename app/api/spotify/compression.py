@@ -0,0 +1,96 @@
+"""
+Response compression for the Spotify proxy views.
+
+Negotiates Brotli (when the brotli package is installed) or gzip from
+Accept-Encoding, honouring q-values, and compresses JSON bodies of at least
+MIN_SIZE bytes. Levels favour speed: the payloads are large but regenerated
+on every request, so a fast level wins over the last few percent of size.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_SIZE = getattr(settings, "SPOTIFY_COMPRESS_MIN_SIZE", 1024)
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+_CODING = re.compile(r"^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or "").split(","):
+        match = _CODING.match(part)
+        if match:
+            try:
+                accepted[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0)
+    options = [("br", 1)] if brotli is not None else []
+    options.append(("gzip", 0))
+    best = None
+    for coding, preference in options:
+        q = accepted.get(coding, wildcard)
+        if q > 0 and (best is None or (q, preference) > best[0]):
+            best = ((q, preference), coding)
+    return best[1] if best else None
+
+
+def compress(content, coding):
+    if coding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.process_response(request, self.get_response(request))
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < MIN_SIZE
+        ):
+            return response
+        coding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING"))
+        if coding is None:
+            return response
+
+        original = len(response.content)
+        compressed = compress(response.content, coding)
+        if len(compressed) >= original:
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = coding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        metrics.increment("spotify.compressed_responses", coding=coding)
+        metrics.observe("spotify.compression_ratio", len(compressed) / original, coding=coding)
+        return response
+
+
+compress_response = decorator_from_middleware(CompressionMiddleware)
@@ -0,0 +1,105 @@
+"""
+In-flight deduplication of identical Spotify GETs.
+
+Concurrent GETs with the same token, URL and params share one upstream call:
+the first caller (the leader) makes the request and everyone who arrives while
+it is pending (followers) waits on the leader's future and gets a copy of its
+response, or its exception.
+
+With SPOTIFY_COALESCE_ACROSS_WORKERS on, a leader also leaves a short-lived
+marker in the shared cache and publishes its response there, so followers in
+other worker processes can wait for it for up to FOLLOW_TIMEOUT instead of
+making the same request. Only responses below 500 are published.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache
+
+import metrics
+
+ACROSS_WORKERS = getattr(settings, "SPOTIFY_COALESCE_ACROSS_WORKERS", False)
+FOLLOW_TIMEOUT = getattr(settings, "SPOTIFY_COALESCE_FOLLOW_TIMEOUT", 2.0)
+MARKER_TTL = 10
+RESULT_TTL = 5
+POLL_INTERVAL = 0.02
+
+_pending = {}
+_lock = threading.Lock()
+
+
+def flight_key(method, url, params, headers):
+    token = (headers or {}).get("Authorization", "")
+    raw = f"{token}|{method.upper()}|{url}|{sorted((params or {}).items())}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _copy(response, build_response):
+    return build_response(response.status_code, response.content, headers=dict(response.headers))
+
+
+def _wait_for_other_worker(key, build_response):
+    deadline = time.monotonic() + FOLLOW_TIMEOUT
+    while time.monotonic() < deadline:
+        result = cache.get(f"spotify:inflight:result:{key}")
+        if result is not None:
+            return build_response(result["status"], result["content"], headers=result["headers"])
+        if cache.get(f"spotify:inflight:marker:{key}") is None:
+            return None
+        time.sleep(POLL_INTERVAL)
+    metrics.increment("spotify.coalesce.follow_timeouts")
+    return None
+
+
+def run(key, fetch, build_response, endpoint="default"):
+    """
+    fetch() once per key among concurrent callers; everyone gets their own
+    copy of the response. build_response(status, content, headers) makes copies.
+    """
+    with _lock:
+        leader = _pending.get(key)
+        if leader is None:
+            future = _pending[key] = Future()
+    if leader is not None:
+        metrics.increment("spotify.coalesce.followers", endpoint=endpoint, scope="process")
+        return _copy(leader.result(), build_response)
+
+    marked = False
+    try:
+        if ACROSS_WORKERS:
+            marked = cache.add(f"spotify:inflight:marker:{key}", True, MARKER_TTL)
+            if not marked:
+                shared = _wait_for_other_worker(key, build_response)
+                if shared is not None:
+                    metrics.increment("spotify.coalesce.followers", endpoint=endpoint, scope="shared")
+                    future.set_result(shared)
+                    return _copy(shared, build_response)
+            else:
+                cache.delete(f"spotify:inflight:result:{key}")
+
+        metrics.increment("spotify.coalesce.leaders", endpoint=endpoint)
+        response = fetch()
+        if marked and response.status_code < 500:
+            cache.set(
+                f"spotify:inflight:result:{key}",
+                {
+                    "status": response.status_code,
+                    "content": response.content,
+                    "headers": {"Content-Type": response.headers.get("Content-Type", "application/json")},
+                },
+                RESULT_TTL,
+            )
+        future.set_result(response)
+        return response
+    except BaseException as e:
+        if not future.done():
+            future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+        if marked:
+            cache.delete(f"spotify:inflight:marker:{key}")
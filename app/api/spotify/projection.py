@@ -0,0 +1,96 @@
+"""
+Sparse fieldsets for proxied Spotify documents.
+
+Field specs use Spotify's own `fields` syntax: comma-separated names, with
+parentheses selecting inside an object or inside every item of a list, e.g.
+"items(track(id,name,artists(name))),next". Endpoints that Spotify can filter
+(playlist tracks) get the spec passed upstream; everything else is projected
+here with project().
+
+"compact" selects a preset per kind of document that keeps what the client
+renders and drops markets, external URLs, hrefs and most images.
+"""
+
+PRESETS = {
+    "playlist_tracks": (
+        "items(added_at,track(id,uri,name,duration_ms,explicit,is_local,"
+        "artists(id,name),album(id,name,images(url,width)))),"
+        "limit,next,offset,previous,total"
+    ),
+    "playlists": (
+        "items(id,uri,name,public,collaborative,snapshot_id,owner(id,display_name),"
+        "images(url,width),tracks(total)),limit,next,offset,previous,total"
+    ),
+    "recommendations": (
+        "tracks(id,uri,name,duration_ms,explicit,popularity,preview_url,"
+        "artists(id,name),album(id,name,images(url,width))),seeds"
+    ),
+}
+
+
+class FieldSpecError(ValueError):
+    pass
+
+
+def parse(spec):
+    """
+    Parse a field spec into {name: sub-spec or None}; None keeps the whole
+    value. Raises FieldSpecError for unbalanced parentheses or empty names.
+    """
+    tree, position = _parse(spec.replace(" ", ""), 0)
+    if position != len(spec.replace(" ", "")):
+        raise FieldSpecError(f"Unexpected ')' at {position} in fields")
+    return tree
+
+
+def _parse(spec, position):
+    tree = {}
+    name = ""
+    while position < len(spec):
+        char = spec[position]
+        if char == ",":
+            if name:
+                tree.setdefault(name, None)
+            name = ""
+            position += 1
+        elif char == "(":
+            if not name:
+                raise FieldSpecError(f"Missing field name before '(' at {position}")
+            sub, position = _parse(spec, position + 1)
+            if position >= len(spec) or spec[position] != ")":
+                raise FieldSpecError("Unbalanced parentheses in fields")
+            tree[name] = sub
+            name = ""
+            position += 1
+        elif char == ")":
+            break
+        else:
+            name += char
+            position += 1
+    if name:
+        tree.setdefault(name, None)
+    return tree, position
+
+
+def project(document, tree):
+    """The parts of document selected by a parsed spec; lists are projected item by item."""
+    if tree is None:
+        return document
+    if isinstance(document, list):
+        return [project(item, tree) for item in document]
+    if not isinstance(document, dict):
+        return document
+    return {key: project(document[key], sub) for key, sub in tree.items() if key in document}
+
+
+def requested(params, kind):
+    """
+    The spec asked for with ?fields= (or ?compact=1), with "compact" expanded
+    to the preset for this kind of document; None when the client wants it all.
+    """
+    fields = params.get("fields")
+    if not fields and params.get("compact", "").lower() in ("1", "true", "yes"):
+        fields = "compact"
+    if fields == "compact":
+        return PRESETS[kind]
+    return fields or None
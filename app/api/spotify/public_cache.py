@@ -0,0 +1,182 @@
+"""
+Shared cache for public Spotify resources.
+
+Tracks, artists, albums and audio features look the same to every user, and
+so do public playlists. GETs for those are fetched once with the app's
+client-credentials token and kept in the shared cache for all users, instead of
+once per user token.
+
+Playlist entries are keyed by the playlist's snapshot_id, so an edited playlist
+is simply a new entry. Whether a playlist is public, and its current snapshot,
+come from a small metadata lookup that is itself cached for PLAYLIST_FRESH
+seconds. Private and collaborative playlists, and everything under /me and
+/users, keep going through the caller's own token.
+
+Entries are stale-while-revalidate: once past their freshness window they are
+still served (up to STALE_TTL), and a background refresh fetches a new copy.
+Responses fetched this way carry no user market, so tracks aren't relinked.
+"""
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+import fastjson
+import metrics
+from . import upstream
+from .upstream import SPOTIFY_API_URL
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "SPOTIFY_PUBLIC_CACHE", True)
+RESOURCE_FRESH = getattr(settings, "SPOTIFY_PUBLIC_CACHE_FRESH", 60 * 60)
+PLAYLIST_FRESH = getattr(settings, "SPOTIFY_PUBLIC_PLAYLIST_FRESH", 60)
+STALE_TTL = getattr(settings, "SPOTIFY_PUBLIC_CACHE_STALE", 60 * 60 * 24)
+REFRESH_LOCK_TTL = 30
+PLAYLIST_META_FIELDS = "public,collaborative,snapshot_id"
+
+PUBLIC_PATH = re.compile(r"^/(tracks|artists|albums|audio-features)(/|$)")
+PLAYLIST_PATH = re.compile(r"^/playlists/([^/]+)(/tracks)?$")
+
+refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="spotify-public-refresh")
+
+
+def _key(url, params, version):
+    params = sorted((params or {}).items())
+    return f"spotify:public:{url}:{params}:{version}"
+
+
+def _meta_key(playlist_id):
+    return f"spotify:public:playlist:{playlist_id}"
+
+
+def _fetch(client, url, params, endpoint):
+    """GET url with the client-credentials token; the response, or None on failure."""
+    try:
+        token = client.get_access_token()
+    except Exception:
+        logger.exception("Could not get a client-credentials token for the public cache")
+        return None
+    return upstream.send(
+        endpoint,
+        "GET",
+        url,
+        headers={"Authorization": f"Bearer {token}"},
+        params=params,
+    )
+
+
+def _schedule(lock_key, refresh):
+    # One refresh per entry at a time, across all workers.
+    if not cache.add(lock_key, True, REFRESH_LOCK_TTL):
+        return
+
+    def run():
+        try:
+            refresh()
+        except Exception:
+            logger.exception(f"Refreshing {lock_key} failed")
+        finally:
+            cache.delete(lock_key)
+
+    metrics.increment("spotify.public_cache.refreshes")
+    refresh_pool.submit(run)
+
+
+def _load_playlist_meta(client, playlist_id):
+    response = _fetch(
+        client,
+        f"{SPOTIFY_API_URL}/playlists/{playlist_id}",
+        {"fields": PLAYLIST_META_FIELDS},
+        "playlists",
+    )
+    if response is None:
+        return None
+    if response.status_code in (401, 403, 404):
+        # The app token can't see it, so it's private to someone.
+        meta = {"public": False, "snapshot_id": None}
+    elif response.status_code == 200:
+        data = fastjson.decode(response)
+        meta = {
+            "public": data.get("public") is True and not data.get("collaborative"),
+            "snapshot_id": data.get("snapshot_id"),
+        }
+    else:
+        return None
+    meta["fetched_at"] = time.time()
+    cache.set(_meta_key(playlist_id), meta, STALE_TTL)
+    return meta
+
+
+def _playlist_meta(client, playlist_id):
+    meta = cache.get(_meta_key(playlist_id))
+    if meta is None:
+        return _load_playlist_meta(client, playlist_id)
+    if time.time() - meta["fetched_at"] > PLAYLIST_FRESH:
+        _schedule(
+            f"{_meta_key(playlist_id)}:refresh",
+            lambda: _load_playlist_meta(client, playlist_id),
+        )
+    return meta
+
+
+def _store(key, response):
+    cache.set(key, {"fetched_at": time.time(), "content": response.content}, STALE_TTL)
+
+
+def _refresh(client, key, url, params, endpoint):
+    response = _fetch(client, url, params, endpoint)
+    if response is not None and response.status_code == 200:
+        _store(key, response)
+
+
+def get(client, url, params=None, endpoint="default"):
+    """
+    A shared response for a public GET, or None when the resource is (or may
+    be) private and has to go through the caller's own token.
+    """
+    if not ENABLED or not url.startswith(SPOTIFY_API_URL):
+        return None
+    path = url[len(SPOTIFY_API_URL):].split("?")[0]
+
+    playlist = PLAYLIST_PATH.match(path)
+    if playlist:
+        meta = _playlist_meta(client, playlist.group(1))
+        if meta is None or not meta["public"]:
+            return None
+        # The snapshot in the key makes each version of a playlist its own entry,
+        # so playlist entries stay fresh until the metadata says otherwise.
+        version, fresh_for = meta["snapshot_id"], STALE_TTL
+    elif PUBLIC_PATH.match(path):
+        version, fresh_for = "", RESOURCE_FRESH
+    else:
+        return None
+
+    key = _key(url, params, version)
+    entry = cache.get(key)
+    if entry is not None:
+        if time.time() - entry["fetched_at"] > fresh_for:
+            _schedule(f"{key}:refresh", lambda: _refresh(client, key, url, params, endpoint))
+        metrics.increment("spotify.public_cache.hits", endpoint=endpoint)
+        return upstream.build_response(
+            200, entry["content"], headers={"X-Spotify-Cache": "shared"}
+        )
+
+    metrics.increment("spotify.public_cache.misses", endpoint=endpoint)
+    response = _fetch(client, url, params, endpoint)
+    if response is None or response.status_code != 200:
+        return None
+    _store(key, response)
+    return response
+
+
+def forget(url):
+    """Drop cached playlist metadata after a write, so the next read sees the new snapshot."""
+    if not url.startswith(SPOTIFY_API_URL):
+        return
+    playlist = re.match(r"^/playlists/([^/]+)", url[len(SPOTIFY_API_URL):])
+    if playlist:
+        cache.delete(_meta_key(playlist.group(1)))
@@ -0,0 +1,129 @@
+"""
+Recommendation results shared between saved queries with identical parameters.
+
+Queries are keyed by Query.parameters_hash. A result fetched for one query is
+reused by every query with the same hash until it is older than
+QUERY_RESULTS_FRESHNESS seconds.
+"""
+import logging
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+import fastjson
+from backend import tracks
+from backend.models import Query
+from .views import build_recommendation_params, fetch_recommendations
+
+logger = logging.getLogger(__name__)
+
+FRESHNESS = getattr(settings, "QUERY_RESULTS_FRESHNESS", 6 * 60 * 60)
+DEFAULT_LIMIT = 100
+
+
+class RefreshError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _cache_key(parameters_hash):
+    return f"query-results:{parameters_hash}"
+
+
+def fresh_results(parameters_hash):
+    """Return (track_ids, fetched_at) of a result still within the window, or None."""
+    cached = cache.get(_cache_key(parameters_hash))
+    if cached is not None:
+        return cached
+
+    cutoff = timezone.now() - timezone.timedelta(seconds=FRESHNESS)
+    row = (
+        Query.objects.filter(
+            parameters_hash=parameters_hash, results_updated_at__gte=cutoff
+        )
+        .exclude(track_ids=[])
+        .order_by("-results_updated_at")
+        .values_list("track_ids", "results_updated_at")
+        .first()
+    )
+    if row is None:
+        return None
+    remember(parameters_hash, *row)
+    return row
+
+
+def remember(parameters_hash, track_ids, fetched_at):
+    remaining = FRESHNESS - (timezone.now() - fetched_at).total_seconds()
+    if remaining > 0:
+        cache.set(_cache_key(parameters_hash), (track_ids, fetched_at), int(remaining))
+
+
+def params_from_query(parameters):
+    """
+    Map saved query parameters onto Spotify recommendation params, as the client
+    does. Raises RefreshError(400) for parameters the client could not have saved.
+    """
+    if not isinstance(parameters, dict):
+        raise RefreshError(400, "Saved query parameters must be an object")
+    selections = parameters.get("selections") or []
+    if not isinstance(selections, list):
+        raise RefreshError(400, "Saved query selections must be a list")
+    seeds = {"artist": [], "track": [], "genre": []}
+    for selection in selections:
+        if not isinstance(selection, dict) or not isinstance(selection.get("id"), str):
+            raise RefreshError(400, "Every saved query selection needs a string id")
+        kind = selection.get("type")
+        if kind not in seeds:
+            if selection.get("artistName"):
+                kind = "track"
+            elif selection.get("imageUrl"):
+                kind = "artist"
+            else:
+                kind = "genre"
+        seeds[kind].append(selection["id"])
+
+    return build_recommendation_params(
+        ",".join(seeds["artist"]),
+        ",".join(seeds["genre"]),
+        ",".join(seeds["track"]),
+        str(parameters.get("limit", DEFAULT_LIMIT)),
+        parameters.get("advancedParams") or {},
+    )
+
+
+def refresh_query(query):
+    """
+    Bring query.track_ids up to date, reusing a fresh shared result when one
+    exists and fetching from Spotify otherwise. Returns True if reused.
+    """
+    shared = fresh_results(query.parameters_hash)
+    reused = shared is not None
+    if reused:
+        track_ids, fetched_at = shared
+    else:
+        try:
+            response = fetch_recommendations(params_from_query(query.parameters))
+        except requests.RequestException as e:
+            logger.error(f"Spotify unavailable refreshing query {query.pk}: {str(e)}")
+            raise RefreshError(503, "Spotify is temporarily unavailable")
+        if response.status_code != 200:
+            raise RefreshError(
+                response.status_code,
+                f"Spotify API error: {response.status_code} - {response.text}",
+            )
+        results = fastjson.decode(response)["tracks"]
+        tracks.ingest(results)
+        track_ids = [track["id"] for track in results]
+        fetched_at = timezone.now()
+        remember(query.parameters_hash, track_ids, fetched_at)
+
+    logger.info(
+        f"Refreshed query {query.pk} ({'shared result' if reused else 'fetched'})"
+    )
+    query.track_ids = track_ids
+    query.results_updated_at = fetched_at
+    query.save(update_fields=["track_ids", "results_updated_at", "updated_at"])
+    return reused
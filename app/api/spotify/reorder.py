@@ -0,0 +1,126 @@
+"""
+Turn a playlist's current order into an arbitrary target order with few
+Spotify range moves.
+
+Tracks on the longest increasing subsequence (by target position) never move.
+Every other track is moved to sit right after its target predecessor, in target
+order, and runs of tracks that are already adjacent and in order move together
+as one range. Moves use Spotify's PUT /playlists/{id}/tracks semantics, where
+insert_before is an index into the list as it was before that move.
+"""
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from backend import tracks
+from .. import ordering
+from ..models import Playlist, PlaylistSong
+
+# Spotify accepts at most this many URIs per replace or add call.
+URI_BATCH_SIZE = 100
+
+
+def target_ranks(current, target):
+    """
+    Target position of each current item. Duplicates are matched in order of
+    appearance. Raises ValueError unless target is a permutation of current.
+    """
+    if len(current) != len(target):
+        raise ValueError("Target order must contain exactly the playlist's tracks")
+    positions = defaultdict(deque)
+    for index, item in enumerate(target):
+        positions[item].append(index)
+    ranks = []
+    for item in current:
+        if not positions[item]:
+            raise ValueError("Target order must contain exactly the playlist's tracks")
+        ranks.append(positions[item].popleft())
+    return ranks
+
+
+def longest_increasing(values):
+    """Set of indexes into values forming a longest strictly increasing subsequence."""
+    tails = []
+    tail_indexes = []
+    previous = [-1] * len(values)
+    for index, value in enumerate(values):
+        slot = bisect_left(tails, value)
+        if slot == len(tails):
+            tails.append(value)
+            tail_indexes.append(index)
+        else:
+            tails[slot] = value
+            tail_indexes[slot] = index
+        previous[index] = tail_indexes[slot - 1] if slot else -1
+
+    keep = set()
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index != -1:
+        keep.add(index)
+        index = previous[index]
+    return keep
+
+
+def apply_move(items, range_start, range_length, insert_before):
+    block = items[range_start:range_start + range_length]
+    if insert_before < range_start:
+        return items[:insert_before] + block + items[insert_before:range_start] + items[range_start + range_length:]
+    return items[:range_start] + items[range_start + range_length:insert_before] + block + items[insert_before:]
+
+
+def plan_moves(current, target, max_moves=None):
+    """
+    [(range_start, range_length, insert_before)] that turns current into target
+    when applied in order, or None once more than max_moves would be needed.
+    """
+    ranks = target_ranks(current, target)
+    keep = {ranks[index] for index in longest_increasing(ranks)}
+    working = list(ranks)
+    moves = []
+
+    rank = 0
+    total = len(ranks)
+    while rank < total:
+        if rank in keep:
+            rank += 1
+            continue
+        start = working.index(rank)
+        length = 1
+        while (
+            rank + length < total
+            and rank + length not in keep
+            and start + length < total
+            and working[start + length] == rank + length
+        ):
+            length += 1
+        insert_before = working.index(rank - 1) + 1 if rank else 0
+        if not start <= insert_before <= start + length:
+            moves.append((start, length, insert_before))
+            if max_moves is not None and len(moves) > max_moves:
+                return None
+            working = apply_move(working, start, length, insert_before)
+        rank += length
+    return moves
+
+
+def replace_calls(count):
+    """Calls needed to rewrite a playlist of `count` tracks with replace + add."""
+    return max(1, -(-count // URI_BATCH_SIZE))
+
+
+def mirror_order(user, spotify_playlist_id, uris):
+    """Copy a Spotify order onto the local PlaylistSong rows, if we mirror that playlist."""
+    playlist = Playlist.objects.filter(user=user, spotify_id=spotify_playlist_id).first()
+    if playlist is None:
+        return 0
+    positions = {}
+    for index, uri in enumerate(uris):
+        positions.setdefault(tracks.track_id(uri), ordering.order_for_position(index))
+    changed = [
+        PlaylistSong(pk=pk, order=positions[spotify_id])
+        for pk, spotify_id, order in PlaylistSong.objects.filter(playlist=playlist).values_list(
+            "pk", "song__spotify_id", "order"
+        )
+        if spotify_id in positions and positions[spotify_id] != order
+    ]
+    PlaylistSong.objects.bulk_update(changed, ["order"], batch_size=1000)
+    return len(changed)
@@ -1,7 +1,34 @@
 from rest_framework import serializers
-from backend.models import Query
+from backend.models import Query, hash_parameters
+from backend import tracks
+from . import query_results
+
+
+class RecommendationsField(serializers.Field):
+    """
+    Accepts track objects, URIs or ids and stores compact track ids. Renders
+    track URIs, or full track objects when the request asks for ?expand=tracks.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError("Expected a list of tracks.")
+        if not all(isinstance(item, (str, dict)) for item in data):
+            raise serializers.ValidationError(
+                "Each track must be a track object, URI or id."
+            )
+        return data
+
+    def to_representation(self, track_ids):
+        request = self.context.get("request")
+        if request is not None and request.query_params.get("expand") == "tracks":
+            return tracks.hydrate(track_ids)
+        return [tracks.track_uri(track_id) for track_id in track_ids]
+
 
 class QuerySerializer(serializers.ModelSerializer):
+    recommendations = RecommendationsField(source='track_ids', required=False)
+
     class Meta:
         model = Query
         fields = ['id', 'name', 'parameters', 'recommendations', 'created_at', 'updated_at']
@@ -11,4 +38,27 @@ class QuerySerializer(serializers.ModelSerializer):
         user = self.context['request'].user
         # Remove 'user' from validated_data if it's present
         validated_data.pop('user', None)
+        if validated_data.get('track_ids'):
+            validated_data['track_ids'] = tracks.compact(validated_data['track_ids'])
+        else:
+            # Reuse a result fetched for identical parameters instead of starting empty.
+            # Only server-fetched results are shared; client-supplied ones stay private.
+            shared = query_results.fresh_results(hash_parameters(validated_data['parameters']))
+            if shared is not None:
+                validated_data['track_ids'], validated_data['results_updated_at'] = shared
         return Query.objects.create(user=user, **validated_data)
+
+    def update(self, instance, validated_data):
+        if 'track_ids' in validated_data:
+            validated_data['track_ids'] = tracks.compact(validated_data['track_ids'])
+            validated_data['results_updated_at'] = None
+        elif 'parameters' in validated_data and hash_parameters(validated_data['parameters']) != instance.parameters_hash:
+            validated_data['results_updated_at'] = None
+        return super().update(instance, validated_data)
+
+
+class QueryListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Query
+        fields = ['id', 'name', 'parameters', 'created_at', 'updated_at']
+        read_only_fields = fields
@@ -0,0 +1,391 @@
+"""
+A local stand-in for the parts of the Spotify Web API this project uses.
+
+Point SPOTIFY_API_URL at ``http://<host>:<port>/v1`` and SPOTIFY_ACCOUNTS_URL at
+``http://<host>:<port>`` to use it. Latency, error rate and 429 injection are set
+at startup and can be changed while running with ``POST /__stub/config``.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from . import projection
+
+logger = logging.getLogger(__name__)
+
+
+GENRES = [
+    "acoustic", "ambient", "blues", "classical", "electronic",
+    "hip-hop", "jazz", "pop", "rock", "soul",
+]
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: int = 1
+    playlists: int = 40
+    tracks_per_playlist: int = 250
+    seed: int = 0
+
+
+def track_id(n):
+    return f"stubtrack{n:013d}"
+
+
+def make_track(n):
+    tid = track_id(n)
+    artist_id = f"stubartist{n % 997:012d}"
+    album_id = f"stubalbum{n % 4999:013d}"
+    return {
+        "id": tid,
+        "uri": f"spotify:track:{tid}",
+        "name": f"Stub Track {n}",
+        "type": "track",
+        "duration_ms": 120000 + (n * 7919) % 180000,
+        "popularity": n % 100,
+        "explicit": n % 5 == 0,
+        "preview_url": None,
+        "track_number": n % 12 + 1,
+        "external_ids": {"isrc": f"QZSTB{n % 10_000_000:07d}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{tid}"},
+        "href": f"https://api.spotify.com/v1/tracks/{tid}",
+        "available_markets": ["US", "GB", "DE", "FR", "ES", "IT", "CA", "MX", "BR", "JP"],
+        "artists": [
+            {
+                "id": artist_id,
+                "name": f"Stub Artist {n % 997}",
+                "type": "artist",
+                "uri": f"spotify:artist:{artist_id}",
+                "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+            }
+        ],
+        "album": {
+            "id": album_id,
+            "name": f"Stub Album {n % 4999}",
+            "type": "album",
+            "release_date": f"{2000 + n % 24}-01-01",
+            "uri": f"spotify:album:{album_id}",
+            "images": [
+                {"url": f"https://i.scdn.co/image/{album_id}-{size}", "height": size, "width": size}
+                for size in (640, 300, 64)
+            ],
+        },
+    }
+
+
+def make_audio_features(n):
+    rng = random.Random(n)
+    tid = track_id(n)
+    return {
+        "id": tid,
+        "uri": f"spotify:track:{tid}",
+        "type": "audio_features",
+        "acousticness": round(rng.random(), 3),
+        "danceability": round(rng.random(), 3),
+        "energy": round(rng.random(), 3),
+        "instrumentalness": round(rng.random() ** 3, 3),
+        "key": rng.randrange(12),
+        "duration_ms": 120000 + (n * 7919) % 180000,
+        "liveness": round(rng.random() ** 2, 3),
+        "loudness": round(-rng.random() * 30, 2),
+        "mode": rng.randrange(2),
+        "speechiness": round(rng.random() ** 3, 3),
+        "tempo": round(60 + rng.random() * 120, 3),
+        "time_signature": rng.choice([3, 4, 4, 4, 5]),
+        "valence": round(rng.random(), 3),
+    }
+
+
+def make_playlist(user_id, index, tracks_total):
+    pid = f"stubplaylist{index:010d}"
+    return {
+        "id": pid,
+        "name": f"Stub Playlist {index}",
+        "description": "",
+        "public": index % 2 == 0,
+        "collaborative": False,
+        "snapshot_id": f"snapshot-{pid}-0",
+        "uri": f"spotify:playlist:{pid}",
+        "owner": {"id": user_id, "display_name": user_id, "type": "user"},
+        "images": [{"url": f"https://i.scdn.co/image/{pid}", "height": 640, "width": 640}],
+        "tracks": {"href": f"https://api.spotify.com/v1/playlists/{pid}/tracks", "total": tracks_total},
+    }
+
+
+class StubState:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.requests = 0
+        self.created = {}
+
+    def update(self, values):
+        with self.lock:
+            for key, value in values.items():
+                if hasattr(self.config, key):
+                    setattr(self.config, key, type(getattr(self.config, key))(value))
+
+    def roll(self):
+        with self.lock:
+            self.requests += 1
+            config = self.config
+            delay = config.latency_ms + self.random.uniform(0, config.jitter_ms)
+            draw = self.random.random()
+        if draw < config.rate_limit_rate:
+            return delay, 429
+        if draw < config.rate_limit_rate + config.error_rate:
+            return delay, 503
+        return delay, None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "SpotifyStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    def _send(self, status_code, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+    def _handle(self, method):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/")
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        # Always drain the body so keep-alive connections stay in sync after a fault.
+        body = self._body() if method in ("POST", "PUT", "DELETE") else {}
+
+        if path == "/__stub/config":
+            if method == "POST":
+                self.state.update(body)
+            return self._send(200, asdict(self.state.config))
+
+        delay, fault = self.state.roll()
+        if delay:
+            time.sleep(delay / 1000)
+        if fault == 429:
+            return self._send(
+                429,
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                headers={"Retry-After": str(self.state.config.retry_after)},
+            )
+        if fault:
+            return self._send(fault, {"error": {"status": fault, "message": "Service unavailable"}})
+
+        segments = path.strip("/").split("/")
+        handler = self._route(method, segments)
+        if handler is None:
+            return self._send(404, {"error": {"status": 404, "message": "Not found"}})
+        status_code, payload = handler(segments, query, body)
+        self._send(status_code, payload)
+
+    def _route(self, method, segments):
+        routes = {
+            ("POST", ("api", "token")): self.token,
+            ("GET", ("v1", "me")): self.me,
+            ("GET", ("v1", "users", None, "playlists")): self.user_playlists,
+            ("POST", ("v1", "users", None, "playlists")): self.create_playlist,
+            ("GET", ("v1", "playlists", None, "tracks")): self.playlist_tracks,
+            ("POST", ("v1", "playlists", None, "tracks")): self.snapshot,
+            ("PUT", ("v1", "playlists", None, "tracks")): self.snapshot,
+            ("DELETE", ("v1", "playlists", None, "tracks")): self.snapshot,
+            ("DELETE", ("v1", "playlists", None, "followers")): self.unfollow,
+            ("GET", ("v1", "tracks")): self.tracks,
+            ("GET", ("v1", "audio-features")): self.audio_features,
+            ("GET", ("v1", "recommendations")): self.recommendations,
+            ("GET", ("v1", "recommendations", "available-genre-seeds")): self.genre_seeds,
+        }
+        for (route_method, pattern), handler in routes.items():
+            if route_method != method or len(pattern) != len(segments):
+                continue
+            if all(p is None or p == s for p, s in zip(pattern, segments)):
+                return handler
+        return None
+
+    def token(self, segments, query, body):
+        payload = {
+            "access_token": f"stub-access-{int(time.time() * 1000)}",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "scope": "",
+        }
+        if body.get("grant_type") in ("authorization_code", "refresh_token"):
+            payload["refresh_token"] = "stub-refresh"
+        return 200, payload
+
+    def me(self, segments, query, body):
+        return 200, {
+            "id": "stubuser",
+            "display_name": "Stub User",
+            "email": "stub@example.com",
+            "country": "US",
+            "product": "premium",
+            "followers": {"href": None, "total": 0},
+            "images": [],
+            "type": "user",
+            "uri": "spotify:user:stubuser",
+        }
+
+    def _page(self, href, items, total, query, default_limit):
+        limit = min(int(query.get("limit", default_limit)), 100)
+        offset = int(query.get("offset", 0))
+        next_offset = offset + limit
+        return {
+            "href": f"{href}?offset={offset}&limit={limit}",
+            "items": items(offset, min(limit, max(total - offset, 0))),
+            "limit": limit,
+            "offset": offset,
+            "total": total,
+            "next": f"{href}?offset={next_offset}&limit={limit}" if next_offset < total else None,
+            "previous": f"{href}?offset={max(offset - limit, 0)}&limit={limit}" if offset else None,
+        }
+
+    def user_playlists(self, segments, query, body):
+        user_id = segments[2]
+        config = self.state.config
+        return 200, self._page(
+            f"https://api.spotify.com/v1/users/{user_id}/playlists",
+            lambda offset, count: [
+                make_playlist(user_id, offset + i, config.tracks_per_playlist)
+                for i in range(count)
+            ],
+            config.playlists,
+            query,
+            20,
+        )
+
+    def create_playlist(self, segments, query, body):
+        with self.state.lock:
+            index = self.state.config.playlists + len(self.state.created)
+            playlist = make_playlist(segments[2], index, 0)
+            playlist["name"] = body.get("name", playlist["name"])
+            self.state.created[playlist["id"]] = playlist
+        return 201, playlist
+
+    def playlist_tracks(self, segments, query, body):
+        playlist_id = segments[2]
+        base = sum(ord(c) for c in playlist_id) * 1000
+        total = self.state.config.tracks_per_playlist
+        page = self._page(
+            f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+            lambda offset, count: [
+                {
+                    "added_at": "2024-01-01T00:00:00Z",
+                    "is_local": False,
+                    "track": make_track(base + offset + i),
+                }
+                for i in range(count)
+            ],
+            total,
+            query,
+            100,
+        )
+        if query.get("fields"):
+            page = projection.project(page, projection.parse(query["fields"]))
+        return 200, page
+
+    def snapshot(self, segments, query, body):
+        status_code = 201 if self.command == "POST" else 200
+        return status_code, {"snapshot_id": f"snapshot-{segments[2]}-{int(time.time() * 1000)}"}
+
+    def unfollow(self, segments, query, body):
+        return 200, None
+
+    def tracks(self, segments, query, body):
+        ids = [i for i in query.get("ids", "").split(",") if i]
+        if not ids or len(ids) > 50:
+            return 400, {"error": {"status": 400, "message": "Invalid ids"}}
+        return 200, {
+            "tracks": [
+                make_track(int(i[len("stubtrack"):]))
+                if i.startswith("stubtrack") and i[len("stubtrack"):].isdigit()
+                else None
+                for i in ids
+            ]
+        }
+
+    def audio_features(self, segments, query, body):
+        ids = [i for i in query.get("ids", "").split(",") if i]
+        if not ids or len(ids) > 100:
+            return 400, {"error": {"status": 400, "message": "Invalid ids"}}
+        return 200, {
+            "audio_features": [
+                make_audio_features(int(i[len("stubtrack"):]))
+                if i.startswith("stubtrack") and i[len("stubtrack"):].isdigit()
+                else None
+                for i in ids
+            ]
+        }
+
+    def recommendations(self, segments, query, body):
+        limit = min(int(query.get("limit", 20)), 100)
+        seed = sum(ord(c) * (i + 1) for i, c in enumerate(str(sorted(query.items()))))
+        return 200, {
+            "seeds": [
+                {"id": value, "type": key.replace("seed_", "").rstrip("s").upper()}
+                for key, value in query.items()
+                if key.startswith("seed_") and value
+            ],
+            "tracks": [make_track(seed + i) for i in range(limit)],
+        }
+
+    def genre_seeds(self, segments, query, body):
+        return 200, {"genres": GENRES}
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def make_server(host="127.0.0.1", port=8765, config=None):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(config or StubConfig())
+    return server
+
+
+def start_in_thread(host="127.0.0.1", port=8765, config=None):
+    server = make_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
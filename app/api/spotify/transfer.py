@@ -0,0 +1,313 @@
+"""
+Streaming playlist export and import.
+
+Exports walk a user's playlists one page at a time, either from Spotify or
+from the local Playlist/PlaylistSong mirror, and yield CSV or NDJSON lines as
+they go, so memory use doesn't grow with the size of the library.
+
+Imports read the upload line by line and work through it CHUNK_SIZE rows at a
+time. Each chunk's ISRCs are resolved against Song with a single query, and the
+resolved URIs go to Spotify in batches of 100. Different playlists are pushed
+in parallel; batches for the same playlist go in file order. The import
+reports its progress as NDJSON events while it runs.
+"""
+import codecs
+import csv
+import json
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+import fastjson
+from backend import tracks
+from ..models import Playlist, PlaylistSong, Song
+from .upstream import SPOTIFY_API_URL
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["playlist_id", "playlist_name", "position", "uri", "isrc", "name", "artists"]
+FORMATS = ("csv", "ndjson")
+PLAYLIST_PAGE_SIZE = 50
+TRACK_PAGE_SIZE = 100
+TRACK_FIELDS = "next,items(track(id,uri,name,artists(name),external_ids))"
+CHUNK_SIZE = 500
+URI_BATCH_SIZE = 100
+IMPORT_WORKERS = getattr(settings, "PLAYLIST_IMPORT_WORKERS", 4)
+MAX_IN_FLIGHT = IMPORT_WORKERS * 2
+MISSING_REPORTED = 100
+
+push_pool = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="playlist-import")
+
+
+class TransferError(Exception):
+    pass
+
+
+class Echo:
+    """Write-only file for csv.writer that hands back what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def _row(playlist_id, playlist_name, position, track):
+    return {
+        "playlist_id": playlist_id,
+        "playlist_name": playlist_name,
+        "position": position,
+        "uri": track.get("uri") or tracks.track_uri(track.get("id")),
+        "isrc": (track.get("external_ids") or {}).get("isrc", ""),
+        "name": track.get("name", ""),
+        "artists": ", ".join(artist["name"] for artist in track.get("artists") or []),
+    }
+
+
+def _spotify_pages(client, request, url, params, endpoint):
+    while url:
+        response = client.make_spotify_request(request, url, params=params, endpoint=endpoint)
+        if response.status_code != 200:
+            raise TransferError(f"Spotify API error: {response.status_code} - {response.text}")
+        page = fastjson.decode(response)
+        yield page
+        url, params = page.get("next"), None
+
+
+def spotify_rows(client, request, user_id):
+    """Rows for every track of every playlist the user has on Spotify."""
+    for page in _spotify_pages(
+        client,
+        request,
+        f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
+        {"limit": str(PLAYLIST_PAGE_SIZE), "offset": "0"},
+        "playlists",
+    ):
+        for playlist in page.get("items", []):
+            position = 0
+            for track_page in _spotify_pages(
+                client,
+                request,
+                f"{SPOTIFY_API_URL}/playlists/{playlist['id']}/tracks",
+                {"limit": str(TRACK_PAGE_SIZE), "fields": TRACK_FIELDS},
+                "playlist_tracks",
+            ):
+                # These items are field-limited, so they stay out of the track store.
+                items = [item.get("track") for item in track_page.get("items", [])]
+                for track in items:
+                    if track and track.get("id"):
+                        yield _row(playlist["id"], playlist["name"], position, track)
+                        position += 1
+
+
+def local_rows(user):
+    """Rows for every track of the user's mirrored playlists, in playlist order."""
+    for playlist in Playlist.objects.filter(user=user).order_by("pk").iterator():
+        songs = (
+            PlaylistSong.objects.filter(playlist=playlist)
+            .order_by("order", "id")
+            .values_list("song__spotify_id", "song__isrc", "song__title", "song__artists")
+        )
+        for position, (spotify_id, isrc, title, artists) in enumerate(
+            songs.iterator(chunk_size=1000)
+        ):
+            track = {"id": spotify_id, "external_ids": {"isrc": isrc}, "name": title, "artists": artists}
+            yield _row(playlist.spotify_id, playlist.name, position, track)
+
+
+def encode(rows, output):
+    """Serialize rows lazily as CSV (with a header) or NDJSON."""
+    if output == "csv":
+        writer = csv.DictWriter(Echo(), fieldnames=COLUMNS)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield fastjson.dumps(row) + b"\n"
+
+
+def guess_format(name, content_type):
+    if (name or "").lower().endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return "ndjson"
+
+
+def parse(lines, input_format):
+    """Rows from an iterable of raw upload lines, decoded as they're read."""
+    text = codecs.iterdecode(lines, "utf-8-sig")
+    if input_format == "csv":
+        yield from csv.DictReader(text)
+        return
+    for number, line in enumerate(text, start=1):
+        if line.strip():
+            try:
+                yield fastjson.loads(line)
+            except ValueError:
+                raise TransferError(f"Line {number} is not valid JSON")
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def resolve(chunk):
+    """Spotify URI for each row (None if unresolved), looking ISRCs up in one query."""
+    isrcs = {
+        row["isrc"].strip().upper()
+        for row in chunk
+        if not row.get("uri") and row.get("isrc")
+    }
+    by_isrc = dict(Song.objects.filter(isrc__in=isrcs).values_list("isrc", "spotify_id"))
+    uris = []
+    for row in chunk:
+        if row.get("uri"):
+            uris.append(tracks.track_uri(tracks.track_id(row["uri"])))
+        else:
+            spotify_id = by_isrc.get((row.get("isrc") or "").strip().upper())
+            uris.append(tracks.track_uri(spotify_id) if spotify_id else None)
+    return uris
+
+
+class PlaylistImport:
+    """
+    Import rows into new Spotify playlists, one per source playlist, and yield
+    progress events as dicts.
+    """
+
+    def __init__(self, client, request, user_id):
+        self.client = client
+        self.request = request
+        self.user_id = user_id
+        self.playlists = {}
+        self.lanes = {}
+        self.tasks = []
+        self.in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+        self.lock = threading.Lock()
+        self.errors = []
+        self.missing = []
+        self.counts = {"rows": 0, "resolved": 0, "missing": 0, "added": 0}
+
+    def playlist_for(self, row):
+        key = row.get("playlist_id") or row.get("playlist_name") or ""
+        if key not in self.playlists:
+            response = self.client.make_spotify_request(
+                self.request,
+                f"{SPOTIFY_API_URL}/users/{self.user_id}/playlists",
+                method="POST",
+                data=fastjson.dumps(
+                    {
+                        "name": row.get("playlist_name") or "Imported playlist",
+                        "description": "Imported with Audafact",
+                        "public": False,
+                    }
+                ),
+                endpoint="playlists",
+            )
+            if response.status_code != 201:
+                raise TransferError(f"Spotify API error: {response.status_code} - {response.text}")
+            created = fastjson.decode(response)
+            self.playlists[key] = {"id": created["id"], "name": created["name"], "tracks": 0}
+        return self.playlists[key]
+
+    def _drain(self, playlist, lane):
+        # Batches for one playlist must land in order: one task per playlist
+        # sends them one after another, instead of workers waiting on each other.
+        try:
+            while True:
+                with self.lock:
+                    if not lane["batches"]:
+                        lane["running"] = False
+                        return
+                    uris = lane["batches"].popleft()
+                self._add(playlist, uris)
+        finally:
+            connection.close()
+
+    def _add(self, playlist, uris):
+        try:
+            response = self.client.make_spotify_request(
+                self.request,
+                f"{SPOTIFY_API_URL}/playlists/{playlist['id']}/tracks",
+                method="POST",
+                data=fastjson.dumps({"uris": uris}),
+                endpoint="playlist_tracks",
+            )
+            with self.lock:
+                if response.status_code == 201:
+                    self.counts["added"] += len(uris)
+                    playlist["tracks"] += len(uris)
+                else:
+                    self.errors.append(
+                        f"{playlist['name']}: Spotify API error: {response.status_code} - {response.text}"
+                    )
+        except Exception as e:
+            logger.exception(f"Adding tracks to imported playlist {playlist['id']} failed")
+            with self.lock:
+                self.errors.append(f"{playlist['name']}: {e}")
+        finally:
+            self.in_flight.release()
+
+    def push(self, playlist, uris):
+        for start in range(0, len(uris), URI_BATCH_SIZE):
+            self.in_flight.acquire()
+            with self.lock:
+                lane = self.lanes.setdefault(
+                    playlist["id"], {"batches": deque(), "running": False}
+                )
+                lane["batches"].append(uris[start:start + URI_BATCH_SIZE])
+                if lane["running"]:
+                    continue
+                lane["running"] = True
+            self.tasks.append(push_pool.submit(self._drain, playlist, lane))
+
+    def progress(self, event="progress"):
+        with self.lock:
+            return {"event": event, **self.counts, "errors": len(self.errors)}
+
+    def run(self, rows):
+        for chunk in chunks(rows):
+            pending = {}
+            for row, uri in zip(chunk, resolve(chunk)):
+                self.counts["rows"] += 1
+                if uri is None:
+                    self.counts["missing"] += 1
+                    if len(self.missing) < MISSING_REPORTED:
+                        self.missing.append(row.get("isrc") or row.get("name") or "")
+                    continue
+                self.counts["resolved"] += 1
+                playlist = self.playlist_for(row)
+                pending.setdefault(playlist["id"], (playlist, []))[1].append(uri)
+            for playlist, uris in pending.values():
+                self.push(playlist, uris)
+            yield self.progress()
+
+        for task in self.tasks:
+            task.result()
+        yield {
+            **self.progress("done"),
+            "playlists": list(self.playlists.values()),
+            "missing_tracks": self.missing,
+            "error_messages": self.errors[:MISSING_REPORTED],
+        }
+
+    def events(self, rows):
+        """run() as NDJSON lines; failures end the stream with an error event."""
+        try:
+            for event in self.run(rows):
+                yield json.dumps(event) + "\n"
+        except TransferError as e:
+            logger.error(f"Playlist import failed: {e}")
+            yield json.dumps({**self.progress("error"), "error": str(e)}) + "\n"
+        except Exception as e:
+            logger.exception("Playlist import failed")
+            yield json.dumps({**self.progress("error"), "error": str(e)}) + "\n"
@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+import fastjson
+import metrics
+from . import inflight
+
+logger = logging.getLogger(__name__)
+
+SPOTIFY_API_URL = getattr(
+    settings, "SPOTIFY_API_URL", "https://api.spotify.com/v1"
+).rstrip("/")
+SPOTIFY_ACCOUNTS_URL = getattr(
+    settings, "SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com"
+).rstrip("/")
+SPOTIFY_TOKEN_URL = f"{SPOTIFY_ACCOUNTS_URL}/api/token"
+
+# (connect, read) timeouts in seconds, per logical Spotify endpoint.
+DEFAULT_TIMEOUTS = {
+    "token": (3.05, 5),
+    "me": (3.05, 5),
+    "playlists": (3.05, 10),
+    "playlist_tracks": (3.05, 15),
+    "followers": (3.05, 10),
+    "recommendations": (3.05, 10),
+    "tracks": (3.05, 10),
+    "audio_features": (3.05, 10),
+    "default": (3.05, 10),
+}
+TIMEOUTS = {**DEFAULT_TIMEOUTS, **getattr(settings, "SPOTIFY_TIMEOUTS", {})}
+
+BREAKER_SETTINGS = {
+    "failure_rate": 0.5,
+    "min_calls": 10,
+    "window": 30,
+    "reset_timeout": 15,
+    **getattr(settings, "SPOTIFY_CIRCUIT_BREAKER", {}),
+}
+
+POOL_SIZE = getattr(settings, "SPOTIFY_POOL_SIZE", 20)
+
+# One keep-alive pool per host, shared by every thread in the process.
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+
+# Share one upstream call between identical concurrent GETs.
+COALESCE = getattr(settings, "SPOTIFY_COALESCE_REQUESTS", True)
+
+# How long the last good copy of a GET is kept around to serve while Spotify is down.
+STALE_TTL = getattr(settings, "SPOTIFY_STALE_TTL", 60 * 60)
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_rate, min_calls, window, reset_timeout):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self._outcomes = deque()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        metrics.set_gauge("spotify.circuit.state", self._state, endpoint=name)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def _transition(self, state):
+        if state != self._state:
+            logger.warning(f"Spotify circuit '{self.name}': {self._state} -> {state}")
+            self._state = state
+            metrics.set_gauge("spotify.circuit.state", state, endpoint=self.name)
+            metrics.increment("spotify.circuit.transitions", endpoint=self.name, to=state)
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(self.HALF_OPEN)
+            # Half-open: let a single trial request through.
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def release(self):
+        """Give up a half-open trial that ended without an outcome, e.g. on a bug."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._outcomes.clear()
+                self._trial_in_flight = False
+                self._transition(self.CLOSED)
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._trial_in_flight = False
+                self._opened_at = now
+                self._transition(self.OPEN)
+                return
+            self._outcomes.append((now, False))
+            self._prune(now)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (
+                len(self._outcomes) >= self.min_calls
+                and failures / len(self._outcomes) >= self.failure_rate
+            ):
+                self._opened_at = now
+                self._transition(self.OPEN)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint):
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, **BREAKER_SETTINGS)
+        return _breakers[endpoint]
+
+
+def _is_failure(response):
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def request(endpoint, method, url, **kwargs):
+    """
+    Send a request to Spotify with the endpoint's timeouts, guarded by its breaker.
+    Raises CircuitOpenError without touching the network while the breaker is open.
+    """
+    breaker = get_breaker(endpoint)
+    if not breaker.allow():
+        metrics.increment("spotify.requests.short_circuited", endpoint=endpoint)
+        raise CircuitOpenError(f"Spotify circuit '{endpoint}' is open")
+
+    kwargs.setdefault("timeout", TIMEOUTS.get(endpoint, TIMEOUTS["default"]))
+    start = time.monotonic()
+    recorded = False
+    try:
+        response = session.request(method, url, **kwargs)
+        if _is_failure(response):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        recorded = True
+    except requests.RequestException as e:
+        breaker.record_failure()
+        recorded = True
+        metrics.increment(
+            "spotify.requests.errors", endpoint=endpoint, error=type(e).__name__
+        )
+        raise
+    finally:
+        # Anything else (a bad argument, a bug in an adapter) must not leave a
+        # half-open breaker waiting forever on a trial that never reports back.
+        if not recorded:
+            breaker.release()
+        metrics.observe(
+            "spotify.requests.latency_ms",
+            (time.monotonic() - start) * 1000,
+            endpoint=endpoint,
+        )
+
+    metrics.increment(
+        "spotify.requests", endpoint=endpoint, status=response.status_code
+    )
+    return response
+
+
+def build_response(status_code, payload, headers=None):
+    """Build a requests.Response so callers can treat it like an upstream reply."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = (
+        payload if isinstance(payload, bytes) else fastjson.dumps(payload)
+    )
+    response.headers["Content-Type"] = "application/json"
+    response.headers.update(headers or {})
+    return response
+
+
+def _stale_key(scope, url, params):
+    params = sorted((params or {}).items())
+    return f"spotify:stale:{scope}:{url}:{params}"
+
+
+def send(endpoint, method, url, stale_scope=None, **kwargs):
+    """
+    Like request(), but never raises for upstream trouble. Identical
+    concurrent GETs share one upstream call (see inflight). GETs with a
+    stale_scope remember their last good body and fall back to it when
+    Spotify errors, times out or the breaker is open; otherwise a 503/504
+    response is returned.
+    """
+    stale_key = None
+    if method.upper() == "GET" and stale_scope is not None:
+        stale_key = _stale_key(stale_scope, url, kwargs.get("params"))
+
+    try:
+        if method.upper() == "GET" and COALESCE:
+            key = inflight.flight_key(method, url, kwargs.get("params"), kwargs.get("headers"))
+            response = inflight.run(
+                key, lambda: request(endpoint, method, url, **kwargs), build_response, endpoint
+            )
+        else:
+            response = request(endpoint, method, url, **kwargs)
+    except requests.RequestException as e:
+        logger.error(f"Spotify request to {url} failed: {str(e)}")
+        stale = _serve_stale(stale_key, endpoint)
+        if stale is not None:
+            return stale
+        status_code = 504 if isinstance(e, requests.Timeout) else 503
+        return build_response(
+            status_code, {"error": "Spotify is temporarily unavailable"}
+        )
+
+    if stale_key and response.status_code == 200:
+        cache.set(stale_key, response.content, STALE_TTL)
+    elif stale_key and _is_failure(response):
+        stale = _serve_stale(stale_key, endpoint)
+        if stale is not None:
+            return stale
+    return response
+
+
+def _serve_stale(stale_key, endpoint):
+    if not stale_key:
+        return None
+    content = cache.get(stale_key)
+    if content is None:
+        return None
+    metrics.increment("spotify.requests.served_stale", endpoint=endpoint)
+    return build_response(200, content, headers={"X-Spotify-Cache": "stale"})
+
+
+def breaker_states():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.state for breaker in breakers}
@@ -1,6 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import SpotifyClientCredentialsView, SpotifyRecommendationsView, SpotifyPlaylistsView
+from .views import (
+    SpotifyClientCredentialsView,
+    SpotifyPlaylistEditView,
+    SpotifyPlaylistExportView,
+    SpotifyPlaylistImportView,
+    SpotifyPlaylistOrderView,
+    SpotifyPlaylistsView,
+    SpotifyRecommendationsView,
+)
 from .viewsets import QueryViewSet
 from backend.views import spotify_auth
 
@@ -19,6 +27,21 @@ urlpatterns = [
         name="spotify_recommendations",
     ),
     path("playlists/", SpotifyPlaylistsView.as_view(), name="spotify_playlists"),
+    path(
+        "playlists/export/",
+        SpotifyPlaylistExportView.as_view(),
+        name="spotify_playlist_export",
+    ),
+    path(
+        "playlists/import/",
+        SpotifyPlaylistImportView.as_view(),
+        name="spotify_playlist_import",
+    ),
+    path(
+        "playlists/edits/<str:edit_id>/",
+        SpotifyPlaylistEditView.as_view(),
+        name="spotify_playlist_edit",
+    ),
     path(
         "playlists/<str:playlist_id>/",
         SpotifyPlaylistsView.as_view(),
@@ -29,6 +52,11 @@ urlpatterns = [
         SpotifyPlaylistsView.as_view(),
         name="spotify_playlist_tracks",
     ),
+    path(
+        "playlists/<str:playlist_id>/order/",
+        SpotifyPlaylistOrderView.as_view(),
+        name="spotify_playlist_order",
+    ),
     path("authorize/", spotify_auth.spotify_authorize, name="spotify_authorize"),
     path("callback/", spotify_auth.spotify_callback, name="spotify_callback"),
     path("", include(router.urls)),  # Include the router URLs
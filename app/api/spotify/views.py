@@ -2,8 +2,10 @@ import base64
 import requests
 import ast
 import json
+import threading
+import weakref
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import StreamingHttpResponse
 from django.views import View
 from django.core.cache import cache
 from django.utils.decorators import method_decorator
@@ -19,18 +21,55 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.authentication import get_authorization_header
 import logging
+import fastjson
+from fastjson import JsonResponse
+from backend import tracks
 from backend.models import MusicServiceConnection
 from django.core.exceptions import ObjectDoesNotExist
+from . import projection, public_cache, reorder, transfer, upstream, warmup, write_behind
+from .compression import compress_response
+from .. import audio_features
+from .upstream import SPOTIFY_API_URL
 
 logger = logging.getLogger(__name__)
 
+# "fallback": serve from the local feature store when Spotify fails;
+# "first": try the local store before Spotify; "off": Spotify only.
+LOCAL_RECOMMENDATIONS = getattr(settings, "LOCAL_RECOMMENDATIONS", "fallback")
+
+# One token refresh at a time per connection; concurrent requests that all got
+# a 401 (e.g. bootstrap's fan-out) share the first refresh instead of racing.
+# Entries disappear once no request holds or waits on them.
+class _RefreshLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+_refresh_locks = weakref.WeakValueDictionary()
+_refresh_locks_guard = threading.Lock()
+
+
+def _refresh_lock(connection_id):
+    with _refresh_locks_guard:
+        lock = _refresh_locks.get(connection_id)
+        if lock is None:
+            lock = _refresh_locks[connection_id] = _RefreshLock()
+        return lock
+
 
 @method_decorator(csrf_exempt, name="dispatch")
 class SpotifyClientCredentialsView(View):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
-    TOKEN_URL = "https://accounts.spotify.com/api/token"
+    TOKEN_URL = upstream.SPOTIFY_TOKEN_URL
     CACHE_KEY = "spotify_client_token"
     MAX_RETRIES = 1
 
@@ -72,12 +111,14 @@ class SpotifyClientCredentialsView(View):
         logger.debug(f"Requesting new token with headers: {headers} and data: {data}")
 
         try:
-            response = requests.post(self.TOKEN_URL, headers=headers, data=data)
+            response = upstream.request(
+                "token", "POST", self.TOKEN_URL, headers=headers, data=data
+            )
             logger.debug(f"Token request response status: {response.status_code}")
             logger.debug(f"Token request response content: {response.text}")
 
             response.raise_for_status()
-            token_info = response.json()
+            token_info = fastjson.decode(response)
 
             access_token = token_info["access_token"]
             expires_in = token_info["expires_in"]
@@ -113,14 +154,16 @@ class SpotifyClientCredentialsView(View):
         logger.debug(f"Refreshing token with headers: {headers} and data: {data}")
 
         try:
-            response = requests.post(self.TOKEN_URL, headers=headers, data=data)
+            response = upstream.request(
+                "token", "POST", self.TOKEN_URL, headers=headers, data=data
+            )
             logger.debug(
                 f"Refresh token request response status: {response.status_code}"
             )
             logger.debug(f"Refresh token request response content: {response.text}")
 
             response.raise_for_status()
-            token_info = response.json()
+            token_info = fastjson.decode(response)
 
             access_token = token_info["access_token"]
             expires_in = token_info["expires_in"]
@@ -135,17 +178,45 @@ class SpotifyClientCredentialsView(View):
             logger.error(f"Error refreshing Spotify token: {str(e)}")
             raise
 
-    def make_spotify_request(self, request, url, method="GET", params=None, data=None):
-        try:
-            music_service = MusicServiceConnection.objects.get(
-                user=request.user, service_name="spotify"
-            )
-        except ObjectDoesNotExist:
-            logger.error(f"No Spotify connection found for user {request.user}")
-            return Response(
-                {"error": "No Spotify connection found"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    def make_spotify_request(
+        self,
+        request,
+        url,
+        method="GET",
+        params=None,
+        data=None,
+        endpoint="default",
+        music_service=None,
+        fresh=False,
+    ):
+        """
+        Send a request to Spotify as request.user, refreshing the access token
+        on a 401. GETs may be answered from the warmup, shared public and stale
+        caches; pass fresh=True for reads that a write is planned against, which
+        must see Spotify's current state or fail.
+        """
+        if method == "GET" and not fresh:
+            warm = warmup.get(request.user.pk, url, params)
+            if warm is not None:
+                return warm
+            shared = public_cache.get(self, url, params, endpoint)
+            if shared is not None:
+                return shared
+        elif method != "GET":
+            warmup.forget(request.user.pk)
+            public_cache.forget(url)
+
+        if music_service is None:
+            try:
+                music_service = MusicServiceConnection.objects.get(
+                    user=request.user, service_name="spotify"
+                )
+            except ObjectDoesNotExist:
+                logger.error(f"No Spotify connection found for user {request.user}")
+                return Response(
+                    {"error": "No Spotify connection found"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
         access_token = music_service.access_token
         logger.info(f"Initial access token: {access_token[:10]}...")
@@ -160,8 +231,15 @@ class SpotifyClientCredentialsView(View):
         logger.debug(f"Params: {params}")
         logger.debug(f"Data: {data}")
 
-        response = requests.request(
-            method, url, headers=headers, params=params, data=data
+        stale_scope = None if fresh else f"user:{request.user.pk}"
+        response = upstream.send(
+            endpoint,
+            method,
+            url,
+            stale_scope=stale_scope,
+            headers=headers,
+            params=params,
+            data=data,
         )
 
         logger.info(f"Spotify API response status: {response.status_code}")
@@ -170,18 +248,29 @@ class SpotifyClientCredentialsView(View):
         if response.status_code == 401:
             logger.info("Access token expired. Attempting to refresh...")
             try:
-                refresh_token = music_service.refresh_token
-                new_token_info = self.refresh_access_token(refresh_token)
-                new_access_token = new_token_info["access_token"]
-
-                # Update the MusicServiceConnection with the new token
-                music_service.access_token = new_access_token
-                music_service.save()
+                with _refresh_lock(music_service.pk):
+                    # Another thread or process may have refreshed this
+                    # connection meanwhile.
+                    music_service.refresh_from_db(fields=["access_token", "refresh_token"])
+                    if music_service.access_token == access_token:
+                        refresh_token = music_service.refresh_token
+                        new_token_info = self.refresh_access_token(refresh_token)
+
+                        # Update the MusicServiceConnection with the new token
+                        music_service.access_token = new_token_info["access_token"]
+                        music_service.save(update_fields=["access_token"])
+                    new_access_token = music_service.access_token
 
                 # Retry the request with the new token
                 headers["Authorization"] = f"Bearer {new_access_token}"
-                response = requests.request(
-                    method, url, headers=headers, params=params, data=data
+                response = upstream.send(
+                    endpoint,
+                    method,
+                    url,
+                    stale_scope=stale_scope,
+                    headers=headers,
+                    params=params,
+                    data=data,
                 )
 
                 logger.info(f"Retried request status: {response.status_code}")
@@ -207,14 +296,14 @@ class SpotifyUserDetailView(APIView):
     def get(self, request):
         try:
             response = self.spotify_client.make_spotify_request(
-                request, "https://api.spotify.com/v1/me"
+                request, f"{SPOTIFY_API_URL}/me", endpoint="me"
             )
             logger.debug(
                 f"Spotify user details response: {response.status_code} - {response.text}"
             )
 
             if response.status_code == 200:
-                user_data = response.json()
+                user_data = fastjson.decode(response)
                 logger.info("Successfully retrieved user profile from Spotify API")
                 return Response(user_data)
             else:
@@ -235,6 +324,7 @@ class SpotifyUserDetailView(APIView):
             )
 
 
+@method_decorator(compress_response, name="dispatch")
 class SpotifyPlaylistsView(APIView):
     authentication_classes = [DebugJWTAuthentication]
     permission_classes = [IsAuthenticated]  # Uncomment this line
@@ -275,6 +365,8 @@ class SpotifyPlaylistsView(APIView):
             logger.info(f"Retrieved user ID: {user_id}")
 
             # Now proceed with getting the playlists
+            fields = projection.requested(request.GET, "playlists")
+            tree = projection.parse(fields) if fields else None
             limit = request.GET.get("limit", "50")
             offset = request.GET.get("offset", "0")
 
@@ -285,8 +377,9 @@ class SpotifyPlaylistsView(APIView):
 
             response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/users/{user_id}/playlists",
+                f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
                 params=params,
+                endpoint="playlists",
             )
 
             logger.debug(
@@ -294,8 +387,10 @@ class SpotifyPlaylistsView(APIView):
             )
 
             if response.status_code == 200:
-                playlists_data = response.json()
+                playlists_data = fastjson.decode(response)
                 logger.info("Successfully retrieved playlists from Spotify API")
+                if tree is not None:
+                    playlists_data = projection.project(playlists_data, tree)
                 return Response(playlists_data)
             else:
                 logger.error(
@@ -308,6 +403,8 @@ class SpotifyPlaylistsView(APIView):
                     status=response.status_code,
                 )
 
+        except projection.FieldSpecError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.exception("An error occurred while processing the request")
             return Response(
@@ -317,15 +414,22 @@ class SpotifyPlaylistsView(APIView):
     def get_playlist(self, request, playlist_id):
         logger.info(f"Getting specific playlist: {playlist_id}")
         try:
+            # Spotify filters playlist tracks itself, so the spec goes upstream.
+            fields = projection.requested(request.GET, "playlist_tracks")
             response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+                params={"fields": fields} if fields else None,
+                endpoint="playlist_tracks",
             )
 
             logger.debug(f"Playlist response: {response.status_code} - {response.text}")
 
             if response.status_code == 200:
-                playlist_data = response.json()
+                playlist_data = fastjson.decode(response)
+                if not fields:
+                    # Partial track objects must not end up in the track store.
+                    tracks.ingest(item.get("track") for item in playlist_data.get("items", []))
                 logger.info(f"Successfully retrieved playlist: {playlist_id}")
                 return Response(playlist_data)
             else:
@@ -369,9 +473,10 @@ class SpotifyPlaylistsView(APIView):
             # Create the playlist
             create_response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/users/{user_id}/playlists",
+                f"{SPOTIFY_API_URL}/users/{user_id}/playlists",
                 method="POST",
-                data=json.dumps(playlist_data),
+                data=fastjson.dumps(playlist_data),
+                endpoint="playlists",
             )
 
             logger.debug(
@@ -390,12 +495,12 @@ class SpotifyPlaylistsView(APIView):
                 )
 
             # Get the new playlist ID
-            new_playlist = create_response.json()
+            new_playlist = fastjson.decode(create_response)
             playlist_id = new_playlist["id"]
 
             # Add tracks to the new playlist if provided
-            tracks = request.data.get("tracks", [])
-            if tracks:
+            track_uris = request.data.get("tracks", [])
+            if track_uris:
                 add_tracks_response = self.add_items_to_playlist(request, playlist_id)
                 if add_tracks_response.status_code != 201:
                     logger.warning(
@@ -422,15 +527,20 @@ class SpotifyPlaylistsView(APIView):
             uris = request.data.get("tracks", [])
             position = request.data.get("position")
 
+            if write_behind.enabled_for(request):
+                edit = write_behind.Edit("add", uris, position=position)
+                return self.deferred(request, playlist_id, edit)
+
             data = {"uris": uris}
             if position is not None:
                 data["position"] = position
 
             response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
                 method="POST",
-                data=json.dumps(data),
+                data=fastjson.dumps(data),
+                endpoint="playlist_tracks",
             )
 
             logger.debug(
@@ -439,7 +549,7 @@ class SpotifyPlaylistsView(APIView):
 
             if response.status_code == 201:
                 logger.info("Successfully added items to playlist")
-                return Response(response.json(), status=status.HTTP_201_CREATED)
+                return Response(fastjson.decode(response), status=status.HTTP_201_CREATED)
             else:
                 logger.error(
                     f"Spotify API error: {response.status_code} - {response.text}"
@@ -469,11 +579,17 @@ class SpotifyPlaylistsView(APIView):
                 "snapshot_id": request.data.get("snapshot_id"),
             }
 
+            if write_behind.enabled_for(request):
+                move = {key: value for key, value in data.items() if key != "snapshot_id"}
+                edit = write_behind.Edit("reorder", move=move)
+                return self.deferred(request, playlist_id, edit)
+
             response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
                 method="PUT",
-                data=json.dumps(data),
+                data=fastjson.dumps(data),
+                endpoint="playlist_tracks",
             )
 
             logger.debug(
@@ -482,7 +598,7 @@ class SpotifyPlaylistsView(APIView):
 
             if response.status_code == 200:
                 logger.info("Successfully reordered playlist items")
-                return Response(response.json(), status=status.HTTP_200_OK)
+                return Response(fastjson.decode(response), status=status.HTTP_200_OK)
             else:
                 logger.error(
                     f"Spotify API error: {response.status_code} - {response.text}"
@@ -510,11 +626,21 @@ class SpotifyPlaylistsView(APIView):
                 "snapshot_id": request.data.get("snapshot_id"),
             }
 
+            if write_behind.enabled_for(request):
+                if any("positions" in track for track in data["tracks"]):
+                    edit = write_behind.Edit("remove", tracks=data["tracks"])
+                else:
+                    edit = write_behind.Edit(
+                        "remove", [track["uri"] for track in data["tracks"]]
+                    )
+                return self.deferred(request, playlist_id, edit)
+
             response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks",
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
                 method="DELETE",
-                data=json.dumps(data),
+                data=fastjson.dumps(data),
+                endpoint="playlist_tracks",
             )
 
             logger.debug(
@@ -523,7 +649,7 @@ class SpotifyPlaylistsView(APIView):
 
             if response.status_code == 200:
                 logger.info("Successfully removed items from playlist")
-                return Response(response.json(), status=status.HTTP_200_OK)
+                return Response(fastjson.decode(response), status=status.HTTP_200_OK)
             else:
                 logger.error(
                     f"Spotify API error: {response.status_code} - {response.text}"
@@ -541,6 +667,15 @@ class SpotifyPlaylistsView(APIView):
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def deferred(self, request, playlist_id, edit):
+        """Queue an edit for write-behind and acknowledge it straight away."""
+        edit_id = write_behind.enqueue(request.user, playlist_id, edit)
+        logger.info(f"Queued {edit.kind} for playlist {playlist_id} as {edit_id}")
+        return Response(
+            {"edit_id": edit_id, "status": write_behind.QUEUED},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
     def unfollow_playlist(self, request, playlist_id=None, *args, **kwargs):
         if not playlist_id:
             return Response(
@@ -558,8 +693,9 @@ class SpotifyPlaylistsView(APIView):
             # Unfollow (delete) the playlist
             response = self.spotify_client.make_spotify_request(
                 request,
-                f"https://api.spotify.com/v1/playlists/{playlist_id}/followers",
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/followers",
                 method="DELETE",
+                endpoint="followers",
             )
 
             logger.debug(
@@ -590,7 +726,252 @@ class SpotifyPlaylistsView(APIView):
             )
 
 
+class SpotifyPlaylistEditView(APIView):
+    """Status of an edit queued by SpotifyPlaylistsView in write-behind mode."""
+
+    authentication_classes = [DebugJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, edit_id):
+        edit_status = write_behind.get_status(edit_id, request.user.pk)
+        if edit_status is None:
+            return Response({"error": "Unknown edit"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"edit_id": edit_id, **edit_status})
+
+
+class SpotifyPlaylistExportView(APIView):
+    """
+    Stream every playlist of the user as CSV or NDJSON (?output=csv|ndjson),
+    read from Spotify or from the local mirror (?source=spotify|local).
+    """
+
+    authentication_classes = [DebugJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spotify_client = SpotifyClientCredentialsView()
+        self.user_detail_view = SpotifyUserDetailView()
+
+    def get(self, request):
+        output = request.query_params.get("output", "csv")
+        source = request.query_params.get("source", "spotify")
+        if output not in transfer.FORMATS or source not in ("spotify", "local"):
+            return Response(
+                {"error": "output must be csv or ndjson and source spotify or local"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if source == "local":
+            rows = transfer.local_rows(request.user)
+        else:
+            # Fail before streaming starts if the user can't reach Spotify at all.
+            user_response = self.user_detail_view.get(request)
+            if user_response.status_code != 200:
+                return user_response
+            rows = transfer.spotify_rows(
+                self.spotify_client, request, user_response.data.get("id", "me")
+            )
+
+        content_type = "text/csv" if output == "csv" else "application/x-ndjson"
+        response = StreamingHttpResponse(
+            transfer.encode(rows, output), content_type=f"{content_type}; charset=utf-8"
+        )
+        response["Content-Disposition"] = f'attachment; filename="playlists.{output}"'
+        return response
+
+
 @method_decorator(csrf_exempt, name="dispatch")
+class SpotifyPlaylistImportView(APIView):
+    """
+    Import playlists from a CSV or NDJSON upload in the export's format, sent
+    as a multipart "file" or as the raw body. Rows need a uri or an isrc. Each
+    source playlist becomes a new Spotify playlist; progress is streamed back
+    as NDJSON events, ending with a "done" (or "error") event.
+    """
+
+    authentication_classes = [DebugJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spotify_client = SpotifyClientCredentialsView()
+        self.user_detail_view = SpotifyUserDetailView()
+
+    def post(self, request):
+        content_type = request.content_type or ""
+        if content_type.startswith("multipart/"):
+            upload = request.FILES.get("file")
+            if upload is None:
+                return Response(
+                    {"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST
+                )
+            lines, name = upload, upload.name
+        else:
+            lines, name = request.stream, ""
+        input_format = request.query_params.get("input") or transfer.guess_format(
+            name, content_type
+        )
+        if input_format not in transfer.FORMATS:
+            return Response(
+                {"error": "input must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        user_response = self.user_detail_view.get(request)
+        if user_response.status_code != 200:
+            return user_response
+
+        job = transfer.PlaylistImport(
+            self.spotify_client, request, user_response.data.get("id")
+        )
+        return StreamingHttpResponse(
+            job.events(transfer.parse(lines, input_format)),
+            content_type="application/x-ndjson; charset=utf-8",
+        )
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class SpotifyPlaylistOrderView(APIView):
+    """
+    PUT {"uris": [...], "snapshot_id"?: str, "allow_replace"?: bool} rewrites a
+    playlist into the given order with as few Spotify calls as we can manage:
+    range moves planned by reorder.plan_moves, or a replace-and-append when that
+    would take fewer calls and the playlist has no local files.
+    """
+
+    authentication_classes = [DebugJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.spotify_client = SpotifyClientCredentialsView()
+
+    def spotify_error(self, response, **extra):
+        logger.error(f"Spotify API error: {response.status_code} - {response.text}")
+        return Response(
+            {"error": f"Spotify API error: {response.status_code} - {response.text}", **extra},
+            status=response.status_code,
+        )
+
+    def fetch_uris(self, request, playlist_id):
+        uris = []
+        offset = 0
+        while True:
+            response = self.spotify_client.make_spotify_request(
+                request,
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+                params={"limit": 100, "offset": offset, "fields": "items(track(uri)),next"},
+                endpoint="playlist_tracks",
+                # Planning moves against an outdated order would scramble the playlist.
+                fresh=True,
+            )
+            if response.status_code != 200:
+                return None, self.spotify_error(response)
+            page = fastjson.decode(response)
+            uris.extend((item.get("track") or {}).get("uri") for item in page["items"])
+            if not page.get("next"):
+                return uris, None
+            offset += len(page["items"])
+
+    def move(self, request, playlist_id, moves, snapshot_id):
+        for applied, (range_start, range_length, insert_before) in enumerate(moves):
+            data = {
+                "range_start": range_start,
+                "range_length": range_length,
+                "insert_before": insert_before,
+            }
+            if snapshot_id:
+                data["snapshot_id"] = snapshot_id
+            response = self.spotify_client.make_spotify_request(
+                request,
+                f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks",
+                method="PUT",
+                data=fastjson.dumps(data),
+                endpoint="playlist_tracks",
+            )
+            if response.status_code != 200:
+                return snapshot_id, self.spotify_error(
+                    response, ops_applied=applied, snapshot_id=snapshot_id
+                )
+            snapshot_id = fastjson.decode(response).get("snapshot_id", snapshot_id)
+        return snapshot_id, None
+
+    def replace(self, request, playlist_id, uris):
+        url = f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks"
+        snapshot_id = None
+        batches = [
+            uris[i:i + reorder.URI_BATCH_SIZE]
+            for i in range(0, len(uris), reorder.URI_BATCH_SIZE)
+        ] or [[]]
+        for applied, batch in enumerate(batches):
+            response = self.spotify_client.make_spotify_request(
+                request,
+                url,
+                method="PUT" if applied == 0 else "POST",
+                data=fastjson.dumps({"uris": batch}),
+                endpoint="playlist_tracks",
+            )
+            if response.status_code not in (200, 201):
+                return snapshot_id, self.spotify_error(
+                    response, ops_applied=applied, snapshot_id=snapshot_id
+                )
+            snapshot_id = fastjson.decode(response).get("snapshot_id", snapshot_id)
+        return snapshot_id, None
+
+    def put(self, request, playlist_id):
+        target = request.data.get("uris")
+        if not isinstance(target, list) or not all(isinstance(uri, str) for uri in target):
+            return Response(
+                {"error": "uris must be a list of track URIs"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            current, error = self.fetch_uris(request, playlist_id)
+            if error is not None:
+                return error
+
+            can_replace = request.data.get("allow_replace", True) and not any(
+                uri is None or uri.startswith("spotify:local:") for uri in current
+            )
+            budget = reorder.replace_calls(len(target)) if can_replace else None
+            try:
+                moves = reorder.plan_moves(current, target, max_moves=budget)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            if moves is None:
+                strategy = "replace"
+                ops = budget
+                snapshot_id, error = self.replace(request, playlist_id, target)
+            else:
+                strategy = "moves"
+                ops = len(moves)
+                snapshot_id, error = self.move(
+                    request, playlist_id, moves, request.data.get("snapshot_id")
+                )
+            if error is not None:
+                return error
+
+            reorder.mirror_order(request.user, playlist_id, target)
+            logger.info(f"Reordered playlist {playlist_id} with {ops} {strategy} ops")
+            return Response(
+                {
+                    "snapshot_id": snapshot_id,
+                    "strategy": strategy,
+                    "ops": ops,
+                    "tracks": len(target),
+                }
+            )
+
+        except Exception as e:
+            logger.exception("An error occurred while reordering the playlist")
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+@method_decorator(compress_response, name="dispatch")
 class SpotifyRecommendationsView(View):
     def get(self, request, *args, **kwargs):
         try:
@@ -606,36 +987,20 @@ class SpotifyRecommendationsView(View):
             advanced_params = request.GET.get("advanced_params", "{}")
             advanced_params = json.loads(advanced_params)
 
-            # Prepare headers and params for the Spotify API request
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-            }
-            params = {
-                "seed_artists": seed_artists,
-                "seed_genres": seed_genres,
-                "seed_tracks": seed_tracks,
-                "limit": limit,
-            }
+            fields = projection.requested(request.GET, "recommendations")
+            tree = projection.parse(fields) if fields else None
 
-            # Add advanced parameters to the request
-            for param, values in advanced_params.items():
-                if values.get("enabled", False):
-                    if "min" in values:
-                        params[f"min_{param}"] = values["min"]
-                    if "max" in values:
-                        params[f"max_{param}"] = values["max"]
-                    params[f"target_{param}"] = values["target"]
-
-            # Make the request to Spotify API
-            response = requests.get(
-                "https://api.spotify.com/v1/recommendations",
-                headers=headers,
-                params=params,
+            params = build_recommendation_params(
+                seed_artists, seed_genres, seed_tracks, limit, advanced_params
             )
+            response = fetch_recommendations(params, access_token)
 
             if response.status_code == 200:
-                data = response.json()
+                data = fastjson.decode(response)
+                tracks.ingest(data["tracks"])
                 track_uris = [track["uri"] for track in data["tracks"]]
+                if tree is not None:
+                    data = projection.project(data, tree)
                 return JsonResponse(
                     {
                         "track_uris": track_uris,
@@ -650,6 +1015,13 @@ class SpotifyRecommendationsView(View):
                     status=response.status_code,
                 )
 
+        except projection.FieldSpecError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except requests.RequestException as e:
+            logger.error(f"Spotify unavailable for recommendations: {str(e)}")
+            return JsonResponse(
+                {"error": "Spotify is temporarily unavailable"}, status=503
+            )
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
@@ -664,3 +1036,67 @@ class SpotifyRecommendationsView(View):
                 "spotify_client_token", token, expires_in - 60
             )  # Cache for slightly less than the expiry time
         return token
+
+
+def build_recommendation_params(
+    seed_artists, seed_genres, seed_tracks, limit, advanced_params
+):
+    params = {
+        "seed_artists": seed_artists,
+        "seed_genres": seed_genres,
+        "seed_tracks": seed_tracks,
+        "limit": limit,
+    }
+
+    # Add advanced parameters to the request, converted from the client's
+    # slider scale to Spotify's.
+    for param, values in advanced_params.items():
+        if values.get("enabled", False):
+            for bound in ("min", "max", "target"):
+                if values.get(bound) is not None:
+                    params[f"{bound}_{param}"] = audio_features.from_client(param, values[bound])
+    return params
+
+
+def local_recommendations(params):
+    """Recommendations from the local feature store as a Spotify-shaped response, or None."""
+    try:
+        data = audio_features.recommend(params, params.get("limit") or 20)
+    except Exception:
+        logger.exception("Local recommendations failed")
+        return None
+    if not data["tracks"]:
+        return None
+    return upstream.build_response(
+        200, data, headers={"X-Recommendations-Source": "local"}
+    )
+
+
+def fetch_recommendations(params, access_token=None):
+    """
+    Recommendations for Spotify-style params. With LOCAL_RECOMMENDATIONS set to
+    "first", constrained requests the local store can fill are answered without
+    calling Spotify; unless it is "off", the local store also covers for Spotify
+    when it fails.
+    """
+    mode = LOCAL_RECOMMENDATIONS
+    if mode == "first" and audio_features.parse_params(params):
+        local = local_recommendations(params)
+        if local is not None and len(fastjson.decode(local)["tracks"]) >= int(params.get("limit") or 20):
+            return local
+
+    if access_token is None:
+        access_token = SpotifyRecommendationsView().get_access_token()
+    response = upstream.send(
+        "recommendations",
+        "GET",
+        f"{SPOTIFY_API_URL}/recommendations",
+        stale_scope="public",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params=params,
+    )
+    if mode != "off" and (response.status_code >= 500 or response.status_code == 429):
+        local = local_recommendations(params)
+        if local is not None:
+            return local
+    return response
@@ -1,18 +1,76 @@
 
-from rest_framework import viewsets
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from backend.models import Query
-from .serializers import QuerySerializer
+from .serializers import QuerySerializer, QueryListSerializer
+from .query_results import RefreshError, refresh_query
+
+
+class QueryCursorPagination(CursorPagination):
+    # Matches the (user, -updated_at) index on Query, so every page is an index range scan.
+    ordering = ("-updated_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
 
 
 class QueryViewSet(viewsets.ModelViewSet):
     serializer_class = QuerySerializer
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication]
+    pagination_class = QueryCursorPagination
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return QueryListSerializer
+        return QuerySerializer
 
     def get_queryset(self):
-        return Query.objects.filter(user=self.request.user)
+        queryset = Query.objects.filter(user=self.request.user)
+        if self.action != "list":
+            return queryset
+
+        queryset = queryset.defer("track_ids")
+        params = self.request.query_params
+
+        search = params.get("search")
+        if search:
+            queryset = queryset.filter(name__icontains=search)
+        name = params.get("name")
+        if name:
+            queryset = queryset.filter(name=name)
+
+        for param, lookup in (
+            ("updated_after", "updated_at__gte"),
+            ("updated_before", "updated_at__lt"),
+            ("created_after", "created_at__gte"),
+            ("created_before", "created_at__lt"),
+        ):
+            value = params.get(param)
+            if not value:
+                continue
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValidationError({param: "Expected an ISO 8601 datetime."})
+            queryset = queryset.filter(**{lookup: parsed})
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    @action(detail=True, methods=["post"])
+    def refresh(self, request, pk=None):
+        query = self.get_object()
+        try:
+            reused = refresh_query(query)
+        except RefreshError as e:
+            return Response({"error": str(e)}, status=e.status_code)
+        data = self.get_serializer(query).data
+        data["shared_result"] = reused
+        return Response(data, status=status.HTTP_200_OK)
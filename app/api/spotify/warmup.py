@@ -0,0 +1,78 @@
+"""
+Short-lived per-user cache of the first Spotify reads a dashboard makes.
+
+Right after a user connects Spotify we already hold their profile and a fresh
+access token, so the profile and first page of playlists are written here in
+the background. make_spotify_request serves GETs from this entry until it
+expires or the user changes anything through the proxy.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+import metrics
+from . import upstream
+
+logger = logging.getLogger(__name__)
+
+WARM_TTL = getattr(settings, "SPOTIFY_WARM_TTL", 2 * 60)
+FIRST_PAGE = {"limit": "50", "offset": "0"}
+
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="spotify-warmup")
+
+
+def _user_key(user_pk):
+    return f"spotify:warm:{user_pk}"
+
+
+def _entry_key(url, params):
+    return f"{url}:{sorted((params or {}).items())}"
+
+
+def get(user_pk, url, params=None):
+    entries = cache.get(_user_key(user_pk))
+    if not entries:
+        return None
+    content = entries.get(_entry_key(url, params))
+    if content is None:
+        return None
+    metrics.increment("spotify.warmup.hits")
+    return upstream.build_response(200, content, headers={"X-Spotify-Cache": "warm"})
+
+
+def forget(user_pk):
+    cache.delete(_user_key(user_pk))
+
+
+def warm_user(user_pk, access_token, profile):
+    start = time.monotonic()
+    me_url = f"{upstream.SPOTIFY_API_URL}/me"
+    playlists_url = f"{upstream.SPOTIFY_API_URL}/users/{profile['id']}/playlists"
+    response = upstream.send(
+        "playlists",
+        "GET",
+        playlists_url,
+        stale_scope=f"user:{user_pk}",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params=FIRST_PAGE,
+    )
+    entries = {_entry_key(me_url, None): upstream.build_response(200, profile).content}
+    if response.status_code == 200:
+        entries[_entry_key(playlists_url, FIRST_PAGE)] = response.content
+        # /me/playlists is the same list; api.bootstrap reads it from there.
+        entries[_entry_key(f"{me_url}/playlists", FIRST_PAGE)] = response.content
+    cache.set(_user_key(user_pk), entries, WARM_TTL)
+    metrics.observe("spotify.warmup.duration_ms", (time.monotonic() - start) * 1000)
+
+
+def schedule(user_pk, access_token, profile):
+    def run():
+        try:
+            warm_user(user_pk, access_token, profile)
+        except Exception:
+            logger.exception(f"Spotify warm-up failed for user {user_pk}")
+
+    executor.submit(run)
@@ -0,0 +1,399 @@
+"""
+Write-behind queue for playlist edits.
+
+In write-behind mode an add, remove or reorder is acknowledged straight away,
+applied to the local mirror, and queued per playlist. A playlist's queue is
+flushed to Spotify once it has been quiet for WINDOW seconds (or MAX_DELAY
+after its first edit). Before flushing, adjacent adds and removes are merged
+and an add followed by a remove of the same track cancels out. Each edit's
+status is kept in the shared cache for polling.
+
+The queue lives in the process that received the edits, like the deferred
+last_login writes, so edits to one playlist sent to different workers are
+flushed independently, and edits still queued when a process is killed are
+lost. When a flush fails the local mirror is rebuilt from Spotify so it doesn't
+keep edits Spotify never got; failed edits report the outcome as "mirror"
+("resynced", or "out_of_sync" if Spotify couldn't be read either).
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+
+import fastjson
+import metrics
+from backend import tracks
+from .. import library_search, ordering
+from ..models import Playlist, PlaylistSong, Song
+from . import reorder
+from .upstream import SPOTIFY_API_URL
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, "PLAYLIST_WRITE_BEHIND", False)
+WINDOW = getattr(settings, "PLAYLIST_WRITE_BEHIND_WINDOW", 2)
+MAX_DELAY = getattr(settings, "PLAYLIST_WRITE_BEHIND_MAX_DELAY", 10)
+STATUS_TTL = 60 * 60
+URI_BATCH_SIZE = 100
+
+QUEUED = "queued"
+APPLIED = "applied"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+_queues = {}
+_lock = threading.Lock()
+_flusher = None
+
+
+class Edit:
+    """
+    One queued edit. `present` maps each added URI to whether the local mirror
+    already had it before the add (None when the playlist isn't mirrored).
+    Removes that carry explicit positions are passed through untouched.
+    """
+
+    def __init__(self, kind, uris=(), position=None, move=None, tracks=None):
+        self.ids = [uuid.uuid4().hex]
+        self.kind = kind
+        self.uris = list(uris)
+        self.position = position
+        self.move = move
+        self.tracks = tracks
+        self.present = {}
+
+    @property
+    def positional(self):
+        if self.kind == "add":
+            return self.position is not None
+        return self.kind == "reorder" or self.tracks is not None
+
+
+def _status_key(edit_id):
+    return f"playlist-edit:{edit_id}"
+
+
+def set_status(user_id, edit_ids, state, **extra):
+    cache.set_many(
+        {
+            _status_key(edit_id): {"status": state, "user_id": user_id, **extra}
+            for edit_id in edit_ids
+        },
+        STATUS_TTL,
+    )
+
+
+def get_status(edit_id, user_id):
+    """Status of one of user_id's edits; None for unknown ids and other users' edits."""
+    record = cache.get(_status_key(edit_id))
+    if record is None or record.pop("user_id", None) != user_id:
+        return None
+    return record
+
+
+def enabled_for(request):
+    defer = request.query_params.get("defer")
+    if defer is not None:
+        return defer.lower() in ("1", "true", "yes")
+    return ENABLED
+
+
+def _present(playlist, uris):
+    if playlist is None:
+        return dict.fromkeys(uris)
+    existing = set(
+        PlaylistSong.objects.filter(
+            playlist=playlist, song__spotify_id__in=[tracks.track_id(uri) for uri in uris]
+        ).values_list("song__spotify_id", flat=True)
+    )
+    return {uri: tracks.track_id(uri) in existing for uri in uris}
+
+
+def coalesce(edits):
+    """
+    Merge a playlist's queued edits, in order. Returns (edits to send, ids of
+    edits that no longer need sending).
+    """
+    edits = list(edits)
+
+    # An add followed by a remove of the same track, with nothing positional in
+    # between, leaves the playlist as it was. Spotify's remove drops every copy,
+    # so the remove itself is only dropped when the track wasn't there before.
+    for index, edit in enumerate(edits):
+        if edit.kind != "remove" or edit.positional:
+            continue
+        for uri in list(edit.uris):
+            for earlier in reversed(edits[:index]):
+                if earlier.kind == "add" and uri in earlier.uris:
+                    earlier.uris = [u for u in earlier.uris if u != uri]
+                    if earlier.present.get(uri) is False:
+                        edit.uris.remove(uri)
+                    break
+                if earlier.positional:
+                    break
+
+    cancelled = [
+        edit_id
+        for edit in edits
+        if edit.kind in ("add", "remove") and not edit.uris and edit.tracks is None
+        for edit_id in edit.ids
+    ]
+    edits = [edit for edit in edits if edit.kind == "reorder" or edit.uris or edit.tracks]
+
+    merged = []
+    for edit in edits:
+        previous = merged[-1] if merged else None
+        if previous is None or previous.kind != edit.kind or edit.kind == "reorder":
+            merged.append(edit)
+        elif edit.kind == "remove" and not previous.positional and not edit.positional:
+            previous.uris.extend(uri for uri in edit.uris if uri not in previous.uris)
+            previous.ids.extend(edit.ids)
+        elif edit.kind == "add" and (
+            previous.position is None
+            if edit.position is None
+            else previous.position is not None
+            and edit.position == previous.position + len(previous.uris)
+        ):
+            previous.uris.extend(edit.uris)
+            previous.ids.extend(edit.ids)
+        else:
+            merged.append(edit)
+    return merged, cancelled
+
+
+class PlaylistQueue:
+    def __init__(self, user_id, playlist_id):
+        self.user_id = user_id
+        self.playlist_id = playlist_id
+        self.edits = []
+        self.first_at = time.monotonic()
+        self.last_at = self.first_at
+
+    def due(self, now):
+        return now - self.last_at >= WINDOW or now - self.first_at >= MAX_DELAY
+
+
+def record_local(user, playlist_id, edit):
+    """Apply an edit to the local mirror of the playlist, if there is one."""
+    playlist = Playlist.objects.filter(user=user, spotify_id=playlist_id).first()
+    if edit.kind == "add":
+        edit.present = _present(playlist, edit.uris)
+    if playlist is None or edit.kind == "reorder":
+        return
+
+    uris = edit.uris if edit.tracks is None else [track.get("uri") for track in edit.tracks]
+    songs = Song.objects.filter(spotify_id__in=[tracks.track_id(uri) for uri in uris])
+    if edit.kind == "remove":
+        removed = PlaylistSong.objects.filter(playlist=playlist, song__in=songs)
+        song_ids = list(removed.values_list("song_id", flat=True))
+        removed.delete()
+        if song_ids:
+            library_search.songs_removed(user.pk, playlist.pk, song_ids)
+        return
+    by_id = {song.spotify_id: song for song in songs}
+    previous = None
+    for offset, uri in enumerate(edit.uris):
+        song = by_id.get(tracks.track_id(uri))
+        if song is None:
+            continue
+        if edit.position is None:
+            ordering.add_song(playlist, song)
+        elif previous is None:
+            previous = ordering.add_song(playlist, song, edit.position + offset)
+        else:
+            # The rest of the run seeks from the row before it.
+            previous = ordering.add_song(playlist, song, after=previous.pk)
+
+
+def enqueue(user, playlist_id, edit):
+    """Record an edit locally and queue it for Spotify. Returns its status id."""
+    record_local(user, playlist_id, edit)
+    set_status(user.pk, edit.ids, QUEUED, playlist_id=playlist_id)
+    key = (user.pk, playlist_id)
+    with _lock:
+        queue = _queues.get(key)
+        if queue is None:
+            queue = _queues[key] = PlaylistQueue(user.pk, playlist_id)
+        queue.edits.append(edit)
+        queue.last_at = time.monotonic()
+    metrics.increment("playlist_edits.queued", kind=edit.kind)
+    _ensure_flusher()
+    return edit.ids[0]
+
+
+def _bodies(edit):
+    if edit.kind == "reorder":
+        return [("PUT", dict(edit.move))]
+    if edit.kind == "remove":
+        items = edit.tracks if edit.tracks is not None else [{"uri": uri} for uri in edit.uris]
+        return [
+            ("DELETE", {"tracks": items[i:i + URI_BATCH_SIZE]})
+            for i in range(0, len(items), URI_BATCH_SIZE)
+        ]
+    bodies = []
+    for i in range(0, len(edit.uris), URI_BATCH_SIZE):
+        body = {"uris": edit.uris[i:i + URI_BATCH_SIZE]}
+        if edit.position is not None:
+            body["position"] = edit.position + i
+        bodies.append(("POST", body))
+    return bodies
+
+
+def resync_mirror(user, playlist_id):
+    """
+    Rebuild the local mirror of a playlist from Spotify's current contents.
+    Returns False if Spotify couldn't be read.
+    """
+    from .views import SpotifyClientCredentialsView
+
+    playlist = Playlist.objects.filter(user=user, spotify_id=playlist_id).first()
+    if playlist is None:
+        return True
+    client = SpotifyClientCredentialsView()
+    request = SimpleNamespace(user=user)
+    url = f"{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks"
+    params = {"limit": 100, "offset": 0, "fields": "items(track(uri)),next"}
+    uris = []
+    while url:
+        response = client.make_spotify_request(
+            request, url, params=params, endpoint="playlist_tracks", fresh=True
+        )
+        if response.status_code != 200:
+            return False
+        page = fastjson.decode(response)
+        uris.extend((item.get("track") or {}).get("uri") for item in page.get("items", []))
+        url, params = page.get("next"), None
+    uris = [uri for uri in uris if uri]
+
+    on_spotify = {tracks.track_id(uri) for uri in uris}
+    local = dict(
+        PlaylistSong.objects.filter(playlist=playlist).values_list("song__spotify_id", "song_id")
+    )
+    gone = [song_id for spotify_id, song_id in local.items() if spotify_id not in on_spotify]
+    if gone:
+        PlaylistSong.objects.filter(playlist=playlist, song_id__in=gone).delete()
+        library_search.songs_removed(user.pk, playlist.pk, gone)
+    for song in Song.objects.filter(spotify_id__in=on_spotify - set(local)):
+        ordering.add_song(playlist, song)
+    reorder.mirror_order(user, playlist_id, uris)
+    return True
+
+
+def _resync(user_id, playlist_id):
+    try:
+        user = get_user_model().objects.get(pk=user_id)
+        if resync_mirror(user, playlist_id):
+            metrics.increment("playlist_edits.resynced")
+            return "resynced"
+    except Exception:
+        logger.exception(f"Re-syncing the mirror of playlist {playlist_id} failed")
+    logger.error(f"Local mirror of playlist {playlist_id} is out of sync with Spotify")
+    return "out_of_sync"
+
+
+def flush_queue(queue):
+    """Send a playlist's coalesced edits in order; stop at the first failure."""
+    from .views import SpotifyClientCredentialsView
+
+    edits, cancelled = coalesce(queue.edits)
+    if cancelled:
+        set_status(queue.user_id, cancelled, CANCELLED, playlist_id=queue.playlist_id)
+    metrics.increment("playlist_edits.coalesced", len(queue.edits) - len(edits))
+
+    request = SimpleNamespace(user=get_user_model().objects.get(pk=queue.user_id))
+    client = SpotifyClientCredentialsView()
+    url = f"{SPOTIFY_API_URL}/playlists/{queue.playlist_id}/tracks"
+    snapshot_id = None
+    for position, edit in enumerate(edits):
+        for method, body in _bodies(edit):
+            # Chain snapshots so positions are read against our previous write.
+            if snapshot_id and method != "POST":
+                body["snapshot_id"] = snapshot_id
+            response = client.make_spotify_request(
+                request, url, method=method, data=fastjson.dumps(body), endpoint="playlist_tracks"
+            )
+            if response.status_code not in (200, 201):
+                error = f"Spotify API error: {response.status_code} - {response.text}"
+                logger.error(f"Write-behind flush for playlist {queue.playlist_id} failed: {error}")
+                metrics.increment("playlist_edits.failed")
+                mirror = _resync(queue.user_id, queue.playlist_id)
+                set_status(
+                    queue.user_id,
+                    edit.ids,
+                    FAILED,
+                    playlist_id=queue.playlist_id,
+                    error=error,
+                    mirror=mirror,
+                )
+                for skipped in edits[position + 1:]:
+                    set_status(
+                        queue.user_id,
+                        skipped.ids,
+                        FAILED,
+                        playlist_id=queue.playlist_id,
+                        error="Not sent because an earlier edit failed",
+                        mirror=mirror,
+                    )
+                return False
+            snapshot_id = fastjson.decode(response).get("snapshot_id", snapshot_id)
+        set_status(
+            queue.user_id,
+            edit.ids,
+            APPLIED,
+            playlist_id=queue.playlist_id,
+            snapshot_id=snapshot_id,
+        )
+    metrics.increment("playlist_edits.flushed", len(edits))
+    return True
+
+
+def flush(force=False):
+    now = time.monotonic()
+    with _lock:
+        due = [key for key, queue in _queues.items() if force or queue.due(now)]
+        queues = [_queues.pop(key) for key in due]
+    for queue in queues:
+        try:
+            flush_queue(queue)
+        except Exception:
+            logger.exception(f"Write-behind flush for playlist {queue.playlist_id} failed")
+            mirror = _resync(queue.user_id, queue.playlist_id)
+            for edit in queue.edits:
+                set_status(
+                    queue.user_id,
+                    edit.ids,
+                    FAILED,
+                    playlist_id=queue.playlist_id,
+                    error="Flush failed",
+                    mirror=mirror,
+                )
+    return len(queues)
+
+
+def _run():
+    while True:
+        time.sleep(max(WINDOW / 2, 0.1))
+        try:
+            flush()
+        except Exception:
+            logger.exception("Write-behind flush failed")
+        finally:
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run, name="playlist-write-behind", daemon=True)
+            _flusher.start()
+            atexit.register(flush, True)
@@ -1,3 +1,702 @@
-from django.test import TestCase
+import io
+import random
+import uuid
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+import fastjson
+from api import library_search, ordering
+from api.models import Playlist, PlaylistSong, Song
+from api.spotify import compression, inflight, projection, reorder, upstream, write_behind
+from api.spotify.query_results import RefreshError, params_from_query
+from api.spotify.viewsets import QueryViewSet
+from api.views import BootstrapView
+from backend.models import CustomUser, Genre, MusicServiceConnection, Query
+
+
+class BootstrapQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="bootstrap@example.com", password="pw")
+        MusicServiceConnection.objects.create(
+            user=self.user,
+            service_name="spotify",
+            access_token="access",
+            refresh_token="refresh",
+        )
+        Genre.objects.create(name="pop")
+        self.factory = APIRequestFactory()
+
+    def fake_spotify(self, endpoint, method, url, **kwargs):
+        if url.endswith("/me"):
+            return upstream.build_response(200, {"id": "spotify-user"})
+        return upstream.build_response(200, {"items": [], "total": 0})
+
+    def get(self, query=""):
+        request = self.factory.get(f"/api/bootstrap/{query}")
+        force_authenticate(request, user=self.user)
+        return BootstrapView.as_view()(request)
+
+    def test_all_sections_in_one_response(self):
+        with mock.patch.object(upstream, "request", side_effect=self.fake_spotify):
+            # Genres and the Spotify connection; the Spotify calls share it.
+            with self.assertNumQueries(2):
+                response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["genres"], ["pop"])
+        self.assertEqual(response.data["spotify_user"], {"id": "spotify-user"})
+        self.assertEqual(response.data["spotify_playlists"]["items"], [])
+        self.assertTrue(response.data["auth"]["is_authenticated"])
+
+    def test_known_sections_are_left_out(self):
+        with mock.patch.object(upstream, "request", side_effect=self.fake_spotify):
+            etags = self.get().data["etags"]
+            response = self.get(f"?known=genres:{etags['genres']}")
+
+        self.assertEqual(response.data["unchanged"], ["genres"])
+        self.assertIsNone(response.data["genres"])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(upstream.time, "monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = upstream.CircuitBreaker(
+            "test", failure_rate=0.5, min_calls=4, window=30, reset_timeout=15
+        )
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.record_failure()
+
+    def test_opens_once_failure_rate_is_reached(self):
+        self.breaker.record_success()
+        self.fail(2)
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.CLOSED)
+
+        self.fail(1)
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_outcomes_outside_the_window_are_forgotten(self):
+        self.fail(3)
+        self.now += 31
+        self.fail(1)
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_trial_through(self):
+        self.fail(4)
+        self.now += 15
+
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self.fail(4)
+        self.now += 15
+        self.breaker.allow()
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_unexpected_error_releases_the_trial(self):
+        self.fail(4)
+        self.now += 15
+
+        with mock.patch.object(upstream, "get_breaker", return_value=self.breaker):
+            with mock.patch.object(upstream.session, "request", side_effect=ValueError):
+                with self.assertRaises(ValueError):
+                    upstream.request("test", "GET", "https://example.com")
+
+        self.assertEqual(self.breaker.state, upstream.CircuitBreaker.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+
+
+class QueryCursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="queries@example.com", password="pw")
+        other = CustomUser.objects.create_user(email="other@example.com", password="pw")
+        Query.objects.create(user=other, name="not mine", parameters={})
+        now = timezone.now()
+        self.queries = [
+            Query.objects.create(user=self.user, name=f"query {n}", parameters={"n": n})
+            for n in range(5)
+        ]
+        # Two queries share a timestamp so the id tie-breaker decides their order.
+        stamps = [now - timedelta(minutes=n) for n in (3, 1, 1, 0, 2)]
+        for query, stamp in zip(self.queries, stamps):
+            Query.objects.filter(pk=query.pk).update(updated_at=stamp)
+        self.factory = APIRequestFactory()
+
+    def get(self, params):
+        request = self.factory.get("/api/spotify/queries/", params)
+        force_authenticate(request, user=self.user)
+        return QueryViewSet.as_view({"get": "list"})(request)
+
+    def test_pages_follow_updated_at_then_id(self):
+        seen = []
+        params = {"page_size": 2}
+        while True:
+            response = self.get(params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data["results"]]
+            if not response.data["next"]:
+                break
+            cursor = parse_qs(urlparse(response.data["next"]).query)["cursor"][0]
+            params = {"page_size": 2, "cursor": cursor}
+
+        q = self.queries
+        self.assertEqual(seen, [q[3].pk, q[2].pk, q[1].pk, q[4].pk, q[0].pk])
+
+    def test_filters_apply_before_paging(self):
+        response = self.get({"search": "query 4"})
+
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.queries[4].pk])
+
+    def test_bad_datetime_filter_is_rejected(self):
+        response = self.get({"updated_after": "yesterday"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ParamsFromQueryTests(SimpleTestCase):
+    def test_malformed_selections_are_a_client_error(self):
+        for parameters in (
+            [],
+            {"selections": {"id": "x"}},
+            {"selections": ["x"]},
+            {"selections": [{"type": "artist"}]},
+            {"selections": [{"type": "artist", "id": 5}]},
+        ):
+            with self.subTest(parameters=parameters):
+                with self.assertRaises(RefreshError) as raised:
+                    params_from_query(parameters)
+                self.assertEqual(raised.exception.status_code, 400)
+
+
+class PlanMovesTests(SimpleTestCase):
+    def apply(self, current, moves):
+        for start, length, insert_before in moves:
+            current = reorder.apply_move(current, start, length, insert_before)
+        return current
+
+    def test_moves_reach_the_target(self):
+        rng = random.Random(7)
+        for size in (0, 1, 2, 5, 30, 200):
+            current = list(range(size))
+            target = rng.sample(current, size)
+            moves = reorder.plan_moves(current, target)
+            self.assertEqual(self.apply(current, moves), target)
+
+    def test_same_order_needs_no_moves(self):
+        self.assertEqual(reorder.plan_moves(list("abcd"), list("abcd")), [])
+
+    def test_adjacent_tracks_move_as_one_range(self):
+        current = list("abcdefgh")
+        target = list("abefgcdh")
+
+        moves = reorder.plan_moves(current, target)
+
+        self.assertEqual(len(moves), 1)
+        self.assertEqual(self.apply(current, moves), target)
+
+    def test_duplicates_are_matched_in_order(self):
+        current = list("abab")
+        target = list("bbaa")
+
+        self.assertEqual(self.apply(current, reorder.plan_moves(current, target)), target)
+
+    def test_target_must_be_a_permutation(self):
+        with self.assertRaises(ValueError):
+            reorder.plan_moves(list("abc"), list("abd"))
+        with self.assertRaises(ValueError):
+            reorder.plan_moves(list("abc"), list("ab"))
+
+    def test_gives_up_past_max_moves(self):
+        current = list(range(10))
+        target = current[::-1]
+
+        self.assertIsNone(reorder.plan_moves(current, target, max_moves=3))
+        self.assertIsNotNone(reorder.plan_moves(current, target, max_moves=9))
+
+
+def make_songs(count, start=0):
+    return [
+        Song.objects.create(
+            title=f"Song {n}",
+            artists=[{"name": f"Artist {n}"}],
+            spotify_id=f"track{n}",
+            isrc=f"ISRC{n:08d}",
+            image="https://example.com/cover.jpg",
+        )
+        for n in range(start, start + count)
+    ]
+
+
+class SparseOrderingTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="ordering@example.com", password="pw")
+        self.playlist = Playlist.objects.create(
+            user=self.user, name="Mix", spotify_id="mix", snapshot_id="s"
+        )
+        self.songs = make_songs(5)
+
+    def titles(self):
+        return list(
+            PlaylistSong.objects.filter(playlist=self.playlist)
+            .order_by("order", "id")
+            .values_list("song__title", flat=True)
+        )
+
+    def test_appends_are_spaced_by_the_gap(self):
+        rows = [ordering.add_song(self.playlist, song) for song in self.songs[:3]]
+
+        gap = ordering.ORDER_GAP
+        self.assertEqual([row.order for row in rows], [gap, 2 * gap, 3 * gap])
+
+    def test_insert_takes_the_midpoint_and_writes_one_row(self):
+        for song in self.songs[:3]:
+            ordering.add_song(self.playlist, song)
+
+        row = ordering.add_song(self.playlist, self.songs[3], index=1)
+
+        self.assertEqual(row.order, ordering.ORDER_GAP + ordering.ORDER_GAP // 2)
+        self.assertEqual(self.titles(), ["Song 0", "Song 3", "Song 1", "Song 2"])
+
+    def test_insert_after_a_known_row(self):
+        first = ordering.add_song(self.playlist, self.songs[0])
+        ordering.add_song(self.playlist, self.songs[1])
+
+        previous = first
+        for song in self.songs[2:]:
+            previous = ordering.add_song(self.playlist, song, after=previous.pk)
+
+        self.assertEqual(self.titles(), ["Song 0", "Song 2", "Song 3", "Song 4", "Song 1"])
+
+    def test_move_to_the_front(self):
+        rows = [ordering.add_song(self.playlist, song) for song in self.songs[:3]]
+
+        ordering.move(rows[2], 0)
+
+        self.assertEqual(self.titles(), ["Song 2", "Song 0", "Song 1"])
+
+    def test_adjacent_neighbours_are_renumbered_inline(self):
+        for order, song in enumerate(self.songs[:3], start=1):
+            PlaylistSong.objects.create(playlist=self.playlist, song=song, order=order)
+
+        ordering.add_song(self.playlist, self.songs[3], index=1)
+
+        self.assertEqual(self.titles(), ["Song 0", "Song 3", "Song 1", "Song 2"])
+        orders = list(
+            PlaylistSong.objects.filter(playlist=self.playlist).order_by("order").values_list(
+                "order", flat=True
+            )
+        )
+        self.assertTrue(all(b - a >= ordering.MIN_GAP for a, b in zip(orders, orders[1:])))
+
+    def test_tight_gap_schedules_one_rebalance_after_commit(self):
+        for order, song in zip((10, 20), self.songs[:2]):
+            PlaylistSong.objects.create(playlist=self.playlist, song=song, order=order)
+
+        with mock.patch.object(ordering, "rebalance_pool") as pool:
+            with self.captureOnCommitCallbacks(execute=True):
+                ordering.add_song(self.playlist, self.songs[2], index=1)
+                ordering.add_song(self.playlist, self.songs[3], index=1)
+            self.addCleanup(ordering._scheduled.discard, self.playlist.pk)
+
+        self.assertEqual(pool.submit.call_count, 1)
+        self.assertIn(self.playlist.pk, ordering._scheduled)
+
+    def test_rolled_back_insert_schedules_nothing(self):
+        for order, song in zip((10, 20), self.songs[:2]):
+            PlaylistSong.objects.create(playlist=self.playlist, song=song, order=order)
+
+        with mock.patch.object(ordering, "rebalance_pool") as pool:
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    ordering.add_song(self.playlist, self.songs[2], index=1)
+                    raise RuntimeError
+
+        pool.submit.assert_not_called()
+        self.assertNotIn(self.playlist.pk, ordering._scheduled)
+
+
+class WriteBehindCoalesceTests(SimpleTestCase):
+    def edit(self, kind, *names, present=False, **kwargs):
+        edit = write_behind.Edit(kind, [f"spotify:track:{name}" for name in names], **kwargs)
+        if kind == "add":
+            edit.present = dict.fromkeys(edit.uris, present)
+        return edit
+
+    def test_adjacent_appends_and_removes_merge(self):
+        edits = [
+            self.edit("add", "a"),
+            self.edit("add", "b"),
+            self.edit("remove", "x"),
+            self.edit("remove", "y", "x"),
+        ]
+        add_ids = edits[0].ids + edits[1].ids
+
+        merged, cancelled = write_behind.coalesce(edits)
+
+        self.assertEqual(cancelled, [])
+        self.assertEqual([(e.kind, e.uris) for e in merged], [
+            ("add", ["spotify:track:a", "spotify:track:b"]),
+            ("remove", ["spotify:track:x", "spotify:track:y"]),
+        ])
+        self.assertEqual(merged[0].ids, add_ids)
+
+    def test_add_then_remove_of_a_new_track_cancels_out(self):
+        add, remove = self.edit("add", "a"), self.edit("remove", "a")
+
+        merged, cancelled = write_behind.coalesce([add, remove])
+
+        self.assertEqual(merged, [])
+        self.assertEqual(cancelled, add.ids + remove.ids)
+
+    def test_remove_is_kept_when_the_track_was_already_there(self):
+        add, remove = self.edit("add", "a", present=True), self.edit("remove", "a")
+
+        merged, cancelled = write_behind.coalesce([add, remove])
+
+        self.assertEqual([(e.kind, e.uris) for e in merged], [("remove", ["spotify:track:a"])])
+        self.assertEqual(cancelled, add.ids)
+
+    def test_positional_edits_block_cancellation(self):
+        reorder_edit = write_behind.Edit("reorder", move={"range_start": 0, "insert_before": 2})
+        edits = [self.edit("add", "a"), reorder_edit, self.edit("remove", "a")]
+
+        merged, cancelled = write_behind.coalesce(edits)
+
+        self.assertEqual([e.kind for e in merged], ["add", "reorder", "remove"])
+        self.assertEqual(cancelled, [])
+
+    def test_positional_adds_merge_only_when_contiguous(self):
+        edits = [
+            self.edit("add", "a", "b", position=3),
+            self.edit("add", "c", position=5),
+            self.edit("add", "d", position=0),
+        ]
+
+        merged, _ = write_behind.coalesce(edits)
+
+        self.assertEqual([(e.uris, e.position) for e in merged], [
+            (["spotify:track:a", "spotify:track:b", "spotify:track:c"], 3),
+            (["spotify:track:d"], 0),
+        ])
+
+    def test_large_adds_are_sent_in_batches_with_positions(self):
+        edit = write_behind.Edit("add", [f"spotify:track:{n}" for n in range(250)], position=10)
+
+        bodies = write_behind._bodies(edit)
+
+        self.assertEqual([len(body["uris"]) for _, body in bodies], [100, 100, 50])
+        self.assertEqual([body["position"] for _, body in bodies], [10, 110, 210])
+
+
+class LibraryIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = library_search.LibraryIndex()
+        self.index.add_playlist(1, "p1", "Road Trip")
+        self.index.add_playlist(2, "p2", "Chill")
+        self.index.add_song(1, 10, "s10", "Café del Mar", [{"name": "Energy 52"}])
+        self.index.add_song(2, 10, "s10", "Café del Mar", [{"name": "Energy 52"}])
+        self.index.add_song(1, 11, "s11", "Roadrunner", [{"name": "The Modern Lovers"}])
+
+    def ids(self, query, **kwargs):
+        return [doc["id"] for doc in self.index.search(query, **kwargs)]
+
+    def test_accents_and_case_are_folded(self):
+        self.assertEqual(self.ids("CAFE"), ["s10"])
+
+    def test_exact_matches_rank_above_prefix_matches(self):
+        self.assertEqual(self.ids("road"), ["p1", "s11"])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.ids("cafe energy"), ["s10"])
+        self.assertEqual(self.ids("cafe lovers"), [])
+
+    def test_one_edit_is_tolerated_unless_fuzzy_is_off(self):
+        self.assertEqual(self.ids("lxvxrs"), [])
+        self.assertEqual(self.ids("lvers"), ["s11"])
+        self.assertEqual(self.ids("modrn", fuzzy=False), [])
+
+    def test_song_lists_the_playlists_it_is_in(self):
+        (doc,) = self.index.search("cafe")
+
+        self.assertEqual(doc["playlists"], [{"id": "p1", "name": "Road Trip"}, {"id": "p2", "name": "Chill"}])
+
+    def test_song_stays_until_removed_from_every_playlist(self):
+        self.index.remove_song(1, 10)
+        self.assertEqual(self.ids("cafe"), ["s10"])
+
+        self.index.remove_playlist(2)
+        self.assertEqual(self.ids("cafe"), [])
+        self.assertEqual(self.ids("chill"), [])
+        self.assertNotIn("cafe", self.index.tokens)
+
+    def test_renaming_a_playlist_replaces_its_tokens(self):
+        self.index.add_playlist(2, "p2", "Focus")
+
+        self.assertEqual(self.ids("chill"), [])
+        self.assertEqual(self.ids("focus"), ["p2"])
+
+
+class LibrarySearchSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        library_search._indexes.clear()
+        self.user = CustomUser.objects.create_user(email="search@example.com", password="pw")
+        self.playlist = Playlist.objects.create(
+            user=self.user, name="Mix", spotify_id="mix", snapshot_id="s"
+        )
+        self.songs = make_songs(2)
+        for song in self.songs:
+            ordering.add_song(self.playlist, song)
+
+    def titles(self, query):
+        return [doc.get("title") or doc["name"] for doc in library_search.search(self.user.pk, query)]
+
+    def test_loaded_index_follows_saves_and_bulk_removes(self):
+        self.assertEqual(self.titles("song"), ["Song 0", "Song 1"])
+
+        PlaylistSong.objects.filter(song=self.songs[0]).delete()
+        library_search.songs_removed(self.user.pk, self.playlist.pk, [self.songs[0].pk])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles("song"), ["Song 1"])
+
+    def test_deleting_a_playlist_drops_its_songs(self):
+        self.assertEqual(self.titles("mix"), ["Mix"])
+
+        self.playlist.delete()
+
+        self.assertEqual(self.titles("mix"), [])
+        self.assertEqual(self.titles("song"), [])
+
+    def test_change_from_another_process_forces_a_rebuild(self):
+        index = library_search.get_index(self.user.pk)
+        # Another worker changed the library: the shared version moves past ours.
+        library_search._bump_version(self.user.pk)
+
+        self.assertIsNot(library_search.get_index(self.user.pk), index)
+
+
+class InflightCoalescingTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        self.release.wait(5)
+        return upstream.build_response(200, {"calls": self.calls})
+
+    def run_concurrently(self, fetch, followers=3):
+        """Run a leader and `followers` callers that join its flight."""
+        results, joined = [], threading.Semaphore(0)
+
+        def increment(name, *args, **kwargs):
+            if name == "spotify.coalesce.followers":
+                joined.release()
+
+        def call():
+            try:
+                results.append(inflight.run("key", fetch, upstream.build_response))
+            except Exception as e:
+                results.append(e)
+
+        with mock.patch.object(inflight.metrics, "increment", side_effect=increment):
+            threads = [threading.Thread(target=call)]
+            threads[0].start()
+            while "key" not in inflight._pending:
+                threads[0].join(0.001)
+            threads += [threading.Thread(target=call) for _ in range(followers)]
+            for thread in threads[1:]:
+                thread.start()
+            for _ in range(followers):
+                self.assertTrue(joined.acquire(timeout=5))
+            self.release.set()
+            for thread in threads:
+                thread.join(5)
+        return results
+
+    def test_concurrent_callers_share_one_fetch(self):
+        results = self.run_concurrently(self.fetch)
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(results), 4)
+        self.assertEqual({response.content for response in results}, {b'{"calls":1}'})
+        # Each caller gets its own copy.
+        self.assertEqual(len({id(response) for response in results}), 4)
+        self.assertNotIn("key", inflight._pending)
+
+    def test_followers_get_the_leaders_exception(self):
+        def fetch():
+            self.release.wait(5)
+            raise upstream.CircuitOpenError("open")
+
+        results = self.run_concurrently(fetch)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(isinstance(result, upstream.CircuitOpenError) for result in results))
+
+    def test_later_calls_fetch_again(self):
+        self.release.set()
+        inflight.run("key", self.fetch, upstream.build_response)
+        inflight.run("key", self.fetch, upstream.build_response)
+
+        self.assertEqual(self.calls, 2)
+
+    def test_flight_key_separates_tokens_and_ignores_param_order(self):
+        url = "https://api.spotify.com/v1/me/playlists"
+        key = inflight.flight_key("GET", url, {"a": 1, "b": 2}, {"Authorization": "Bearer x"})
+
+        self.assertEqual(
+            key, inflight.flight_key("get", url, {"b": 2, "a": 1}, {"Authorization": "Bearer x"})
+        )
+        self.assertNotEqual(
+            key, inflight.flight_key("GET", url, {"a": 1, "b": 2}, {"Authorization": "Bearer y"})
+        )
+
+    def test_follows_a_flight_in_another_worker(self):
+        cache.set("spotify:inflight:marker:key", True)
+        cache.set(
+            "spotify:inflight:result:key",
+            {"status": 200, "content": b"{}", "headers": {"Content-Type": "application/json"}},
+        )
+        self.addCleanup(cache.delete_many, ["spotify:inflight:marker:key", "spotify:inflight:result:key"])
+
+        with mock.patch.object(inflight, "ACROSS_WORKERS", True):
+            response = inflight.run("key", self.fetch, upstream.build_response)
+
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(response.content, b"{}")
+
+
+class ProjectionTests(SimpleTestCase):
+    def test_parse_nested_spec(self):
+        self.assertEqual(
+            projection.parse("items(track(id, name,artists(name))),next"),
+            {"items": {"track": {"id": None, "name": None, "artists": {"name": None}}}, "next": None},
+        )
+
+    def test_parse_rejects_malformed_specs(self):
+        for spec in ("items(track", "items)", "(id)", "a,b))"):
+            with self.subTest(spec=spec), self.assertRaises(projection.FieldSpecError):
+                projection.parse(spec)
+
+    def test_presets_parse(self):
+        for kind, spec in projection.PRESETS.items():
+            with self.subTest(kind=kind):
+                projection.parse(spec)
+
+    def test_project_selects_inside_lists_and_skips_missing_keys(self):
+        document = {
+            "items": [
+                {"track": {"id": "1", "name": "One", "popularity": 3}, "added_at": "x"},
+                {"track": None},
+            ],
+            "total": 2,
+        }
+
+        projected = projection.project(document, projection.parse("items(track(id,name)),next"))
+
+        self.assertEqual(projected, {"items": [{"track": {"id": "1", "name": "One"}}, {"track": None}]})
+
+    def test_requested_expands_compact(self):
+        self.assertEqual(
+            projection.requested({"compact": "1"}, "playlists"), projection.PRESETS["playlists"]
+        )
+        self.assertEqual(projection.requested({"fields": "id"}, "playlists"), "id")
+        self.assertIsNone(projection.requested({}, "playlists"))
+
+
+class ChooseEncodingTests(SimpleTestCase):
+    def choose(self, header, brotli=True):
+        with mock.patch.object(compression, "brotli", object() if brotli else None):
+            return compression.choose_encoding(header)
+
+    def test_prefers_brotli_when_available(self):
+        self.assertEqual(self.choose("gzip, deflate, br"), "br")
+        self.assertEqual(self.choose("gzip, deflate, br", brotli=False), "gzip")
+
+    def test_honours_q_values(self):
+        self.assertEqual(self.choose("br;q=0.5, gzip;q=0.8"), "gzip")
+        self.assertEqual(self.choose("br;q=0, gzip"), "gzip")
+        self.assertIsNone(self.choose("gzip;q=0", brotli=False))
+
+    def test_wildcard_and_missing_headers(self):
+        self.assertEqual(self.choose("*"), "br")
+        self.assertEqual(self.choose("*;q=0.5, br;q=0"), "gzip")
+        self.assertIsNone(self.choose(""))
+        self.assertIsNone(self.choose(None))
+        self.assertIsNone(self.choose("identity"))
+
+    def test_malformed_entries_are_ignored(self):
+        self.assertEqual(self.choose("gzip;q=abc, br;q=1.0.0, gzip", brotli=False), "gzip")
+
+
+class FastJSONParityTests(SimpleTestCase):
+    document = {
+        "name": "Café ✓",
+        "count": 3,
+        "ratio": 0.25,
+        "flags": [True, False, None],
+        "nested": {"items": [{"id": "1"}, {"id": "2"}]},
+    }
+
+    def test_matches_json_renderer_byte_for_byte(self):
+        self.assertEqual(fastjson.dumps(self.document), JSONRenderer().render(self.document))
+
+    def test_types_drf_knows_are_encoded_like_drf(self):
+        document = {
+            "price": Decimal("1.50"),
+            "id": uuid.UUID(int=1),
+            "at": datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            "label": gettext_lazy("Playlists"),
+            "ids": {1, 2},
+            1: "numeric key",
+        }
+
+        self.assertEqual(
+            fastjson.loads(fastjson.dumps(document)),
+            fastjson.loads(JSONRenderer().render(document)),
+        )
+
+    def test_renderer_leaves_indented_output_to_drf(self):
+        renderer = fastjson.FastJSONRenderer()
+        context = {"indent": 2}
+
+        self.assertEqual(
+            renderer.render(self.document, "application/json", context),
+            JSONRenderer().render(self.document, "application/json", context),
+        )
+        self.assertEqual(renderer.render(None), b"")
+
+    def test_parser_reports_bad_json(self):
+        parser = fastjson.FastJSONParser()
+
+        self.assertEqual(parser.parse(io.BytesIO(b'{"a": [1]}')), {"a": [1]})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b"{"))
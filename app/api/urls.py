@@ -5,6 +5,7 @@ from backend.views.onboarding_views import complete_onboarding
 
 urlpatterns = [
     path("spotify/", include("api.spotify.urls")),
+    path("bootstrap/", views.BootstrapView.as_view(), name="bootstrap"),
     path(
         "check-email-verification/",
         views.check_email_verification,
@@ -12,5 +13,8 @@ urlpatterns = [
     ),
     path("playlists/", views.get_playlists, name="get_playlists"),
     path("genres/", get_genres, name="get_genres"),
+    path("metrics/", views.get_metrics, name="get_metrics"),
+    path("library/search/", views.search_library, name="search_library"),
+    path("similar/<str:key>/", views.similar_tracks, name="similar_tracks"),
     path("complete-onboarding/", complete_onboarding, name="complete_onboarding"),
 ]
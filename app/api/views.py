@@ -1,20 +1,102 @@
-from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from api.models import Playlist
 from django.core.serializers import serialize
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from .models import Playlist, Song
+from . import bootstrap, library_search, ordering, similar
+from backend import tracks
 from .serializers import PlaylistSerializer, SongSerializer
 from .spotify.views import SpotifyPlaylistsView
+from .spotify import upstream
+import metrics
+from fastjson import JsonResponse
 
 @login_required
 def check_email_verification(request):
     return JsonResponse({'emailVerified': request.user.email_verified})
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+    data = metrics.snapshot()
+    data["spotify_circuits"] = upstream.breaker_states()
+    return Response(data)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def similar_tracks(request, key):
+    """Songs like the one identified by a Spotify track id or ISRC, from the local catalogue."""
+    spotify_id = key
+    if len(key) == 12:
+        spotify_id = (
+            Song.objects.filter(isrc=key.upper()).values_list("spotify_id", flat=True).first()
+            or key
+        )
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = similar.similar_to(spotify_id, limit)
+    if results is None:
+        return Response(
+            {"error": "No audio features for this track"}, status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(
+        {
+            "seed": {"id": spotify_id, "uri": tracks.track_uri(spotify_id)},
+            "tracks": tracks.hydrate([spotify_id for spotify_id, _ in results], fetch=False),
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_library(request):
+    """Prefix and fuzzy search over the tracks and playlists the user has mirrored."""
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    fuzzy = request.GET.get("fuzzy", "true").lower() not in ("0", "false", "no")
+    return Response(
+        {"query": query, "results": library_search.search(request.user.pk, query, limit, fuzzy)}
+    )
+
+
+class BootstrapView(APIView):
+    """Startup data for the frontend in one round trip; see api.bootstrap."""
+
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        sections = bootstrap.build(request)
+        etags = {name: bootstrap.etag(section) for name, section in sections.items()}
+        overall = f'"{bootstrap.etag(etags)}"'
+        if request.headers.get("If-None-Match") == overall:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": overall})
+
+        known = bootstrap.parse_known(request.GET.get("known"))
+        unchanged = sorted(name for name, tag in etags.items() if known.get(name) == tag)
+        for name in unchanged:
+            sections[name] = None
+        return Response(
+            {**sections, "etags": etags, "unchanged": unchanged},
+            headers={"ETag": overall},
+        )
+
+
 @login_required
 def get_playlists(request):
     playlists = Playlist.objects.filter(user=request.user)
@@ -72,7 +154,7 @@ class PlaylistSongView(APIView):
                 )
 
                 # Add song to local playlist
-                playlist.songs.add(song)
+                ordering.add_song(playlist, song)
 
                 return Response(SongSerializer(song).data, status=status.HTTP_201_CREATED)
             else:
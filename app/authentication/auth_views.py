@@ -1,4 +1,4 @@
-from django.http import JsonResponse
+from fastjson import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.core.mail import send_mail
 from django.contrib.auth.tokens import default_token_generator
@@ -0,0 +1,95 @@
+"""
+Google sign-in helpers: cached SocialApp lookups, locally verified ID tokens
+and a pooled session for the code-for-token exchange.
+"""
+import logging
+import threading
+import time
+
+import jwt
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from allauth.socialaccount.models import SocialApp
+from requests.adapters import HTTPAdapter
+
+import fastjson
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+JWKS_LIFESPAN = getattr(settings, "GOOGLE_JWKS_LIFESPAN", 6 * 60 * 60)
+APP_CACHE_TTL = getattr(settings, "SOCIAL_APP_CACHE_TTL", 5 * 60)
+APP_VERSION_KEY = "socialapp-config-version"
+TOKEN_EXCHANGE_TIMEOUT = (3.05, 10)
+
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20))
+
+# PyJWKClient keeps the key set for JWKS_LIFESPAN and refetches it when a
+# token is signed with a kid it hasn't seen, which covers Google's key rotation.
+jwks_client = jwt.PyJWKClient(GOOGLE_JWKS_URL, cache_jwk_set=True, lifespan=JWKS_LIFESPAN)
+
+_apps = {}
+_apps_lock = threading.Lock()
+
+
+def get_social_app(provider_id):
+    """
+    SocialApp for a provider, cached in process. Saving or deleting a SocialApp
+    bumps a version in the shared cache so every process drops its copy.
+    """
+    version = cache.get(APP_VERSION_KEY, 0)
+    entry = _apps.get(provider_id)
+    if entry and entry[1] == version and time.monotonic() - entry[2] < APP_CACHE_TTL:
+        return entry[0]
+
+    app = SocialApp.objects.get(provider=provider_id)
+    with _apps_lock:
+        _apps[provider_id] = (app, version, time.monotonic())
+    return app
+
+
+def invalidate_social_apps():
+    with _apps_lock:
+        _apps.clear()
+    try:
+        cache.incr(APP_VERSION_KEY)
+    except ValueError:
+        cache.set(APP_VERSION_KEY, 1, None)
+
+
+def exchange_code(access_token_url, app, code, redirect_uri):
+    response = session.post(
+        access_token_url,
+        data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "client_id": app.client_id,
+            "client_secret": app.secret,
+            "redirect_uri": redirect_uri,
+        },
+        timeout=TOKEN_EXCHANGE_TIMEOUT,
+    )
+    response.raise_for_status()
+    return fastjson.decode(response)
+
+
+def verify_id_token(id_token, client_id):
+    """
+    Verify signature, audience, expiry and issuer against Google's cached keys.
+    Raises jwt.PyJWKClientConnectionError when the key set can't be fetched,
+    jwt.PyJWKClientError when no key matches the token's kid, and
+    jwt.InvalidTokenError for everything else wrong with the token.
+    """
+    signing_key = jwks_client.get_signing_key_from_jwt(id_token)
+    payload = jwt.decode(
+        id_token,
+        signing_key.key,
+        algorithms=["RS256"],
+        audience=client_id,
+    )
+    if payload.get("iss") not in GOOGLE_ISSUERS:
+        raise jwt.InvalidIssuerError(f"Unexpected issuer: {payload.get('iss')}")
+    return payload
@@ -0,0 +1,82 @@
+"""
+Deferred last_login writes for stateless (token-only) logins.
+
+Logins record a timestamp in memory; a background thread writes all pending
+timestamps with one bulk UPDATE every LAST_LOGIN_FLUSH_INTERVAL seconds, or as
+soon as LAST_LOGIN_MAX_PENDING users are waiting. record() never touches the
+database itself, so it is safe to call from async views. bulk_update sends no
+post_save signals, so no dependent rows are touched.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = getattr(settings, "LAST_LOGIN_FLUSH_INTERVAL", 5)
+MAX_PENDING = getattr(settings, "LAST_LOGIN_MAX_PENDING", 1000)
+
+_pending = {}
+_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def record(user_id, when=None):
+    with _lock:
+        _pending[user_id] = when or timezone.now()
+        size = len(_pending)
+    _ensure_flusher()
+    if size >= MAX_PENDING:
+        _wake.set()
+
+
+def flush():
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+
+    User = get_user_model()
+    try:
+        User.objects.bulk_update(
+            [User(pk=pk, last_login=when) for pk, when in pending.items()],
+            ["last_login"],
+            batch_size=500,
+        )
+    except Exception:
+        logger.exception(f"Failed to write last_login for {len(pending)} users")
+        with _lock:
+            for pk, when in pending.items():
+                _pending.setdefault(pk, when)
+        return 0
+    return len(pending)
+
+
+def _run():
+    while True:
+        _wake.wait(FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception("last_login flush failed")
+        finally:
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run, name="last-login-flusher", daemon=True)
+            _flusher.start()
+            atexit.register(flush)
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired outstanding and blacklisted refresh tokens in batches. "
+        "Intended to run on a schedule (e.g. hourly from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Seconds to pause between batches to limit load on the database",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        batch_size = options["batch_size"]
+        outstanding_deleted = 0
+        blacklisted_deleted = 0
+        started = time.monotonic()
+
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=cutoff)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                blacklisted_deleted += BlacklistedToken.objects.filter(
+                    token_id__in=ids
+                )._raw_delete(BlacklistedToken.objects.db)
+                outstanding_deleted += OutstandingToken.objects.filter(
+                    pk__in=ids
+                )._raw_delete(OutstandingToken.objects.db)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Deleted batch of {len(ids)} outstanding tokens")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {outstanding_deleted} outstanding and {blacklisted_deleted} "
+                f"blacklisted tokens in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,11 @@
+from allauth.socialaccount.models import SocialApp
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .google import invalidate_social_apps
+
+
+@receiver(post_save, sender=SocialApp)
+@receiver(post_delete, sender=SocialApp)
+def invalidate_social_app_cache(sender, **kwargs):
+    invalidate_social_apps()
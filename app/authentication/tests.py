@@ -1,3 +1,84 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from authentication import tokens
+from authentication.views import TokenLoginView
+from backend.models import CustomUser
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_added_values_are_always_found(self):
+        bloom = tokens.BloomFilter(1000)
+        values = [f"jti-{n}" for n in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+
+    def test_false_positive_rate_stays_near_target(self):
+        bloom = tokens.BloomFilter(1000)
+        for n in range(1000):
+            bloom.add(f"jti-{n}")
+
+        false_positives = sum(f"other-{n}" in bloom for n in range(10000))
+        self.assertLess(false_positives / 10000, tokens.FALSE_POSITIVE_RATE * 3)
+
+    def test_empty_filter_contains_nothing(self):
+        self.assertNotIn("jti", tokens.BloomFilter(0))
+
+
+class BlacklistCheckTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="tokens@example.com", password="pw")
+        cache.clear()
+        tokens._filter = None
+        patcher = mock.patch.object(tokens, "_cache_is_shared", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, tokens, "_filter", None)
+
+    def token(self):
+        return tokens.CachedBlacklistRefreshToken.for_user(self.user)
+
+    def test_unknown_token_is_cleared_by_the_filter(self):
+        token = self.token()
+        tokens.is_blacklisted(self.token())
+
+        # The filter is built now; later negatives skip the database.
+        with self.assertNumQueries(0):
+            self.assertFalse(tokens.is_blacklisted(token))
+
+    def test_blacklisting_takes_effect_without_a_filter_rebuild(self):
+        token = self.token()
+        self.assertFalse(tokens.is_blacklisted(token))
+
+        token.blacklist()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(tokens.is_blacklisted(token))
+
+    def test_revocation_from_another_worker_is_seen(self):
+        token = self.token()
+        # Blacklisted directly in the database, as another process would, before
+        # this process builds its filter.
+        outstanding = OutstandingToken.objects.get(jti=token["jti"])
+        BlacklistedToken.objects.create(token=outstanding)
+
+        self.assertTrue(tokens.is_blacklisted(token))
+        with self.assertNumQueries(0):
+            self.assertTrue(tokens.is_blacklisted(token))
+
+
+class TokenLoginBodyTests(SimpleTestCase):
+    async def post(self, body):
+        request = AsyncRequestFactory().post("/token-login/", body, content_type="application/json")
+        return await TokenLoginView.as_view()(request)
+
+    async def test_malformed_bodies_are_rejected_before_any_lookup(self):
+        for body in (b"{", b"\xff", b"[]", b'"text"', b'{"email": ["a"], "password": "pw"}'):
+            with self.subTest(body=body):
+                response = await self.post(body)
+                self.assertEqual(response.status_code, 400)
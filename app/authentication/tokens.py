@@ -0,0 +1,131 @@
+"""
+Refresh tokens whose blacklist check usually avoids the database.
+
+simplejwt checks BlacklistedToken on every refresh. Here a blacklisted jti is
+first looked up as a marker in the shared cache, then in a process-local Bloom
+filter of all unexpired blacklisted jtis. A negative from the filter means the
+token was not blacklisted when the filter was built. Anything blacklisted
+since then has a cache marker, so only possible positives reach the database.
+
+The fast path relies on the cache being shared between workers. With a
+per-process cache (locmem/dummy) every check goes to the database.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MARKER_PREFIX = "jwt-blacklist:"
+FILTER_REFRESH = getattr(settings, "JWT_BLACKLIST_FILTER_REFRESH", 60)
+FALSE_POSITIVE_RATE = 0.01
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=FALSE_POSITIVE_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+_filter = None
+_filter_built_at = 0.0
+_filter_lock = threading.Lock()
+
+
+def _cache_is_shared():
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    return not backend.endswith(("LocMemCache", "DummyCache"))
+
+
+def _current_filter():
+    global _filter, _filter_built_at
+    if _filter is not None and time.monotonic() - _filter_built_at < FILTER_REFRESH:
+        return _filter
+    with _filter_lock:
+        if _filter is None or time.monotonic() - _filter_built_at >= FILTER_REFRESH:
+            jtis = list(
+                BlacklistedToken.objects.filter(
+                    token__expires_at__gt=timezone.now()
+                ).values_list("token__jti", flat=True)
+            )
+            bloom = BloomFilter(len(jtis) * 2)
+            for jti in jtis:
+                bloom.add(jti)
+            _filter = bloom
+            _filter_built_at = time.monotonic()
+            metrics.set_gauge("jwt.blacklist.filter_size", len(jtis))
+    return _filter
+
+
+def _marker_ttl(token):
+    remaining = token.payload.get("exp", 0) - int(time.time())
+    return max(remaining, 1)
+
+
+def is_blacklisted(token):
+    jti = token.payload[api_settings.JTI_CLAIM]
+    if not _cache_is_shared():
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    marker = cache.get(f"{MARKER_PREFIX}{jti}")
+    if marker is not None:
+        metrics.increment("jwt.blacklist.checks", path="cache")
+        return marker
+
+    if jti not in _current_filter():
+        metrics.increment("jwt.blacklist.checks", path="filter")
+        return False
+
+    metrics.increment("jwt.blacklist.checks", path="database")
+    blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    cache.set(f"{MARKER_PREFIX}{jti}", blacklisted, _marker_ttl(token) if blacklisted else FILTER_REFRESH)
+    return blacklisted
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        if is_blacklisted(self):
+            raise TokenError("Token is blacklisted")
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        cache.set(f"{MARKER_PREFIX}{jti}", True, _marker_ttl(self))
+        if _filter is not None:
+            _filter.add(jti)
+        return result
+
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
@@ -25,17 +25,31 @@ from backend.models import CustomUser
 from allauth.account.models import EmailAddress
 import logging
 import json
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import HttpResponseRedirect
+from fastjson import JsonResponse
 from allauth.socialaccount.models import SocialApp
 import jwt
 import traceback
 from django.db import IntegrityError
 from allauth.account.utils import user_email, user_field, user_username
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.views import View
+import asyncio
+from rest_framework_simplejwt.views import TokenRefreshView
+from . import google, last_login
+from .tokens import CachedBlacklistRefreshToken, CachedTokenRefreshSerializer
 
 logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# Password hashing is deliberately slow; keep it off the event loop and bounded.
+PASSWORD_HASH_POOL = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PASSWORD_HASH_WORKERS", 4),
+    thread_name_prefix="password-hash",
+)
+
 
 @ensure_csrf_cookie
 def get_csrf_token(request):
@@ -106,7 +120,6 @@ class LoginView(APIView):
             login(request, user)
             refresh = RefreshToken.for_user(user)
             logger.info(f"User logged in: {email}")
-            print(f"Access token if user exists: {str(refresh.access_token)}")
 
             return Response(
                 {
@@ -123,6 +136,66 @@ class LoginView(APIView):
         )
 
 
+def _get_login_user(email):
+    return User.objects.filter(email=email, is_active=True).first()
+
+
+def _check_password(user, password):
+    if user is None:
+        # Run the hasher anyway so unknown emails take as long as wrong passwords.
+        User().set_password(password)
+        return False
+    return user.check_password(password)
+
+
+def _issue_tokens(user):
+    refresh = RefreshToken.for_user(user)
+    return str(refresh), str(refresh.access_token)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class TokenLoginView(View):
+    """
+    Stateless login: verifies the password in PASSWORD_HASH_POOL and returns
+    JWTs without creating a session. last_login is written in batches.
+    """
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Expected a JSON object"}, status=400)
+        email = data.get("email")
+        password = data.get("password")
+        if not isinstance(email, str) or not isinstance(password, str):
+            return JsonResponse({"error": "Email and password must be strings"}, status=400)
+        if not email or not password:
+            return JsonResponse({"error": "Invalid credentials"}, status=401)
+
+        user = await sync_to_async(_get_login_user)(email)
+        loop = asyncio.get_running_loop()
+        valid = await loop.run_in_executor(
+            PASSWORD_HASH_POOL, _check_password, user, password
+        )
+        if not valid:
+            logger.warning(f"Failed login attempt for email: {email}")
+            return JsonResponse({"error": "Invalid credentials"}, status=401)
+
+        refresh, access = await sync_to_async(_issue_tokens)(user)
+        last_login.record(user.pk)
+        logger.info(f"User logged in: {email}")
+        return JsonResponse(
+            {
+                "refresh": refresh,
+                "access": access,
+                "message": "Login successful",
+                "onboarding_required": not user.onboarding_completed,
+            }
+        )
+
+
 class CustomGoogleOAuth2Adapter(GoogleOAuth2Adapter):
     def complete_login(self, request, app, token, **kwargs):
         try:
@@ -142,7 +215,7 @@ class GoogleAuth(SocialLoginView):
     def post(self, request, *args, **kwargs):
         try:
             provider = self.adapter_class(request).get_provider()
-            app = SocialApp.objects.get(provider=provider.id)
+            app = google.get_social_app(provider.id)
 
             client = self.client_class(
                 request,
@@ -213,7 +286,7 @@ class LogoutView(APIView):
         
         try:
             refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
+            token = CachedBlacklistRefreshToken(refresh_token)
             token.blacklist()
             logger.info(f"User logged out: {request.user.email}")
             response = Response(
@@ -233,6 +306,10 @@ class LogoutView(APIView):
             return response
 
 
+class CachedTokenRefreshView(TokenRefreshView):
+    serializer_class = CachedTokenRefreshSerializer
+
+
 class AuthStatusView(APIView):
     permission_classes = [AllowAny]
 
@@ -264,24 +341,14 @@ def google_callback(request):
 
         adapter = GoogleOAuth2Adapter(request)
         provider = adapter.get_provider()
-        app = SocialApp.objects.get(provider=provider.id)
+        app = google.get_social_app(provider.id)
 
         callback_url = f"{settings.FRONTEND_URL}/api/auth/google/callback"
 
-        client = OAuth2Client(
-            request,
-            app.client_id,
-            app.secret,
-            adapter.access_token_method,
-            adapter.access_token_url,
-            callback_url,
-        )
-
-        token = client.get_access_token(code)
-        logger.info(f"Received token: {token}")
+        token = google.exchange_code(adapter.access_token_url, app, code, callback_url)
 
         id_token = token.get("id_token")
-        decoded_token = jwt.decode(id_token, options={"verify_signature": False})
+        decoded_token = google.verify_id_token(id_token, app.client_id)
 
         email = decoded_token["email"]
 
@@ -386,6 +453,22 @@ def google_callback(request):
         return JsonResponse(
             {"success": False, "error": "Invalid JSON in request"}, status=400
         )
+    except jwt.PyJWKClientConnectionError as e:
+        logger.error(f"Could not fetch Google's signing keys: {str(e)}")
+        return JsonResponse(
+            {"success": False, "error": "Could not verify the Google ID token, try again"},
+            status=502,
+        )
+    except jwt.PyJWKClientError as e:
+        logger.warning(f"Google ID token signed with an unknown key: {str(e)}")
+        return JsonResponse(
+            {"success": False, "error": "Invalid Google ID token"}, status=400
+        )
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Rejected Google ID token: {str(e)}")
+        return JsonResponse(
+            {"success": False, "error": "Invalid Google ID token"}, status=400
+        )
     except SocialApp.DoesNotExist:
         logger.error("Google SocialApp does not exist")
         return JsonResponse(
@@ -1,12 +1,39 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Prefetch, Q
+from django.utils.functional import cached_property
 from django.utils.html import format_html
 from .models import UserProfile, Query, CustomUser, MusicServiceConnection
 
 User = get_user_model()
 
 
+class EstimatedCountPaginator(Paginator):
+    """
+    On PostgreSQL, unfiltered changelists use the planner's row estimate instead
+    of COUNT(*), which scans the whole table.
+    """
+
+    ESTIMATE_THRESHOLD = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
 class profileInline(admin.StackedInline):
     model = UserProfile
     can_delete = False
@@ -83,23 +110,68 @@ class CustomUserAdmin(UserAdmin):
             },
         ),
     )
-    search_fields = ("email", "profile__username")
+    search_fields = ("^email", "^profile__username")
+    search_help_text = (
+        "Matches the start of the email or username. If nothing starts with the "
+        "term, falls back to a slower substring search (e.g. gmail.com)."
+    )
     ordering = ("email",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("profile")
+            .prefetch_related(
+                Prefetch(
+                    "music_service_connections",
+                    queryset=MusicServiceConnection.objects.filter(
+                        is_connected=True
+                    ).only("user_id", "service_name"),
+                    to_attr="connected_services",
+                )
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Full addresses hit the UPPER(email) index instead of a prefix scan;
+        # partial ones ("john@exam", "@gmail.com") fall through to the usual search.
+        term = search_term.strip()
+        if "@" in term and " " not in term:
+            exact = queryset.filter(email__iexact=term)
+            if exact.exists():
+                return exact, False
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if not term or results.exists():
+            return results, may_have_duplicates
+        # Prefix searches are indexed; substrings ("gmail.com") need a scan, so
+        # they only run when the prefix search found nothing.
+        return (
+            queryset.filter(Q(email__icontains=term) | Q(profile__username__icontains=term)),
+            False,
+        )
 
     def get_username(self, obj):
-        return obj.profile.username
+        profile = getattr(obj, "profile", None)
+        return profile.username if profile else None
 
     get_username.short_description = "Username"
     get_username.admin_order_field = "profile__username"
 
     def get_user_type(self, obj):
-        return obj.profile.user_type
+        profile = getattr(obj, "profile", None)
+        return profile.user_type if profile else None
 
     get_user_type.short_description = "User Type"
     get_user_type.admin_order_field = "profile__user_type"
 
     def get_connected_services(self, obj):
-        return ", ".join([conn.service_name for conn in obj.music_service_connections.filter(is_connected=True)])
+        connections = getattr(obj, "connected_services", None)
+        if connections is None:
+            connections = obj.music_service_connections.filter(is_connected=True)
+        return ", ".join([conn.service_name for conn in connections])
     get_connected_services.short_description = 'Connected Services'
 
 
@@ -0,0 +1,136 @@
+"""
+Chunked, resumable backfills for management commands.
+
+A backfill walks the primary-key range of `source_model` in fixed-size chunks.
+Each chunk's rows are built by `build_rows(start, end)` and written with
+bulk_create(ignore_conflicts=True) inside a transaction, so re-running a chunk
+is harmless. Progress is checkpointed as the highest pk below which every chunk
+has finished; a rerun resumes from there unless --restart is given.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from .models import BackfillCheckpoint
+
+
+class BackfillCommand(BaseCommand, ABC):
+    source_model = None
+    target_model = None
+    checkpoint_name = None
+
+    @abstractmethod
+    def build_rows(self, start, end):
+        """Return unsaved target_model instances for source pks in [start, end)."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--parallel",
+            type=int,
+            default=1,
+            help="Number of workers processing disjoint key ranges concurrently",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the saved checkpoint and start from the lowest key",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        bounds = self.source_model.objects.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            self.stdout.write("Nothing to backfill")
+            return
+
+        checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=self.checkpoint_name)
+        start = bounds["low"]
+        if not options["restart"] and checkpoint.position is not None:
+            start = max(start, checkpoint.position)
+            self.stdout.write(f"Resuming {self.checkpoint_name} from pk {start}")
+
+        chunks = list(range(start, bounds["high"] + 1, chunk_size))
+        self.written = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.done = set()
+        self.next_index = 0
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+
+        if options["parallel"] > 1:
+            with ThreadPoolExecutor(max_workers=options["parallel"]) as executor:
+                futures = [
+                    executor.submit(self.run_worker, index, options["parallel"])
+                    for index in range(options["parallel"])
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            self.run_worker(0, 1)
+
+        checkpoint.position = bounds["high"] + 1
+        checkpoint.save(update_fields=["position", "updated_at"])
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{self.checkpoint_name}: wrote {self.written} rows in {elapsed:.1f}s "
+                f"({self.written / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+
+    def run_worker(self, worker, workers):
+        # Each worker owns a contiguous, disjoint slice of the chunk list.
+        per_worker = -(-len(self.chunks) // workers)
+        indexes = range(worker * per_worker, min((worker + 1) * per_worker, len(self.chunks)))
+        try:
+            for index in indexes:
+                self.run_chunk(index)
+        finally:
+            if workers > 1:
+                connection.close()
+
+    def run_chunk(self, index):
+        start = self.chunks[index]
+        end = start + self.chunk_size
+        with transaction.atomic():
+            rows = self.build_rows(start, end)
+            if rows:
+                self.target_model.objects.bulk_create(rows, ignore_conflicts=True)
+
+        with self.lock:
+            self.written += len(rows)
+            self.done.add(index)
+            self.advance_checkpoint()
+            elapsed = time.monotonic() - self.started
+            rate = self.written / elapsed if elapsed else 0
+            if self.verbosity > 1 or len(self.done) % 10 == 0:
+                self.stdout.write(
+                    f"{len(self.done)}/{len(self.chunks)} chunks, "
+                    f"{self.written} rows, {rate:.0f} rows/s"
+                )
+
+    def advance_checkpoint(self):
+        # Only move past chunks that are finished and contiguous from the start.
+        advanced = False
+        while self.next_index in self.done:
+            self.next_index += 1
+            advanced = True
+        if advanced:
+            self.checkpoint.position = (
+                self.chunks[self.next_index]
+                if self.next_index < len(self.chunks)
+                else self.chunks[-1] + self.chunk_size
+            )
+            self.checkpoint.save(update_fields=["position", "updated_at"])
+
+    def execute(self, *args, **options):
+        self.verbosity = options.get("verbosity", 1)
+        return super().execute(*args, **options)
@@ -0,0 +1,139 @@
+"""
+Helpers shared by the benchmark management commands: a small closed-loop load
+generator, latency/query-count summaries and JSON result files that later runs
+can be compared against.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@dataclass
+class Sample:
+    latency_ms: float
+    ok: bool
+    queries: int
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(fn, total, concurrency):
+    """
+    Call fn(worker_index) `total` times from `concurrency` threads and return
+    (samples, elapsed_seconds). fn returns True for a successful call.
+    """
+    samples = []
+    lock = threading.Lock()
+    remaining = [total]
+
+    def worker(index):
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    try:
+                        ok = bool(fn(index))
+                    except Exception:
+                        ok = False
+                    latency_ms = (time.perf_counter() - start) * 1000
+                with lock:
+                    samples.append(Sample(latency_ms, ok, len(queries.captured_queries)))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(sample.latency_ms for sample in samples)
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": sum(1 for sample in samples if not sample.ok),
+        "throughput_rps": round(count / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 3) if latencies else None,
+        "queries_per_request": (
+            round(sum(sample.queries for sample in samples) / count, 2) if count else None
+        ),
+    }
+
+
+def save_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, max_regression):
+    """
+    Return human-readable regressions where p95 latency grew, or throughput
+    shrank, by more than `max_regression` (a fraction) against the baseline.
+    """
+    regressions = []
+    for name, current in results.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if previous.get("p95_ms") and current.get("p95_ms"):
+            growth = current["p95_ms"] / previous["p95_ms"] - 1
+            if growth > max_regression:
+                regressions.append(
+                    f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms (+{growth:.0%})"
+                )
+        if previous.get("throughput_rps") and current.get("throughput_rps"):
+            drop = 1 - current["throughput_rps"] / previous["throughput_rps"]
+            if drop > max_regression:
+                regressions.append(
+                    f"{name}: throughput {previous['throughput_rps']} -> "
+                    f"{current['throughput_rps']} rps (-{drop:.0%})"
+                )
+        if (
+            previous.get("queries_per_request") is not None
+            and current.get("queries_per_request") is not None
+            and current["queries_per_request"] > previous["queries_per_request"]
+        ):
+            regressions.append(
+                f"{name}: queries/request {previous['queries_per_request']} -> "
+                f"{current['queries_per_request']}"
+            )
+    return regressions
+
+
+def format_table(results):
+    columns = ["requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"]
+    width = max([len(name) for name in results["scenarios"]] + [8])
+    lines = [f"{'scenario':<{width}}  " + "  ".join(f"{c:>19}" for c in columns)]
+    for name, row in results["scenarios"].items():
+        lines.append(
+            f"{name:<{width}}  " + "  ".join(f"{str(row.get(c)):>19}" for c in columns)
+        )
+    return "\n".join(lines)
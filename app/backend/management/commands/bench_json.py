@@ -0,0 +1,88 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+import fastjson
+from api.spotify.stub import make_track
+from backend import bench
+
+
+def playlist_tracks(size):
+    return {
+        "href": "https://api.spotify.com/v1/playlists/bench/tracks",
+        "items": [
+            {"added_at": "2024-01-01T00:00:00Z", "is_local": False, "track": make_track(n)}
+            for n in range(size)
+        ],
+        "limit": size,
+        "next": None,
+        "offset": 0,
+        "previous": None,
+        "total": size,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures JSON encode/decode time of playlist documents with the standard "
+        "library and DRF's JSONRenderer against the fastjson layer. Reports which "
+        "backend fastjson is using; without orjson installed the two sides match."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,1000,5000")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--output", default="")
+
+    def timed(self, fn, iterations):
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        return round(bench.percentile(times, 50), 3)
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        stdlib_renderer = JSONRenderer()
+        fast_renderer = fastjson.FastJSONRenderer()
+        results = {"backend": "orjson" if fastjson.orjson else "json", "sizes": {}}
+
+        for size in [int(size) for size in options["sizes"].split(",")]:
+            document = playlist_tracks(size)
+            body = json.dumps(document).encode()
+            timings = {
+                "decode": (
+                    self.timed(lambda: json.loads(body), iterations),
+                    self.timed(lambda: fastjson.loads(body), iterations),
+                ),
+                "encode": (
+                    self.timed(lambda: json.dumps(document).encode(), iterations),
+                    self.timed(lambda: fastjson.dumps(document), iterations),
+                ),
+                "render": (
+                    self.timed(lambda: stdlib_renderer.render(document), iterations),
+                    self.timed(lambda: fast_renderer.render(document), iterations),
+                ),
+            }
+            summary = {"bytes": len(body)}
+            for step, (stdlib_ms, fast_ms) in timings.items():
+                summary[step] = {
+                    "stdlib_ms_p50": stdlib_ms,
+                    "fast_ms_p50": fast_ms,
+                    "saved_ms": round(stdlib_ms - fast_ms, 3),
+                    "speedup": round(stdlib_ms / fast_ms, 1) if fast_ms else None,
+                }
+            # One proxied request decodes Spotify's body and renders the reply.
+            summary["saved_ms_per_request"] = round(
+                summary["decode"]["saved_ms"] + summary["render"]["saved_ms"], 3
+            )
+            results["sizes"][size] = summary
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
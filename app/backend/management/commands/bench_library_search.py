@@ -0,0 +1,90 @@
+import json
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import library_search
+from backend import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds a library search index over a synthetic library and measures "
+        "exact, prefix and fuzzy query latency. Touches neither the database "
+        "nor Spotify."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--playlists", type=int, default=200)
+        parser.add_argument("--tracks-per-playlist", type=int, default=100)
+        parser.add_argument("--queries", type=int, default=1000)
+        parser.add_argument("--output", default="")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        vocabulary = [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+            for _ in range(5000)
+        ]
+        artists = [{"name": " ".join(rng.sample(vocabulary, 2))} for _ in range(2000)]
+
+        index = library_search.LibraryIndex()
+        start = time.perf_counter()
+        song_id = 0
+        for playlist_id in range(options["playlists"]):
+            index.add_playlist(playlist_id, f"playlist{playlist_id}", " ".join(rng.sample(vocabulary, 2)))
+            for _ in range(options["tracks_per_playlist"]):
+                # Roughly a third of the tracks turn up in more than one playlist.
+                if song_id and rng.random() < 0.3:
+                    existing = rng.randrange(song_id)
+                    index.add_song(playlist_id, existing, f"track{existing}", "", [])
+                    continue
+                index.add_song(
+                    playlist_id,
+                    song_id,
+                    f"track{song_id}",
+                    " ".join(rng.sample(vocabulary, rng.randint(1, 4))),
+                    rng.sample(artists, rng.randint(1, 2)),
+                )
+                song_id += 1
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def typo(word):
+            position = rng.randrange(len(word))
+            return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+        kinds = {
+            "exact": lambda word, other: f"{word} {other}",
+            "prefix": lambda word, other: f"{other} {word[:3]}",
+            "fuzzy": lambda word, other: typo(word) if len(word) >= library_search.FUZZY_MIN_LENGTH else word,
+        }
+        timings = {}
+        for kind, make_query in kinds.items():
+            times = []
+            for _ in range(options["queries"]):
+                title = index.docs[("song", rng.randrange(song_id))]["title"].split()
+                query = make_query(rng.choice(title), rng.choice(title))
+                start = time.perf_counter()
+                index.search(query, 20)
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            timings[kind] = {
+                "p50": round(bench.percentile(times, 50), 3),
+                "p95": round(bench.percentile(times, 95), 3),
+                "p99": round(bench.percentile(times, 99), 3),
+            }
+
+        results = {
+            "playlists": options["playlists"],
+            "songs": len(index.song_playlists),
+            "tokens": len(index.tokens),
+            "build_ms": round(build_ms, 1),
+            "query_ms": timings,
+        }
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
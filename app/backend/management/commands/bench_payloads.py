@@ -0,0 +1,93 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.spotify import compression, projection
+from api.spotify.stub import make_playlist, make_track
+from backend import bench
+
+
+def documents(page_size):
+    return {
+        "playlist_tracks": {
+            "href": "https://api.spotify.com/v1/playlists/bench/tracks",
+            "items": [
+                {"added_at": "2024-01-01T00:00:00Z", "is_local": False, "track": make_track(n)}
+                for n in range(page_size)
+            ],
+            "limit": page_size,
+            "next": None,
+            "offset": 0,
+            "previous": None,
+            "total": page_size,
+        },
+        "playlists": {
+            "href": "https://api.spotify.com/v1/users/bench/playlists",
+            "items": [make_playlist("bench", n, 100) for n in range(50)],
+            "limit": 50,
+            "next": None,
+            "offset": 0,
+            "previous": None,
+            "total": 50,
+        },
+        "recommendations": {
+            "tracks": [make_track(n) for n in range(page_size)],
+            "seeds": [{"id": "pop", "type": "GENRE", "initialPoolSize": 250}],
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures response size and encoding time of proxied Spotify documents, "
+        "full and with the compact field preset, uncompressed and with each "
+        "available compression. Touches neither the database nor Spotify."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--output", default="")
+
+    def timed(self, fn, iterations):
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = fn()
+            times.append((time.perf_counter() - start) * 1000)
+        times.sort()
+        return result, round(bench.percentile(times, 50), 3)
+
+    def handle(self, *args, **options):
+        codings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+        results = {"page_size": options["page_size"], "codings": codings, "documents": {}}
+
+        for kind, document in documents(options["page_size"]).items():
+            tree = projection.parse(projection.PRESETS[kind])
+            modes = {
+                "full": lambda: json.dumps(document).encode(),
+                "compact": lambda: json.dumps(projection.project(document, tree)).encode(),
+            }
+            summary = {}
+            for mode, encode in modes.items():
+                body, encode_ms = self.timed(encode, options["iterations"])
+                entry = {"bytes": len(body), "encode_ms_p50": encode_ms}
+                for coding in codings:
+                    compressed, compress_ms = self.timed(
+                        lambda: compression.compress(body, coding), options["iterations"]
+                    )
+                    entry[coding] = {"bytes": len(compressed), "compress_ms_p50": compress_ms}
+                summary[mode] = entry
+            full = summary["full"]
+            smallest = min(
+                [summary["compact"]["bytes"]]
+                + [summary["compact"][coding]["bytes"] for coding in codings]
+            )
+            summary["reduction"] = round(full["bytes"] / smallest, 1)
+            results["documents"][kind] = summary
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
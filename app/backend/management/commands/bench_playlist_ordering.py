@@ -0,0 +1,142 @@
+import json
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from api import ordering
+from api.models import Playlist, PlaylistSong, Song
+from backend import bench
+from backend.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares single-track inserts, moves and ordered page reads on a large "
+        "playlist under dense PlaylistSong.order numbering versus the sparse "
+        "scheme in api.ordering. Runs inside a rolled back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tracks", type=int, default=10000)
+        parser.add_argument("--ops", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--output", default="")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        size = options["tracks"]
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(
+                email=f"bench-{uuid.uuid4().hex}@audafact.local", password="bench-password"
+            )
+            tag = uuid.uuid4().hex[:6]
+            Song.objects.bulk_create(
+                [
+                    Song(
+                        title=f"Bench Song {n}",
+                        artists=[],
+                        spotify_id=f"bench{tag}{n:012d}",
+                        isrc=f"B{tag[:3]}{n:08d}",
+                        image="",
+                    )
+                    for n in range(size + options["ops"])
+                ]
+            )
+            songs = list(Song.objects.filter(spotify_id__startswith=f"bench{tag}").order_by("pk"))
+            initial, extra = songs[:size], songs[size:]
+
+            playlists = {}
+            for scheme, order_for in (
+                ("dense", lambda position: position),
+                ("sparse", ordering.order_for_position),
+            ):
+                playlist = Playlist.objects.create(
+                    name=f"Bench {scheme}", spotify_id=f"bench-{scheme}-{tag}", user=user, snapshot_id=""
+                )
+                PlaylistSong.objects.bulk_create(
+                    [
+                        PlaylistSong(playlist=playlist, song=song, order=order_for(position))
+                        for position, song in enumerate(initial)
+                    ],
+                    batch_size=1000,
+                )
+                playlists[scheme] = playlist
+
+            results = {"tracks": size, "ops": options["ops"]}
+            for scheme, playlist in playlists.items():
+                results[scheme] = self.run_scheme(scheme, playlist, extra, rng, options)
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_scheme(self, scheme, playlist, extra, rng, options):
+        rng = random.Random(rng.random())
+        insert_times, move_times, read_times = [], [], []
+        rows_touched = {"insert": 0, "move": 0}
+        count = PlaylistSong.objects.filter(playlist=playlist).count()
+
+        for song in extra:
+            index = rng.randrange(count + 1)
+            start = time.perf_counter()
+            if scheme == "dense":
+                shifted = PlaylistSong.objects.filter(playlist=playlist, order__gte=index).update(
+                    order=F("order") + 1
+                )
+                PlaylistSong.objects.create(playlist=playlist, song=song, order=index)
+                rows_touched["insert"] += shifted + 1
+            else:
+                ordering.add_song(playlist, song, index)
+                rows_touched["insert"] += 1
+            insert_times.append((time.perf_counter() - start) * 1000)
+            count += 1
+
+        for _ in range(options["ops"]):
+            source, target = rng.randrange(count), rng.randrange(count)
+            start = time.perf_counter()
+            row = PlaylistSong.objects.filter(playlist=playlist).order_by("order", "id")[source]
+            if scheme == "dense":
+                if target > source:
+                    shifted = PlaylistSong.objects.filter(
+                        playlist=playlist, order__gt=source, order__lte=target
+                    ).update(order=F("order") - 1)
+                else:
+                    shifted = PlaylistSong.objects.filter(
+                        playlist=playlist, order__gte=target, order__lt=source
+                    ).update(order=F("order") + 1)
+                row.order = target
+                row.save(update_fields=["order"])
+                rows_touched["move"] += shifted + 1
+            else:
+                ordering.move(row, target)
+                rows_touched["move"] += 1
+            move_times.append((time.perf_counter() - start) * 1000)
+
+        page = options["page_size"]
+        for _ in range(options["ops"]):
+            offset = rng.randrange(max(count - page, 1))
+            start = time.perf_counter()
+            list(
+                PlaylistSong.objects.filter(playlist=playlist)
+                .order_by("order")
+                .values_list("song_id", flat=True)[offset:offset + page]
+            )
+            read_times.append((time.perf_counter() - start) * 1000)
+
+        summary = {}
+        for name, times in (("insert", insert_times), ("move", move_times), ("read_page", read_times)):
+            times.sort()
+            summary[f"{name}_ms"] = {
+                "p50": round(bench.percentile(times, 50), 3),
+                "p95": round(bench.percentile(times, 95), 3),
+            }
+        summary["avg_rows_written"] = {
+            name: round(total / options["ops"], 1) for name, total in rows_touched.items()
+        }
+        return summary
@@ -0,0 +1,117 @@
+import json
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.spotify.stub import make_track
+from backend import bench, tracks
+from backend.models import CustomUser, Query
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares storage size and read time of saved query recommendations "
+        "stored inline as track objects versus compact track ids plus shared "
+        "Track records. Runs inside a rolled back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--tracks-per-query", type=int, default=20)
+        parser.add_argument("--track-pool", type=int, default=5000)
+        parser.add_argument("--reads", type=int, default=200)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--output", default="")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        pool = [make_track(n) for n in range(options["track_pool"])]
+        recommendations = [
+            rng.sample(pool, options["tracks_per_query"]) for _ in range(options["queries"])
+        ]
+        unique_tracks = {t["id"]: t for rec in recommendations for t in rec}
+
+        inline_bytes = sum(len(json.dumps(rec)) for rec in recommendations)
+        compact_bytes = sum(len(json.dumps([t["id"] for t in rec])) for rec in recommendations)
+        shared_bytes = sum(len(json.dumps(t)) for t in unique_tracks.values())
+
+        with transaction.atomic():
+            user = CustomUser.objects.create_user(
+                email=f"bench-storage-{uuid.uuid4().hex[:8]}@audafact.local"
+            )
+            # The old layout is emulated with an equally wide JSON column.
+            inline_ids = [
+                q.pk
+                for q in Query.objects.bulk_create(
+                    Query(user=user, name="inline", parameters={"recommendations": rec})
+                    for rec in recommendations
+                )
+            ]
+            tracks.save_tracks(unique_tracks.values())
+            compact_ids = [
+                q.pk
+                for q in Query.objects.bulk_create(
+                    Query(user=user, name="compact", parameters={}, track_ids=[t["id"] for t in rec])
+                    for rec in recommendations
+                )
+            ]
+
+            inline_times = []
+            compact_times = []
+            page = options["page_size"]
+            for _ in range(options["reads"]):
+                offset = rng.randrange(0, max(len(inline_ids) - page, 1))
+
+                start = time.perf_counter()
+                list(
+                    Query.objects.filter(pk__in=inline_ids[offset:offset + page]).values_list(
+                        "parameters", flat=True
+                    )
+                )
+                inline_times.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                rows = Query.objects.filter(pk__in=compact_ids[offset:offset + page]).values_list(
+                    "track_ids", flat=True
+                )
+                for track_ids in rows:
+                    tracks.hydrate(track_ids, fetch=False)
+                compact_times.append((time.perf_counter() - start) * 1000)
+
+            transaction.set_rollback(True)
+
+        cache.delete_many([f"{tracks.CACHE_PREFIX}{track_id}" for track_id in unique_tracks])
+        tracks.local_cache.clear()
+
+        inline_times.sort()
+        compact_times.sort()
+        results = {
+            "queries": options["queries"],
+            "tracks_per_query": options["tracks_per_query"],
+            "unique_tracks": len(unique_tracks),
+            "storage_bytes": {
+                "inline": inline_bytes,
+                "compact_ids": compact_bytes,
+                "shared_tracks": shared_bytes,
+                "compact_total": compact_bytes + shared_bytes,
+            },
+            "read_page_ms": {
+                "inline": {
+                    "p50": round(bench.percentile(inline_times, 50), 3),
+                    "p95": round(bench.percentile(inline_times, 95), 3),
+                },
+                "compact_hydrated": {
+                    "p50": round(bench.percentile(compact_times, 50), 3),
+                    "p95": round(bench.percentile(compact_times, 95), 3),
+                },
+            },
+        }
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
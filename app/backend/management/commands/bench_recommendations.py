@@ -0,0 +1,70 @@
+import json
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api import audio_features
+from backend import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the local recommendation engine (min/max filtering plus weighted "
+        "ranking) over a synthetic feature matrix. Touches neither the database "
+        "nor Spotify."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=300000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=100)
+        parser.add_argument("--output", default="")
+
+    def random_params(self, rng):
+        params = {}
+        for name in rng.sample(audio_features.FEATURES, rng.randint(1, 5)):
+            start, end = audio_features.RANGES[name]
+            low, high = sorted(rng.uniform(start, end) for _ in range(2))
+            params[f"min_{name}"] = low
+            params[f"max_{name}"] = max(high, low + (end - start) * 0.3)
+            params[f"target_{name}"] = (low + high) / 2
+        return params
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        generator = np.random.default_rng(0)
+        low = np.array([audio_features.RANGES[name][0] for name in audio_features.FEATURES])
+        high = np.array([audio_features.RANGES[name][1] for name in audio_features.FEATURES])
+        matrix = np.asfortranarray(
+            low + generator.random((options["rows"], len(audio_features.FEATURES))) * (high - low),
+            dtype=np.float32,
+        )
+
+        times = []
+        returned = 0
+        for _ in range(options["queries"]):
+            constraints = audio_features.parse_params(self.random_params(rng))
+            start = time.perf_counter()
+            rows = audio_features.rank(matrix, constraints, options["limit"])
+            times.append((time.perf_counter() - start) * 1000)
+            returned += len(rows)
+
+        times.sort()
+        results = {
+            "rows": options["rows"],
+            "queries": options["queries"],
+            "limit": options["limit"],
+            "avg_returned": round(returned / options["queries"], 1),
+            "rank_ms": {
+                "p50": round(bench.percentile(times, 50), 3),
+                "p95": round(bench.percentile(times, 95), 3),
+                "max": round(times[-1], 3),
+            },
+        }
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,93 @@
+import json
+import random
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api import audio_features, similar
+from backend import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the similar-tracks IVF index over synthetic audio features in a "
+        "temporary directory and compares its recall and latency with brute-force "
+        "search. Touches neither the database nor Spotify."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=200000)
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument("--k", type=int, default=20)
+        parser.add_argument("--nprobe", type=int, default=similar.NPROBE)
+        parser.add_argument("--output", default="")
+
+    def handle(self, *args, **options):
+        generator = np.random.default_rng(0)
+        features = len(audio_features.FEATURES)
+        low = np.array([audio_features.RANGES[name][0] for name in audio_features.FEATURES])
+        high = np.array([audio_features.RANGES[name][1] for name in audio_features.FEATURES])
+        # Clustered rather than uniform data, closer to how real catalogues look.
+        centers = generator.random((64, features))
+        raw = centers[generator.integers(0, 64, options["rows"])]
+        raw = np.clip(raw + generator.normal(0, 0.08, raw.shape), 0, 1)
+        matrix = (low + raw * (high - low)).astype(np.float32)
+        ids = [f"benchtrack{n:012d}" for n in range(options["rows"])]
+        vectors = similar.embed(matrix)
+
+        similar.NPROBE = options["nprobe"]
+        with tempfile.TemporaryDirectory() as path:
+            index = similar.SimilarIndex(path)
+            start = time.perf_counter()
+            index.save(*similar.build(ids, vectors))
+            build_seconds = time.perf_counter() - start
+            index.load()
+
+            all_ids = np.asarray(ids, dtype="S")
+            rng = random.Random(0)
+            ann_times, brute_times, recalls = [], [], []
+            for _ in range(options["queries"]):
+                row = rng.randrange(options["rows"])
+                query = vectors[row]
+
+                start = time.perf_counter()
+                found = index.search(query, options["k"], exclude=ids[row])
+                ann_times.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                expected = similar.top_k(all_ids, vectors, query, options["k"], exclude=all_ids[row])
+                brute_times.append((time.perf_counter() - start) * 1000)
+
+                expected_ids = {spotify_id for spotify_id, _ in expected}
+                recalls.append(
+                    len(expected_ids & {spotify_id for spotify_id, _ in found}) / len(expected_ids)
+                )
+
+        ann_times.sort()
+        brute_times.sort()
+        results = {
+            "rows": options["rows"],
+            "queries": options["queries"],
+            "k": options["k"],
+            "clusters": int(np.sqrt(options["rows"])),
+            "nprobe": options["nprobe"],
+            "build_seconds": round(build_seconds, 2),
+            "recall_at_k": round(sum(recalls) / len(recalls), 4),
+            "query_ms": {
+                "ann": {
+                    "p50": round(bench.percentile(ann_times, 50), 3),
+                    "p95": round(bench.percentile(ann_times, 95), 3),
+                },
+                "brute_force": {
+                    "p50": round(bench.percentile(brute_times, 50), 3),
+                    "p95": round(bench.percentile(brute_times, 95), 3),
+                },
+            },
+        }
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options["output"]:
+            bench.save_results(results, options["output"])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,209 @@
+import json
+import os
+from urllib.parse import urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.spotify import upstream
+from api.spotify.stub import StubConfig, start_in_thread
+from backend import bench
+from backend.models import CustomUser, MusicServiceConnection, Query, hash_parameters
+
+BENCH_EMAIL = "bench@audafact.local"
+BENCH_PASSWORD = "bench-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the Spotify proxy, saved query and auth endpoints at a target "
+        "concurrency against the local Spotify stub and reports throughput, "
+        "latency percentiles and queries per request. Runs in a throwaway test "
+        "database unless --use-existing-db is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--scenarios", default="", help="Comma separated subset to run")
+        parser.add_argument("--queries", type=int, default=50, help="Saved queries to seed for the bench user")
+        parser.add_argument("--output", default="")
+        parser.add_argument("--compare", default="", help="Baseline results file to compare against")
+        parser.add_argument("--max-regression", type=float, default=0.2)
+        parser.add_argument(
+            "--start-stub",
+            action="store_true",
+            help="Start the Spotify stub in-process on the host/port of SPOTIFY_API_URL",
+        )
+        parser.add_argument("--stub-latency-ms", type=float, default=0)
+        parser.add_argument("--stub-error-rate", type=float, default=0.0)
+        parser.add_argument("--stub-rate-limit-rate", type=float, default=0.0)
+        parser.add_argument(
+            "--use-existing-db",
+            action="store_true",
+            help="Run against the configured database instead of a throwaway test "
+            "database; the bench user and its rows are deleted afterwards",
+        )
+
+    def handle(self, *args, **options):
+        if "api.spotify.com" in upstream.SPOTIFY_API_URL:
+            raise CommandError(
+                "SPOTIFY_API_URL points at the real Spotify API; set it (and "
+                "SPOTIFY_ACCOUNTS_URL) to the local stub before benchmarking"
+            )
+
+        server = None
+        if options["start_stub"]:
+            parsed = urlparse(upstream.SPOTIFY_API_URL)
+            server = start_in_thread(
+                parsed.hostname,
+                parsed.port or 80,
+                StubConfig(
+                    latency_ms=options["stub_latency_ms"],
+                    error_rate=options["stub_error_rate"],
+                    rate_limit_rate=options["stub_rate_limit_rate"],
+                ),
+            )
+
+        setup_test_environment()
+        old_name = None
+        if not options["use_existing_db"]:
+            old_name = connection.settings_dict["NAME"]
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = self.run_scenarios(options)
+        finally:
+            if old_name is None:
+                # Cascades to the connection, saved queries and playlists.
+                CustomUser.objects.filter(email=BENCH_EMAIL).delete()
+            else:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            if server:
+                server.shutdown()
+
+        self.stdout.write(bench.format_table(results))
+
+        output = options["output"] or os.path.join(
+            "bench_results", f"bench_spotify-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        bench.save_results(results, output)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options["compare"]:
+            regressions = bench.compare(
+                results, bench.load_results(options["compare"]), options["max_regression"]
+            )
+            if regressions:
+                raise CommandError("Regressions found:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def setup_user(self, seeded_queries):
+        user, created = CustomUser.objects.get_or_create(email=BENCH_EMAIL)
+        if created or not user.check_password(BENCH_PASSWORD):
+            user.set_password(BENCH_PASSWORD)
+            user.save()
+        MusicServiceConnection.objects.update_or_create(
+            user=user,
+            service_name="spotify",
+            defaults={
+                "is_connected": True,
+                "last_connected": timezone.now(),
+                "service_user_id": "stubuser",
+                "access_token": "stub-access",
+                "refresh_token": "stub-refresh",
+                "token_expires_at": timezone.now() + timezone.timedelta(hours=1),
+            },
+        )
+        missing = seeded_queries - Query.objects.filter(user=user).count()
+        if missing > 0:
+            parameters = {"seed_genres": "pop", "limit": 20}
+            # bulk_create skips save(), which is what fills in the hash.
+            Query.objects.bulk_create(
+                Query(
+                    user=user,
+                    name=f"Bench query {i}",
+                    parameters=parameters,
+                    parameters_hash=hash_parameters(parameters),
+                )
+                for i in range(missing)
+            )
+        return user
+
+    def build_scenarios(self, user, options):
+        access = str(RefreshToken.for_user(user).access_token)
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {access}"}
+        refresh_pool = [str(RefreshToken.for_user(user)) for _ in range(options["requests"])]
+        query_body = json.dumps(
+            {"name": "Bench saved query", "parameters": {"seed_genres": "rock"}}
+        )
+
+        def refresh(client):
+            try:
+                token = refresh_pool.pop()
+            except IndexError:
+                token = str(RefreshToken.for_user(user))
+            return client.post(
+                "/api/auth/token/refresh/", {"refresh": token}, content_type="application/json"
+            ).status_code == 200
+
+        return {
+            "auth_login": lambda client: client.post(
+                "/api/auth/login/",
+                {"email": BENCH_EMAIL, "password": BENCH_PASSWORD},
+                content_type="application/json",
+            ).status_code == 200,
+            "auth_token_login": lambda client: client.post(
+                "/api/auth/login/token/",
+                {"email": BENCH_EMAIL, "password": BENCH_PASSWORD},
+                content_type="application/json",
+            ).status_code == 200,
+            "auth_session_login": lambda client: client.post(
+                "/api/auth/login/",
+                {"email": BENCH_EMAIL, "password": BENCH_PASSWORD, "session": True},
+                content_type="application/json",
+            ).status_code == 200,
+            "auth_status": lambda client: client.get("/api/auth/status/", **auth).status_code == 200,
+            "token_refresh": refresh,
+            "playlists": lambda client: client.get("/api/spotify/playlists/", **auth).status_code == 200,
+            "playlist_tracks": lambda client: client.get(
+                "/api/spotify/playlists/stubplaylist0000000000/", **auth
+            ).status_code == 200,
+            "recommendations": lambda client: client.get(
+                "/api/spotify/recommendations/", {"seed_genres": "pop", "limit": 20}, **auth
+            ).status_code == 200,
+            "queries_list": lambda client: client.get("/api/spotify/queries/", **auth).status_code == 200,
+            "queries_create": lambda client: client.post(
+                "/api/spotify/queries/", query_body, content_type="application/json", **auth
+            ).status_code == 201,
+        }
+
+    def run_scenarios(self, options):
+        user = self.setup_user(options["queries"])
+        scenarios = self.build_scenarios(user, options)
+        selected = [s for s in options["scenarios"].split(",") if s] or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        clients = [Client() for _ in range(options["concurrency"])]
+        results = {
+            "started_at": timezone.now().isoformat(),
+            "concurrency": options["concurrency"],
+            "requests_per_scenario": options["requests"],
+            "scenarios": {},
+        }
+        for name in selected:
+            scenario = scenarios[name]
+            samples, elapsed = bench.run_load(
+                lambda index: scenario(clients[index]),
+                options["requests"],
+                options["concurrency"],
+            )
+            results["scenarios"][name] = bench.summarize(samples, elapsed)
+            self.stdout.write(f"Finished {name}")
+        return results
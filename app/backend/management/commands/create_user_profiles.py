@@ -1,11 +1,14 @@
-from django.core.management.base import BaseCommand
+from backend.backfill import BackfillCommand
 from backend.models import CustomUser, UserProfile
 
-class Command(BaseCommand):
+class Command(BackfillCommand):
     help = 'Creates user profiles for users without one'
+    source_model = CustomUser
+    target_model = UserProfile
+    checkpoint_name = 'create_user_profiles'
 
-    def handle(self, *args, **options):
-        users_without_profile = CustomUser.objects.filter(profile__isnull=True)
-        for user in users_without_profile:
-            UserProfile.objects.create(user=user)
-            self.stdout.write(self.style.SUCCESS(f'Created profile for user {user.email}'))
+    def build_rows(self, start, end):
+        user_ids = CustomUser.objects.filter(
+            pk__gte=start, pk__lt=end, profile__isnull=True
+        ).values_list('pk', flat=True)
+        return [UserProfile(user_id=user_id) for user_id in user_ids]
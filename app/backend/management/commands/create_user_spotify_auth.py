@@ -1,27 +1,30 @@
-from django.core.management.base import BaseCommand
 from django.utils import timezone
+from backend.backfill import BackfillCommand
 from backend.models import CustomUser, MusicServiceConnection
 
 
-class Command(BaseCommand):
+class Command(BackfillCommand):
     help = "Creates MusicServiceConnection for Spotify for users without one"
+    source_model = CustomUser
+    target_model = MusicServiceConnection
+    checkpoint_name = "create_user_spotify_auth"
 
-    def handle(self, *args, **options):
-        users_without_spotify_connection = CustomUser.objects.exclude(
-            music_service_connections__service_name="spotify"
+    def build_rows(self, start, end):
+        user_ids = (
+            CustomUser.objects.filter(pk__gte=start, pk__lt=end)
+            .exclude(music_service_connections__service_name="spotify")
+            .values_list("pk", flat=True)
         )
-        for user in users_without_spotify_connection:
-            MusicServiceConnection.objects.create(
-                user=user,
+        now = timezone.now()
+        return [
+            MusicServiceConnection(
+                user_id=user_id,
                 service_name="spotify",
                 is_connected=False,
                 last_connected=None,
                 access_token="",
                 refresh_token="",
-                token_expires_at=timezone.now(),
-            )
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Created Spotify MusicServiceConnection for user {user.email}"
-                )
+                token_expires_at=now,
             )
+            for user_id in user_ids
+        ]
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from api.spotify.stub import StubConfig, make_server
+
+
+class Command(BaseCommand):
+    help = "Runs a local Spotify API stub with configurable latency and fault injection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency-ms", type=float, default=0)
+        parser.add_argument("--jitter-ms", type=float, default=0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+        parser.add_argument("--retry-after", type=int, default=1)
+        parser.add_argument("--playlists", type=int, default=40)
+        parser.add_argument("--tracks-per-playlist", type=int, default=250)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        config = StubConfig(
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            rate_limit_rate=options["rate_limit_rate"],
+            retry_after=options["retry_after"],
+            playlists=options["playlists"],
+            tracks_per_playlist=options["tracks_per_playlist"],
+            seed=options["seed"],
+        )
+        server = make_server(options["host"], options["port"], config)
+        base = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Spotify stub listening on {base} "
+                f"(SPOTIFY_API_URL={base}/v1, SPOTIFY_ACCOUNTS_URL={base})"
+            )
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api import audio_features
+from api.models import Song
+
+
+class Command(BaseCommand):
+    help = "Fetches Spotify audio features for stored songs that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--all", action="store_true", help="Refresh features for every song"
+        )
+
+    def handle(self, *args, **options):
+        songs = Song.objects.order_by("pk")
+        if not options["all"]:
+            songs = songs.filter(features__isnull=True)
+
+        stored = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                songs.filter(pk__gt=last_pk).values_list("pk", "spotify_id")[
+                    : options["chunk_size"]
+                ]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            stored += audio_features.sync([spotify_id for _, spotify_id in chunk])
+            self.stdout.write(f"Stored features for {stored} songs")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {stored} songs updated"))
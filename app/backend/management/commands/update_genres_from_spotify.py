@@ -3,6 +3,7 @@ from django.conf import settings
 import requests
 from backend.models import Genre
 from api.spotify.views import SpotifyClientCredentialsView
+from api.spotify import upstream
 from django.test import RequestFactory
 import json
 
@@ -29,10 +30,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         try:
             access_token = self.get_spotify_token()
-            url = 'https://api.spotify.com/v1/recommendations/available-genre-seeds'
+            url = f'{upstream.SPOTIFY_API_URL}/recommendations/available-genre-seeds'
             headers = {'Authorization': f'Bearer {access_token}'}
             
-            response = requests.get(url, headers=headers)
+            response = upstream.request('recommendations', 'GET', url, headers=headers)
             if response.status_code == 200:
                 genres = response.json()['genres']
                 for genre in genres:
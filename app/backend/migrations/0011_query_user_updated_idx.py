@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0010_query_recommendations"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="query",
+            index=models.Index(
+                fields=["user", "-updated_at"], name="query_user_updated_idx"
+            ),
+        ),
+    ]
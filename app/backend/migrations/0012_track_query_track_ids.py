@@ -0,0 +1,102 @@
+# Generated by Django 4.2.16 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def _track_id(item):
+    if isinstance(item, dict):
+        return item.get("id") or _track_id(item.get("uri") or "")
+    if isinstance(item, str) and item:
+        return item.rstrip("/").replace(":", "/").split("/")[-1].split("?")[0]
+    return None
+
+
+def compact_recommendations(apps, schema_editor):
+    Query = apps.get_model("backend", "Query")
+    Track = apps.get_model("backend", "Track")
+
+    pending = []
+    for query in Query.objects.only("id", "recommendations").iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        track_ids = []
+        tracks = {}
+        for item in query.recommendations or []:
+            track_id = _track_id(item)
+            if not track_id:
+                continue
+            track_ids.append(track_id)
+            if isinstance(item, dict):
+                tracks[track_id] = item
+        if tracks:
+            Track.objects.bulk_create(
+                [Track(spotify_id=k, data=v) for k, v in tracks.items()],
+                ignore_conflicts=True,
+            )
+        query.track_ids = track_ids
+        pending.append(query)
+        if len(pending) >= BATCH_SIZE:
+            Query.objects.bulk_update(pending, ["track_ids"])
+            pending = []
+    if pending:
+        Query.objects.bulk_update(pending, ["track_ids"])
+
+
+def expand_recommendations(apps, schema_editor):
+    Query = apps.get_model("backend", "Query")
+    Track = apps.get_model("backend", "Track")
+
+    pending = []
+    for query in Query.objects.only("id", "track_ids").iterator(chunk_size=BATCH_SIZE):
+        known = {
+            track.spotify_id: track.data
+            for track in Track.objects.filter(spotify_id__in=query.track_ids)
+        }
+        query.recommendations = [
+            known.get(track_id, f"spotify:track:{track_id}")
+            for track_id in query.track_ids
+        ]
+        pending.append(query)
+        if len(pending) >= BATCH_SIZE:
+            Query.objects.bulk_update(pending, ["recommendations"])
+            pending = []
+    if pending:
+        Query.objects.bulk_update(pending, ["recommendations"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0011_query_user_updated_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Track",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("spotify_id", models.CharField(max_length=64, unique=True)),
+                ("data", models.JSONField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="query",
+            name="track_ids",
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(compact_recommendations, expand_recommendations),
+        migrations.RemoveField(
+            model_name="query",
+            name="recommendations",
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.16 on 2026-10-19 11:27
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def hash_existing_parameters(apps, schema_editor):
+    Query = apps.get_model("backend", "Query")
+
+    pending = []
+    for query in Query.objects.only("id", "parameters").iterator(chunk_size=BATCH_SIZE):
+        canonical = json.dumps(
+            query.parameters, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+        query.parameters_hash = hashlib.sha256(canonical.encode()).hexdigest()
+        pending.append(query)
+        if len(pending) >= BATCH_SIZE:
+            Query.objects.bulk_update(pending, ["parameters_hash"])
+            pending = []
+    if pending:
+        Query.objects.bulk_update(pending, ["parameters_hash"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0012_track_query_track_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="query",
+            name="parameters_hash",
+            field=models.CharField(default="", editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="query",
+            name="results_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(hash_existing_parameters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="query",
+            index=models.Index(
+                fields=["parameters_hash", "-results_updated_at"],
+                name="query_hash_results_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.16 on 2026-10-19 13:15
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0014_backfillcheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                django.db.models.functions.text.Upper("email"),
+                name="customuser_email_upper_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="userprofile",
+            index=models.Index(
+                django.db.models.functions.text.Upper("username"),
+                name="userprofile_username_upper_idx",
+            ),
+        ),
+    ]
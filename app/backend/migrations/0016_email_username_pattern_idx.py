@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:02
+
+from django.db import migrations
+
+# The admin's ^email / ^profile__username searches compile to
+# UPPER("col"::text) LIKE UPPER('x%'). A default-opclass btree only serves LIKE
+# under the C collation, so PostgreSQL gets text_pattern_ops indexes on the same
+# expressions. Other backends have no equivalent and are left alone.
+INDEXES = [
+    ("customuser_email_upper_like_idx", "backend_customuser", "email"),
+    ("userprofile_username_upper_like_idx", "backend_userprofile", "username"),
+]
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" '
+            f'(UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("backend", "0015_customuser_email_upper_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
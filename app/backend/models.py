@@ -4,10 +4,11 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 from django.db import models
+from django.db.models.functions import Upper
 from django.conf import settings
 from django.utils import timezone
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+import hashlib
+import json
 
 
 class CustomUserManager(BaseUserManager):
@@ -43,6 +44,11 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
+    class Meta:
+        indexes = [
+            models.Index(Upper("email"), name="customuser_email_upper_idx"),
+        ]
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(
@@ -65,16 +71,10 @@ class UserProfile(models.Model):
     def __str__(self):
         return self.username or self.user.email
 
-
-@receiver(post_save, sender=CustomUser)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        UserProfile.objects.create(user=instance)
-
-
-@receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+    class Meta:
+        indexes = [
+            models.Index(Upper("username"), name="userprofile_username_upper_idx"),
+        ]
 
 
 class MusicServiceConnection(models.Model):
@@ -117,19 +117,64 @@ class UserPreferredGenre(models.Model):
         return f"{self.user.email} - {self.genre.name}"
 
 
+class Track(models.Model):
+    spotify_id = models.CharField(max_length=64, unique=True)
+    data = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.data.get("name") or self.spotify_id
+
+
+def hash_parameters(parameters):
+    """sha256 of the canonical JSON form, so equal parameters hash equally."""
+    canonical = json.dumps(
+        parameters, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
 class Query(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="queries"
     )
     name = models.CharField(max_length=255)
     parameters = models.JSONField()
-    recommendations = models.JSONField(default=list)
+    # Spotify track ids; full track objects live once per track in Track.
+    track_ids = models.JSONField(default=list)
+    parameters_hash = models.CharField(max_length=64, editable=False, default="")
+    # When track_ids were fetched from Spotify (possibly for another query with the same hash).
+    results_updated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.email} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        self.parameters_hash = hash_parameters(self.parameters)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "parameters" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "parameters_hash"}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["-updated_at"]
         verbose_name_plural = "Queries"
+        indexes = [
+            models.Index(fields=["user", "-updated_at"], name="query_user_updated_idx"),
+            models.Index(
+                fields=["parameters_hash", "-results_updated_at"],
+                name="query_hash_results_idx",
+            ),
+        ]
+
+
+class BackfillCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    # Every source pk below this has been processed.
+    position = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
@@ -3,23 +3,28 @@ from django.dispatch import receiver
 from .models import CustomUser, UserProfile, MusicServiceConnection
 from django.utils import timezone
 from django.db import transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
 
 @receiver(post_save, sender=CustomUser)
-def create_user_profile_and_music_connections(sender, instance, created, **kwargs):
-    if created:
-        try:
-            with transaction.atomic():
-                UserProfile.objects.get_or_create(user=instance)
-                MusicServiceConnection.objects.get_or_create(
-                    user=instance,
-                    service_name='spotify',
-                    defaults={
-                        'is_connected': False,
-                        'last_connected': None,
-                        'access_token': '',
-                        'refresh_token': '',
-                        'token_expires_at': timezone.now()
-                    }
-                )
-        except Exception as e:
-            print(f"Error creating profile or music service connection for user {instance.id}: {str(e)}")
+def create_user_profile_and_music_connections(sender, instance, created, raw=False, **kwargs):
+    # The only provisioning path for new users. Saves of existing users
+    # (logins, onboarding, email verification) must not write dependent rows.
+    if not created or raw:
+        return
+    try:
+        with transaction.atomic():
+            UserProfile.objects.create(user=instance)
+            MusicServiceConnection.objects.create(
+                user=instance,
+                service_name='spotify',
+                is_connected=False,
+                last_connected=None,
+                access_token='',
+                refresh_token='',
+                token_expires_at=timezone.now(),
+            )
+    except Exception:
+        logger.exception(f"Error creating profile or music service connection for user {instance.id}")
@@ -0,0 +1,129 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.tokens import default_token_generator
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.spotify import upstream
+from backend.models import (
+    CustomUser,
+    Genre,
+    MusicServiceConnection,
+    UserPreferredGenre,
+    UserProfile,
+)
+from backend.views.email_views import verify_email
+from backend.views.onboarding_views import complete_onboarding
+from backend.views.spotify_auth import spotify_callback
+
+
+class UserProvisioningTests(TestCase):
+    def test_signup_creates_profile_and_spotify_connection_once(self):
+        user = CustomUser.objects.create_user(email="new@example.com", password="pw")
+
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+        self.assertEqual(
+            MusicServiceConnection.objects.filter(
+                user=user, service_name="spotify"
+            ).count(),
+            1,
+        )
+
+    def test_saving_existing_user_does_not_write_profile(self):
+        user = CustomUser.objects.create_user(email="login@example.com", password="pw")
+        user.last_login = timezone.now()
+
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+
+
+class VerifyEmailQueryCountTests(TestCase):
+    def test_verify_email_reads_and_updates_only_the_user(self):
+        user = CustomUser.objects.create_user(email="verify@example.com", password="pw")
+        uid = urlsafe_base64_encode(force_bytes(user.pk))
+        token = default_token_generator.make_token(user)
+        request = RequestFactory().get(f"/verify-email/{uid}/{token}/")
+
+        with self.assertNumQueries(2):
+            response = verify_email(request, uid, token)
+
+        self.assertIn("status=success", response.content.decode())
+        user.refresh_from_db()
+        self.assertTrue(user.email_verified)
+
+
+class CompleteOnboardingQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="onboard@example.com", password="pw")
+        Genre.objects.create(name="pop")
+        self.factory = APIRequestFactory()
+
+    def post(self, data):
+        request = self.factory.post("/api/complete-onboarding/", data, format="multipart")
+        force_authenticate(request, user=self.user)
+        return complete_onboarding(request)
+
+    def test_profile_only(self):
+        # Profile lookup, profile update, user update.
+        with self.assertNumQueries(3):
+            response = self.post({"username": "onboarded", "user_type": "fan"})
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.onboarding_completed)
+
+    def test_with_preferred_genres(self):
+        # Adds: clear preferences, insert missing genres, read genres, insert preferences.
+        with self.assertNumQueries(7):
+            response = self.post(
+                {
+                    "username": "onboarded",
+                    "user_type": "fan",
+                    "preferred_genres": ["pop", "rock"],
+                }
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(
+                UserPreferredGenre.objects.filter(user=self.user).values_list(
+                    "genre__name", flat=True
+                )
+            ),
+            {"pop", "rock"},
+        )
+
+
+class SpotifyCallbackQueryCountTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email="callback@example.com", password="pw")
+
+    def fake_spotify(self, endpoint, method, url, **kwargs):
+        if endpoint == "token":
+            return upstream.build_response(
+                200,
+                {"access_token": "access", "refresh_token": "refresh", "expires_in": 3600},
+            )
+        return upstream.build_response(200, {"id": "spotify-user"})
+
+    def test_callback_updates_connection_and_user(self):
+        request = RequestFactory().post(
+            "/api/spotify/callback/",
+            json.dumps({"code": "code", "user_id": self.user.pk}),
+            content_type="application/json",
+        )
+
+        with mock.patch.object(upstream, "request", side_effect=self.fake_spotify):
+            # User and profile lookup, then savepoint, connection update, release.
+            # The user row is left alone because onboarding state is unchanged.
+            with self.assertNumQueries(4):
+                response = spotify_callback(request)
+
+        self.assertEqual(response.status_code, 200)
+        connection = MusicServiceConnection.objects.get(user=self.user, service_name="spotify")
+        self.assertTrue(connection.is_connected)
+        self.assertEqual(connection.service_user_id, "spotify-user")
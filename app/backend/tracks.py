@@ -0,0 +1,248 @@
+"""
+Shared storage for Spotify track metadata. Saved queries keep only track ids;
+full track objects are stored once per track in Track and cached process-wide
+through the Django cache, with a small in-process LRU in front of it.
+
+hydrate() is the one way to turn track ids into track objects: it reads the
+caches, then Track, and fetches whatever is left from /v1/tracks in concurrent
+batches of 50, writing the results through to Track, the caches and Song.
+Newly stored tracks also get their audio features synced in the background.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+import fastjson
+import metrics
+from api import audio_features
+from api.models import Song
+from .models import Track
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "track:"
+CACHE_TTL = 60 * 60 * 24
+LOCAL_CACHE_SIZE = getattr(settings, "TRACK_LOCAL_CACHE_SIZE", 5000)
+LOCAL_CACHE_TTL = getattr(settings, "TRACK_LOCAL_CACHE_TTL", 5 * 60)
+FETCH_BATCH_SIZE = 50
+FETCH_WORKERS = getattr(settings, "TRACK_FETCH_WORKERS", 4)
+
+fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="track-fetch")
+
+
+class LRUCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                if entry[1] < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = entry[0]
+        return found
+
+    def set_many(self, values):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = (value, expires)
+                self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+
+
+def track_id(item):
+    """Extract a Spotify track id from a track object, URI, URL or bare id."""
+    if isinstance(item, dict):
+        return item.get("id") or track_id(item.get("uri") or "")
+    if isinstance(item, str) and item:
+        return item.rstrip("/").replace(":", "/").split("/")[-1].split("?")[0]
+    return None
+
+
+def track_uri(spotify_id):
+    return f"spotify:track:{spotify_id}"
+
+
+def _song(track):
+    isrc = (track.get("external_ids") or {}).get("isrc")
+    if not isrc or len(isrc) > 12:
+        return None
+    images = (track.get("album") or {}).get("images") or []
+    return Song(
+        spotify_id=track["id"],
+        title=(track.get("name") or "")[:255],
+        artists=[
+            {"id": artist.get("id"), "name": artist.get("name")}
+            for artist in track.get("artists") or []
+        ],
+        isrc=isrc,
+        image=images[0]["url"] if images else "",
+    )
+
+
+def save_tracks(tracks):
+    """Upsert full track objects into Track, Song and both caches."""
+    tracks = {track["id"]: track for track in tracks if track and track.get("id")}
+    if not tracks:
+        return
+    Track.objects.bulk_create(
+        [Track(spotify_id=spotify_id, data=data) for spotify_id, data in tracks.items()],
+        update_conflicts=True,
+        unique_fields=["spotify_id"],
+        update_fields=["data", "updated_at"],
+    )
+    # Relinked tracks share an ISRC, so the first spotify id seen keeps the Song.
+    Song.objects.bulk_create(
+        [song for song in map(_song, tracks.values()) if song],
+        ignore_conflicts=True,
+    )
+    cached = {f"{CACHE_PREFIX}{spotify_id}": data for spotify_id, data in tracks.items()}
+    cache.set_many(cached, CACHE_TTL)
+    local_cache.set_many(cached)
+    audio_features.schedule_sync(tracks)
+
+
+def ingest(tracks):
+    """
+    Store track objects seen in passing (playlist pages, recommendations),
+    skipping any already cached so a popular track isn't rewritten on every read.
+    """
+    tracks = {track["id"]: track for track in tracks if track and track.get("id")}
+    if not tracks:
+        return
+    keys = [f"{CACHE_PREFIX}{spotify_id}" for spotify_id in tracks]
+    known = set(local_cache.get_many(keys))
+    remaining = [key for key in keys if key not in known]
+    if remaining:
+        known.update(cache.get_many(remaining))
+    save_tracks(
+        track for spotify_id, track in tracks.items()
+        if f"{CACHE_PREFIX}{spotify_id}" not in known
+    )
+
+
+def compact(items):
+    """
+    Turn a list of recommendations (track objects, URIs or ids) into track ids,
+    storing any full track objects along the way.
+    """
+    ingest([item for item in items if isinstance(item, dict)])
+    return [spotify_id for spotify_id in map(track_id, items) if spotify_id]
+
+
+def get_tracks(track_ids):
+    """Return {track_id: track object} for the ids we have metadata for."""
+    track_ids = list(dict.fromkeys(track_ids))
+    if not track_ids:
+        return {}
+    keys = [f"{CACHE_PREFIX}{spotify_id}" for spotify_id in track_ids]
+    found = local_cache.get_many(keys)
+    remaining = [key for key in keys if key not in found]
+    if remaining:
+        shared = cache.get_many(remaining)
+        local_cache.set_many(shared)
+        found.update(shared)
+    found = {key[len(CACHE_PREFIX):]: data for key, data in found.items()}
+
+    missing = [spotify_id for spotify_id in track_ids if spotify_id not in found]
+    if missing:
+        from_db = dict(
+            Track.objects.filter(spotify_id__in=missing).values_list("spotify_id", "data")
+        )
+        if from_db:
+            cached = {f"{CACHE_PREFIX}{spotify_id}": data for spotify_id, data in from_db.items()}
+            cache.set_many(cached, CACHE_TTL)
+            local_cache.set_many(cached)
+        found.update(from_db)
+    metrics.increment("tracks.lookups", len(track_ids))
+    metrics.increment("tracks.lookup_misses", len(track_ids) - len(found))
+    return found
+
+
+def _fetch_batch(batch, access_token):
+    from api.spotify import upstream
+
+    try:
+        response = upstream.request(
+            "tracks",
+            "GET",
+            f"{upstream.SPOTIFY_API_URL}/tracks",
+            headers={"Authorization": f"Bearer {access_token}"},
+            params={"ids": ",".join(batch)},
+        )
+    except requests.RequestException as e:
+        logger.error(f"Failed to fetch {len(batch)} tracks from Spotify: {str(e)}")
+        return []
+    if response.status_code != 200:
+        logger.error(f"Spotify API error fetching tracks: {response.status_code}")
+        return []
+    return [track for track in fastjson.decode(response).get("tracks") or [] if track]
+
+
+def fetch_tracks(track_ids, access_token=None):
+    """
+    Fetch track objects from Spotify in concurrent /v1/tracks batches and store
+    them. Batches that fail are logged and left out of the result.
+    """
+    track_ids = list(dict.fromkeys(track_ids))
+    if not track_ids:
+        return {}
+    if access_token is None:
+        from api.spotify.views import SpotifyClientCredentialsView
+
+        access_token = SpotifyClientCredentialsView().get_access_token()
+
+    batches = [
+        track_ids[i:i + FETCH_BATCH_SIZE]
+        for i in range(0, len(track_ids), FETCH_BATCH_SIZE)
+    ]
+    fetched = []
+    for result in fetch_pool.map(lambda batch: _fetch_batch(batch, access_token), batches):
+        fetched.extend(result)
+    save_tracks(fetched)
+    metrics.increment("tracks.fetched", len(fetched))
+    return {track["id"]: track for track in fetched}
+
+
+def hydrate(track_ids, fetch=True, access_token=None):
+    """
+    Full track objects in order. Tracks we have no metadata for are fetched
+    from Spotify when fetch is true; any still unknown come back as {id, uri} stubs.
+    """
+    known = get_tracks(track_ids)
+    if fetch:
+        missing = [spotify_id for spotify_id in track_ids if spotify_id not in known]
+        if missing:
+            try:
+                known.update(fetch_tracks(missing, access_token))
+            except Exception:
+                logger.exception(f"Failed to hydrate {len(missing)} tracks")
+    return [
+        known.get(spotify_id) or {"id": spotify_id, "uri": track_uri(spotify_id)}
+        for spotify_id in track_ids
+    ]
@@ -14,7 +14,7 @@ def verify_email(request, uidb64, token):
 
     if user is not None and default_token_generator.check_token(user, token):
         user.email_verified = True
-        user.save()
+        user.save(update_fields=["email_verified"])
         status = "success"
     else:
         status = "error"
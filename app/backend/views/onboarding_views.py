@@ -51,13 +51,20 @@ def complete_onboarding(request):
             # Clear existing preferred genres
             UserPreferredGenre.objects.filter(user=user).delete()
 
-            # Add new preferred genres
-            for genre_name in preferred_genres:
-                genre, _ = Genre.objects.get_or_create(name=genre_name)
-                UserPreferredGenre.objects.create(user=user, genre=genre)
+            # Add new preferred genres, creating any we haven't seen before
+            Genre.objects.bulk_create(
+                [Genre(name=genre_name) for genre_name in preferred_genres],
+                ignore_conflicts=True,
+            )
+            UserPreferredGenre.objects.bulk_create(
+                [
+                    UserPreferredGenre(user=user, genre=genre)
+                    for genre in Genre.objects.filter(name__in=preferred_genres)
+                ]
+            )
 
         user.onboarding_completed = True
-        user.save()
+        user.save(update_fields=['onboarding_completed'])
 
         return Response({'message': 'Onboarding completed successfully'}, status=status.HTTP_200_OK)
 
@@ -1,11 +1,16 @@
 import os
-from django.http import JsonResponse
+import time
+from django.db import transaction
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 import requests
 from urllib.parse import urlencode
 from ..models import CustomUser, UserProfile, MusicServiceConnection
+from api.spotify import upstream, warmup
+import fastjson
+import metrics
+from fastjson import JsonResponse
 import json
 
 
@@ -24,13 +29,31 @@ def spotify_authorize(request):
         "show_dialog": "true",
     }
 
-    authorization_url = f"https://accounts.spotify.com/authorize?{urlencode(params)}"
+    authorization_url = f"{upstream.SPOTIFY_ACCOUNTS_URL}/authorize?{urlencode(params)}"
     return JsonResponse({"authorization_url": authorization_url})
 
 
+def _observe_stage(name, since):
+    metrics.observe("spotify.callback.stage_ms", (time.monotonic() - since) * 1000, stage=name)
+
+
+def _onboarding_completed(user):
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        return False
+    return bool(
+        profile.username
+        and profile.birthdate
+        and profile.user_type
+        and (profile.user_type != "professional" or profile.profession)
+    )
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def spotify_callback(request):
+    started = time.monotonic()
     try:
         data = json.loads(request.body)
         code = data.get("code")
@@ -41,101 +64,73 @@ def spotify_callback(request):
     if not code or not user_id:
         return JsonResponse({"error": "Missing code or user_id"}, status=400)
 
-    token_url = "https://accounts.spotify.com/api/token"
-    client_id = os.environ.get("SPOTIFY_CLIENT_ID")
-    client_secret = os.environ.get("SPOTIFY_CLIENT_SECRET")
-    redirect_uri = os.environ.get("SPOTIFY_REDIRECT_URI")
+    # Resolve the user before spending two Spotify round trips on an unknown id.
+    user = CustomUser.objects.select_related("profile").filter(id=user_id).first()
+    if user is None:
+        return JsonResponse({"error": "User not found"}, status=404)
 
     payload = {
         "grant_type": "authorization_code",
         "code": code,
-        "redirect_uri": redirect_uri,
-        "client_id": client_id,
-        "client_secret": client_secret,
+        "redirect_uri": os.environ.get("SPOTIFY_REDIRECT_URI"),
+        "client_id": os.environ.get("SPOTIFY_CLIENT_ID"),
+        "client_secret": os.environ.get("SPOTIFY_CLIENT_SECRET"),
     }
 
-    response = requests.post(token_url, data=payload)
-    if response.status_code != 200:
-        return JsonResponse({"error": "Failed to exchange code for token"}, status=400)
-
-    tokens = response.json()
+    try:
+        stage = time.monotonic()
+        response = upstream.request("token", "POST", upstream.SPOTIFY_TOKEN_URL, data=payload)
+        _observe_stage("token", stage)
+        if response.status_code != 200:
+            return JsonResponse(
+                {"error": "Failed to exchange code for token"}, status=400
+            )
+        tokens = fastjson.decode(response)
+
+        stage = time.monotonic()
+        profile_response = upstream.request(
+            "me",
+            "GET",
+            f"{upstream.SPOTIFY_API_URL}/me",
+            headers={"Authorization": f"Bearer {tokens['access_token']}"},
+        )
+        _observe_stage("me", stage)
+    except requests.RequestException:
+        return JsonResponse({"error": "Spotify is temporarily unavailable"}, status=503)
 
-    # Get user profile from Spotify
-    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
-    profile_response = requests.get("https://api.spotify.com/v1/me", headers=headers)
     if profile_response.status_code != 200:
         return JsonResponse({"error": "Failed to fetch Spotify profile"}, status=400)
 
-    spotify_profile = profile_response.json()
-
-    # Update user model with Spotify info
-    try:
-        print("try music service connection")
-        print("tokens", tokens)
-        user = CustomUser.objects.get(id=user_id)
-        music_service_connection, created = (
-            MusicServiceConnection.objects.update_or_create(
-                user=user,
-                service_name="spotify",
-                defaults={
-                    "is_connected": True,
-                    "last_connected": timezone.now(),
-                    "service_user_id": spotify_profile["id"],
-                    "access_token": tokens["access_token"],
-                    "refresh_token": tokens["refresh_token"],
-                    "token_expires_at": timezone.now()
-                    + timezone.timedelta(seconds=tokens["expires_in"]),
-                },
+    spotify_profile = fastjson.decode(profile_response)
+
+    stage = time.monotonic()
+    now = timezone.now()
+    connection_fields = {
+        "is_connected": True,
+        "last_connected": now,
+        "service_user_id": spotify_profile["id"],
+        "access_token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
+        "token_expires_at": now + timezone.timedelta(seconds=tokens["expires_in"]),
+    }
+    onboarding_completed = _onboarding_completed(user)
+    with transaction.atomic():
+        # Every user is provisioned with a spotify connection row, so this is
+        # normally a single UPDATE.
+        updated = MusicServiceConnection.objects.filter(
+            user=user, service_name="spotify"
+        ).update(**connection_fields)
+        if not updated:
+            MusicServiceConnection.objects.create(
+                user=user, service_name="spotify", **connection_fields
             )
+        if user.onboarding_completed != onboarding_completed:
+            user.onboarding_completed = onboarding_completed
+            user.save(update_fields=["onboarding_completed"])
+        transaction.on_commit(
+            lambda: warmup.schedule(user.pk, tokens["access_token"], spotify_profile)
         )
-        print("music_service_connection", music_service_connection)
-        print("music_service_connection.user", music_service_connection.user)
-        print(
-            "music_service_connection.service_name",
-            music_service_connection.service_name,
-        )
-        print(
-            "music_service_connection.is_connected",
-            music_service_connection.is_connected,
-        )
-        print(
-            "music_service_connection.last_connected",
-            music_service_connection.last_connected,
-        )
-        print(
-            "music_service_connection.service_user_id",
-            music_service_connection.service_user_id,
-        )
-        print(
-            "music_service_connection.access_token",
-            music_service_connection.access_token,
-        )
-        print(
-            "music_service_connection.refresh_token",
-            music_service_connection.refresh_token,
-        )
-        print(
-            "music_service_connection.token_expires_at",
-            music_service_connection.token_expires_at,
-        )
-
-        try:
-            print("try profile")
-            profile = user.profile
-            if (
-                profile.username
-                and profile.birthdate
-                and profile.user_type
-                and (profile.user_type != "professional" or profile.profession)
-            ):
-                user.onboarding_completed = True
-            else:
-                user.onboarding_completed = False
-        except UserProfile.DoesNotExist:
-            user.onboarding_completed = False
-        print("saving user")
-        user.save()
-    except CustomUser.DoesNotExist:
-        return JsonResponse({"error": "User not found"}, status=404)
+    _observe_stage("db", stage)
+    metrics.observe("spotify.callback.duration_ms", (time.monotonic() - started) * 1000)
 
     return JsonResponse({"success": True})
@@ -0,0 +1,92 @@
+"""
+JSON encoding and decoding through orjson when it's installed, the standard
+library otherwise.
+
+dumps() always returns compact UTF-8 bytes. Anything orjson can't encode
+natively (Decimal, lazy translation strings, ...) goes through DRF's encoder,
+so output matches what JSONRenderer would produce.
+
+install() swaps JSONRenderer and JSONParser for the fast versions on every DRF
+view that uses the defaults; views and decorators that set their own renderer
+or parser classes are left alone.
+"""
+import json
+
+from django.http import JsonResponse as DjangoJsonResponse
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+# Datetimes go through DRF's encoder so they're formatted the way DRF does it.
+_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+def _default(obj):
+    return _encoder.default(obj)
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+    return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode(response):
+    """Body of an upstream requests.Response; a drop-in for response.json()."""
+    return loads(response.content)
+
+
+class JsonResponse(DjangoJsonResponse):
+    """django.http.JsonResponse, encoded with dumps()."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super(DjangoJsonResponse, self).__init__(content=dumps(data), **kwargs)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Indented output is for people (browsable API, ?indent=); leave it to DRF.
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+
+def install():
+    from rest_framework.views import APIView
+
+    APIView.renderer_classes = [
+        FastJSONRenderer if cls is JSONRenderer else cls for cls in APIView.renderer_classes
+    ]
+    APIView.parser_classes = [
+        FastJSONParser if cls is JSONParser else cls for cls in APIView.parser_classes
+    ]
@@ -1,12 +1,25 @@
 import { API_BASE_URL } from "../config";
 
+// Filled from the bootstrap response so searches don't refetch the list.
+let cachedGenres: string[] | null = null;
+
+export function primeGenres(genres: string[] | null | undefined) {
+  if (genres) {
+    cachedGenres = genres;
+  }
+}
+
 export async function fetchGenres(): Promise<string[]> {
+  if (cachedGenres) {
+    return cachedGenres;
+  }
   try {
     const response = await fetch(`${API_BASE_URL}/api/genres/`);
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
     const data = await response.json();
+    cachedGenres = data;
     return data;
   } catch (error) {
     console.error("Error fetching genre seeds:", error);
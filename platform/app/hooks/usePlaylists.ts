@@ -23,19 +23,30 @@ interface PlaylistTracksResponse {
   total: number;
 }
 
-export const usePlaylists = () => {
-  const [savedPlaylists, setSavedPlaylists] = useState<Playlist[]>([]);
+const INITIAL_LIMIT = 25;
+
+export const usePlaylists = (initialPlaylists?: PlaylistsResponse | null) => {
+  // A first page from the bootstrap response saves the initial fetch.
+  const initialPage =
+    initialPlaylists && "items" in initialPlaylists ? initialPlaylists : null;
+  const [savedPlaylists, setSavedPlaylists] = useState<Playlist[]>(
+    initialPage ? initialPage.items.slice(0, INITIAL_LIMIT) : []
+  );
   const [selectedPlaylist, setSelectedPlaylist] = useState<Playlist | null>(
     null
   );
   const [selectedPlaylistTracks, setSelectedPlaylistTracks] =
     useState<PlaylistTracksResponse | null>(null);
-  const [totalPlaylists, setTotalPlaylists] = useState<number>(0);
-  const [limit, setLimit] = useState(25);
+  const [totalPlaylists, setTotalPlaylists] = useState<number>(
+    initialPage ? initialPage.total : 0
+  );
+  const [limit, setLimit] = useState(INITIAL_LIMIT);
   const [offset, setOffset] = useState(0);
-  const [hasMore, setHasMore] = useState(true);
+  const [hasMore, setHasMore] = useState(
+    initialPage ? initialPage.total > INITIAL_LIMIT : true
+  );
   const fetcher = useFetcher();
-  const shouldLoadPlaylists = useRef(true);
+  const shouldLoadPlaylists = useRef(!initialPage);
   const [isLoading, setIsLoading] = useState(false);
   const [gridSelectedPlaylist, setGridSelectedPlaylist] = useState<Playlist | null>(null);
   const [gridSelectedPlaylistTracks, setGridSelectedPlaylistTracks] = useState<PlaylistTracksResponse | null>(null);
@@ -61,14 +61,25 @@ export const useQueries = () => {
     [fetcher]
   );
 
-  const selectQuery = useCallback((query: Query) => {
+  const selectQuery = useCallback(async (query: Query) => {
+    let recommendations = query.recommendations;
+    if (!recommendations) {
+      // Saved query lists are light; fetch the full query for its recommendations.
+      try {
+        const response = await fetch(`/api/queries?queryId=${query.id}`);
+        const fullQuery = await response.json();
+        recommendations = fullQuery.recommendations;
+      } catch (error) {
+        console.error("Error fetching query details:", error);
+      }
+    }
     setSelectedQuery({
       ...query,
       parameters: {
         ...query.parameters,
         advancedParams: query.parameters.advancedParams || {},
       },
-      recommendations: query.recommendations || [],
+      recommendations: recommendations || [],
     });
   }, []);
 
@@ -4,15 +4,37 @@ import { getSession, commitSession } from "../../session.server";
 
 export const loader: LoaderFunction = async ({ request }) => {
   try {
-    const response = await authenticatedFetch("/spotify/queries/", {
-      method: "GET",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      request,
-    });
+    const queryId = new URL(request.url).searchParams.get("queryId");
+    if (queryId) {
+      const response = await authenticatedFetch(`/spotify/queries/${queryId}/`, {
+        method: "GET",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        request,
+      });
+      return json(await response.json());
+    }
 
-    const queries = await response.json();
+    // The list endpoint is cursor paginated and omits recommendations;
+    // follow the cursor so every saved query reaches the UI.
+    const queries = [];
+    let url: string | null = "/spotify/queries/?page_size=100";
+    while (url) {
+      const response = await authenticatedFetch(url, {
+        method: "GET",
+        headers: {
+          "Content-Type": "application/json",
+        },
+        request,
+      });
+      const data = await response.json();
+      if (Array.isArray(data)) {
+        return json(data);
+      }
+      queries.push(...data.results);
+      url = data.next;
+    }
     return json(queries);
   } catch (error) {
     console.error("Error fetching queries:", error);
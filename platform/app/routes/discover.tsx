@@ -5,6 +5,8 @@ import DiscoverSidebar from "../components/Discover/DiscoverSidebar";
 import { MusicGrid } from "../components/Discover/MusicGrid";
 import { LoaderFunction, json } from "@remix-run/node";
 import { getAccessToken } from "../utils/auth.server";
+import { loadBootstrap, BootstrapSections } from "../utils/bootstrap.server";
+import { primeGenres } from "../api/genres";
 import { MobileSearchForm } from "../components/Discover/MobileSearchForm";
 import { useSpotify } from "../hooks/useSpotify";
 import { FormattedResult, CategoryLabel, AdvancedParams } from "../types/recommendations/types";
@@ -57,12 +59,23 @@ export const loader: LoaderFunction = async ({ request }) => {
 
   const user = session.get("user");
 
+  // Genres and the first playlist page arrive with the user in one request.
+  let bootstrap: BootstrapSections | null = null;
+  if (user) {
+    try {
+      bootstrap = await loadBootstrap(request, String(user.data?.id ?? user.data?.email));
+    } catch (error) {
+      console.error('Error fetching bootstrap data:', error);
+    }
+  }
+
   return json({
     accessToken,
     accessTokenError,
     playlists,
     playlistsError,
-    user
+    user,
+    bootstrap
   }, {
     headers: { "Set-Cookie": await commitSession(session) },
   });
@@ -71,13 +84,16 @@ export const loader: LoaderFunction = async ({ request }) => {
 export default function Discover() {
   const { 
     accessToken, 
-    user
+    user,
+    bootstrap
   } = useLoaderData<{ 
     accessToken: string, 
     accessTokenError: string, 
     playlistsError: string, 
-    user: User 
+    user: User,
+    bootstrap: BootstrapSections | null
   }>();
+  primeGenres(bootstrap?.genres);
 
   const location = useLocation();
   const navigate = useNavigate();
@@ -156,7 +172,7 @@ export default function Discover() {
     isEditingNewPlaylist,
     newPlaylistName,
     updateNewPlaylistName
-  } = usePlaylists();
+  } = usePlaylists(bootstrap?.spotify_playlists);
 
   const memoizedRecommendations = useMemo(() => recommendations, [recommendations]);
 
@@ -74,7 +74,7 @@ export async function serverRegister(email: string, password: string) {
 
 export async function serverLogin(email: string, password: string) {
   try {
-    const response = await serverFetch(`${AUTH_BASE_URL}/login/`, {
+    const response = await serverFetch(`${AUTH_BASE_URL}/login/token/`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
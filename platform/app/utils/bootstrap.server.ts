@@ -0,0 +1,56 @@
+import { authenticatedFetch } from "./api.server";
+
+export interface BootstrapSections {
+  genres?: string[];
+  auth?: { is_authenticated: boolean; email: string | null };
+  user?: Record<string, unknown>;
+  email_verification?: { emailVerified: boolean };
+  spotify_user?: Record<string, unknown>;
+  spotify_playlists?: any;
+}
+
+interface CachedBootstrap {
+  sections: BootstrapSections;
+  etags: { [name: string]: string };
+}
+
+// Last sections seen per user. Repeat loads send their etags as ?known= and
+// Django leaves the unchanged sections out of the response. Kept in insertion
+// order and trimmed from the least recently loaded end.
+const MAX_CACHED_USERS = 1000;
+const bootstrapCache = new Map<string, CachedBootstrap>();
+
+export async function loadBootstrap(
+  request: Request,
+  cacheKey: string
+): Promise<BootstrapSections> {
+  const cached = bootstrapCache.get(cacheKey);
+  const known = cached
+    ? Object.entries(cached.etags)
+        .map(([name, tag]) => `${name}:${tag}`)
+        .join(",")
+    : "";
+  const url = known ? `/bootstrap/?known=${encodeURIComponent(known)}` : "/bootstrap/";
+
+  const response = await authenticatedFetch(url, {
+    method: "GET",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    request,
+  });
+  const { etags, unchanged, ...fresh } = await response.json();
+
+  const sections: BootstrapSections = { ...cached?.sections };
+  for (const [name, value] of Object.entries(fresh)) {
+    if (!unchanged.includes(name)) {
+      sections[name as keyof BootstrapSections] = value as any;
+    }
+  }
+  bootstrapCache.delete(cacheKey);
+  bootstrapCache.set(cacheKey, { sections, etags });
+  while (bootstrapCache.size > MAX_CACHED_USERS) {
+    bootstrapCache.delete(bootstrapCache.keys().next().value as string);
+  }
+  return sections;
+}